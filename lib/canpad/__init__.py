@@ -0,0 +1,5 @@
+# Firmware for the Feather M4 CAN: the keypad, drive unit and gauge glue.
+#
+# code.py imports canpad.app, which brings CAN up before anything else. The
+# other modules are imported as the app needs them, so keep this file empty:
+# anything imported here is loaded before the first listen.
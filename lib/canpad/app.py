@@ -0,0 +1,599 @@
+# The main loop: brings CAN up first, then the rest, and runs the tick stages.
+# code.py only calls boot() and tick().
+
+import gc
+import time
+import board
+import canio
+import digitalio
+from micropython import const
+
+from canpad.canbus import (
+    CanBusSupervisor, CanFilterPlanner, CanFlightRecorder, CanMessage, CanMessageQueue, CanPriority,
+)
+from canpad.ecu import ECU, ECUState, PulseScheduler, TeslaECU
+from canpad.logger import Logger
+from canpad.pad import Pad, PadButtonTracker, PadState, PadWatchdog
+from canpad.settings import FeatherSettings
+from canpad.timers import TimerScheduler
+
+# Per-stage tick timing (LoopProfiler). Set to const(1) to enable; as const(0)
+# the compiler drops the profiling branch from Application.tick entirely.
+# A const is only folded in the module that defines it, so it lives here.
+PROFILE_LOOP = const(0)
+
+
+class Application:
+    EXPECTED_BAUD_RATE = 500_000
+    # Only the latest frame per tick matters for these; older ones are collapsed
+    TELEMETRY_IDS = (TeslaECU.BATTERY_ID,)
+    # Own listener, and so their own RX FIFO, so a telemetry burst cannot overflow it
+    PRIORITY_IDS = (Pad.HEARTBEAT_ID, Pad.BUTTON_EVENT_ID)
+    # Tick stages in order, as timed by LoopProfiler
+    STAGES = (
+        "process_pulses",
+        "process_timers",
+        "process_can_bus",
+        "process_can_message",
+        "process_console",
+        "ensure_pad_operational",
+        "process_buttons",
+        "process_battery_gauge",
+        "process_pad_colors",
+        "process_cruise",
+        "process_can_message_queue",
+        "persist_state",
+        "collect_garbage",
+    )
+
+    def __init__(self, can = None, listener = None):
+        # Resolved once here; a 2048-entry table indexed by id would cost 8 KB of heap.
+        # The CAN filters are planned from its keys.
+        self.message_handlers = {
+            Pad.HEARTBEAT_ID: self._process_pad_heartbeat,
+            Pad.BUTTON_EVENT_ID: self._process_pad_button,
+            TeslaECU.BATTERY_ID: self._process_battery_state,
+        }
+        # Listening first: a keypad boot-up heartbeat that arrives while the rest
+        # is still being imported waits in the RX FIFO instead of being missed
+        self.baud_rate = Application.EXPECTED_BAUD_RATE
+        self.setup_can_connection(self.baud_rate)
+
+        # Imported only now, after CAN is up
+        from canpad.controller import VehicleController
+        from canpad.cruise import CruiseCommand
+        from canpad.gauge import BatteryGauge
+        from canpad.parking_brake import ParkingBrake
+
+        self.pad = Pad()
+        self.tesla_ecu = TeslaECU()
+        self.ecu = ECU(board.D11, board.D12, board.D13)
+        self.parking_brake = ParkingBrake(board.D10, board.D9, board.D6, board.D5)
+        self.battery_gauge = BatteryGauge(board.A1)
+        self.cruise = CruiseCommand(
+            self.ecu, CanMessageQueue.get_instance(), FeatherSettings.CRUISE_COMMAND_ID,
+            1_000_000_000 // FeatherSettings.CRUISE_COMMAND_RATE,
+        )
+        self.controller = VehicleController(self.ecu, self.pad, self.parking_brake, self.cruise)
+        self.button_tracker = PadButtonTracker(self.controller.process_button_event)
+        self.pad_watchdog = PadWatchdog(
+            int(FeatherSettings.PAD_HEARTBEAT_TIMEOUT * 1_000_000_000),
+            int(FeatherSettings.PAD_ACTIVATE_BACKOFF * 1_000_000_000),
+            int(FeatherSettings.PAD_ACTIVATE_BACKOFF_MAX * 1_000_000_000),
+        )
+        self.current_bus_state = None
+        self.previous_bus_state = None
+        self.can_message_queue = CanMessageQueue.get_instance()
+        self.pulse_scheduler = PulseScheduler.get_instance()
+        self.timers = TimerScheduler.get_instance()
+        self.flight_recorder = CanFlightRecorder.get_instance()
+        self.bus_supervisor = CanBusSupervisor()
+        self.tx_budget = FeatherSettings.CAN_TX_BUDGET
+        self.tx_deferred = 0
+        # Set from the first deferred send until a frame goes out again
+        self.tx_stalled = False
+        self.rx_budget = FeatherSettings.CAN_RX_BUDGET
+        self.telemetry_slots = {id: slot for slot, id in enumerate(Application.TELEMETRY_IDS)}
+        self.telemetry_latest = [None] * len(Application.TELEMETRY_IDS)
+        self.telemetry_data = [None] * len(Application.TELEMETRY_IDS)
+        self.rx_received = 0
+        self.rx_collapsed = 0
+        self.rx_dropped = 0
+        self.rx_budget_exhausted = 0
+        self.first_boot = True
+        self.loop_count = 0
+        # Bound once; passing self._unknown_message per frame would allocate a bound method
+        self.unknown_message_handler = self._unknown_message
+        self.pad_activate_message = CanMessage(*self.pad.can_activate_keypad()).message()
+        import microcontroller
+        from canpad.console import SerialConsole
+        from canpad.state_store import NvmStateStore
+
+        self.console = SerialConsole(self, SerialConsole.find_serial())
+        self.state_store = NvmStateStore(microcontroller.nvm, int(FeatherSettings.NVM_WRITE_DELAY * 1_000_000_000))
+        # After a reset with the car on, pick up where it left off instead of
+        # the defaults init_drive_state would set
+        self.restored = self.restore_state()
+        # One clock read per tick, shared by every stage
+        self.now = time.monotonic_ns()
+        self.rx_tick = 0
+        self.gc_due_at = self.now
+        self.gc_collections = 0
+        self.gc_max_ns = 0
+        self.heap_free_min = None
+        # Set by boot() once everything is imported and collected
+        self.heap_free_boot = None
+        if PROFILE_LOOP:
+            from canpad.profiler import LoopProfiler
+
+            self.stages = tuple(getattr(self, name) for name in Application.STAGES)
+            self.profiler = LoopProfiler(Application.STAGES + ("tick",))
+            # Clock reads of a sampled tick, filled in place
+            self.profile_stamps = [0] * (len(Application.STAGES) + 1)
+            self.profile_ticks = 0
+            self.profile_countdown = FeatherSettings.PROFILE_SAMPLE_EVERY
+            # Exact, unlike the sampled histograms; it bounds button latency.
+            # Start to start, so a tick that is not sampled reads no clock.
+            self.profile_max_ns = 0
+            self.profile_tick_at = self.now
+            self.profile_dump_at = self.now + int(FeatherSettings.PROFILE_DUMP_INTERVAL * 1_000_000_000)
+
+    def setup_can_connection(self, baudrate):
+        Logger.trace("Applcation.setup_can_connection")
+
+        self.can = canio.CAN(rx=board.CAN_RX, tx=board.CAN_TX, baudrate=baudrate, auto_restart=True)
+        self.filter_plan = CanFilterPlanner(Application.PRIORITY_IDS, self.message_handlers)
+        # timeout=0: process_can_message drains what is pending and never waits.
+        # The priority listener is created first, so its filters are checked first.
+        # No matches would mean accept everything, so an empty group gets no listener.
+        self.priority_listener = None
+        self.listener = None
+        if self.filter_plan.priority_groups:
+            self.priority_listener = self.can.listen(matches=CanFilterPlanner.matches(self.filter_plan.priority_groups), timeout=0)
+        if self.filter_plan.groups:
+            self.listener = self.can.listen(matches=CanFilterPlanner.matches(self.filter_plan.groups), timeout=0)
+
+    def ensure_pad_operational(self):
+        Logger.trace("Applcation.ensure_pad_operational")
+
+        now = self.now
+        if self.pad.state == PadState.OPERATIONAL:
+            if self.first_boot:
+                # Started before this reset, by a heartbeat already; its LEDs
+                # still show whatever was set before
+                if not self.restored:
+                    self.controller.init_drive_state()
+                self.first_boot = False
+            if self.pad_watchdog.expired(now):
+                Logger.warning("Pad heartbeat lost, reactivating")
+                self.pad.reset()
+                self.pad_watchdog.lost(now)
+                self.button_tracker.reset(now)
+        elif self.pad.state == PadState.UNKNOWN:
+            if self.first_boot:
+                self.send_pad_activate()
+                self.pad.to_operational()
+                self.pad_watchdog.recovered(now)
+                if not self.restored:
+                    self.controller.init_drive_state()
+                self.first_boot = False
+            elif self.pad_watchdog.activation_due(now):
+                self.send_pad_activate()
+        elif self.pad.state == PadState.BOOT_UP or self.pad.state == PadState.PRE_OPERATIONAL:
+            # The keypad is present and waiting to be started. Colors were invalidated
+            # on the way here, so the next flush restores them in a single frame.
+            if self.pad_watchdog.activation_due(now):
+                self.send_pad_activate()
+                self.pad.to_operational()
+                self.pad_watchdog.recovered(now)
+                if self.first_boot:
+                    if not self.restored:
+                        self.controller.init_drive_state()
+                    self.first_boot = False
+        else:
+            Logger.info("unknown state: [%s]", self.pad.state)
+
+
+    def restore_state(self):
+        Logger.trace("Applcation.restore_state")
+
+        store = self.state_store
+        if not store.load():
+            return False
+        if self.parking_brake.is_engaged() and store.drive_state != ECUState.PARK:
+            # The brake was set while the Feather was off; the sensors win
+            Logger.warning("Saved drive state %s ignored, parking brake engaged", store.drive_state)
+            return False
+
+        flags = store.flags
+        self.ecu.set_drive_state(store.drive_state)
+        self.ecu.set_f1(ECUState.ENABLED if flags & store.FLAG_F1 else ECUState.DISABLED)
+        self.ecu.set_f2(ECUState.ENABLED if flags & store.FLAG_F2 else ECUState.DISABLED)
+        self.ecu.set_regen_state(ECUState.ENABLED if flags & store.FLAG_REGEN else ECUState.DISABLED)
+        self.ecu.set_exhaust_sound(ECUState.ENABLED if flags & store.FLAG_EXHAUST else ECUState.DISABLED)
+        # Sent as a single frame as soon as the keypad is operational
+        self.pad.restore_colors(store.red, store.green, store.blue)
+        Logger.info("Restored state from NVM slot %s, drive state %s", store.slot, store.drive_state)
+        return True
+
+    def state_flags(self):
+        ecu = self.ecu
+        store = self.state_store
+        flags = 0
+        if ecu.f1:
+            flags |= store.FLAG_F1
+        if ecu.f2:
+            flags |= store.FLAG_F2
+        if ecu.regen_state:
+            flags |= store.FLAG_REGEN
+        if ecu.exhaust_sound:
+            flags |= store.FLAG_EXHAUST
+        return flags
+
+    def dump_flight_recorder(self):
+        Logger.trace("Applcation.dump_flight_recorder")
+
+        self.flight_recorder.dump()
+
+    def send_pad_activate(self):
+        Logger.trace("Applcation.send_pad_activate")
+
+        # The NMT start never changes, so the same message is queued every time
+        self.can_message_queue.push(self.pad_activate_message, CanPriority.KEYPAD)
+
+    def tick(self):
+        self.now = time.monotonic_ns()
+        if PROFILE_LOOP:
+            # Every tick updates the max tick time, start to start so it reads
+            # no clock; every Nth tick times each stage instead
+            elapsed_ns = self.now - self.profile_tick_at
+            if elapsed_ns > self.profile_max_ns:
+                self.profile_max_ns = elapsed_ns
+            self.profile_tick_at = self.now
+            self.profile_countdown -= 1
+            if not self.profile_countdown:
+                self.tick_profiled()
+                return
+
+        self.process_pulses()
+        self.process_timers()
+        self.process_can_bus()
+        self.process_can_message()
+        self.process_console()
+        self.ensure_pad_operational()
+        self.process_buttons()
+        self.process_battery_gauge()
+        self.process_pad_colors()
+        self.process_cruise()
+        self.process_can_message_queue()
+        self.persist_state()
+        self.collect_garbage()
+
+    def tick_profiled(self):
+        # Same stages as tick, each timed into its histogram
+        self.profile_countdown = FeatherSettings.PROFILE_SAMPLE_EVERY
+        # Counted here, for the ticks since the last sample
+        self.profile_ticks += FeatherSettings.PROFILE_SAMPLE_EVERY
+        profiler = self.profiler
+        stages = self.stages
+        stamps = self.profile_stamps
+        stamps[0] = self.now
+        for index in range(len(stages)):
+            stages[index]()
+            stamps[index + 1] = time.monotonic_ns()
+        profiler.record(stamps)
+        # A full window starts over rather than let the sums grow
+        if profiler.samples >= FeatherSettings.PROFILE_WINDOW:
+            profiler.reset()
+
+        last = stamps[-1]
+        if FeatherSettings.PROFILE_DUMP_INTERVAL and last >= self.profile_dump_at:
+            # Each summary covers the time since the last one
+            self.dump_loop_profile()
+            profiler.reset()
+            self.profile_dump_at = last + int(FeatherSettings.PROFILE_DUMP_INTERVAL * 1_000_000_000)
+
+    def dump_loop_profile(self, write=print):
+        Logger.trace("Applcation.dump_loop_profile")
+
+        if PROFILE_LOOP:
+            self.profiler.dump(write)
+            write(f"# ticks {self.profile_ticks}, {self.profiler.samples} sampled in this window, max tick {max(self.profile_max_ns, self.profiler.max_ns[-1]) // 1000} us")
+        else:
+            write("# loop profile: disabled, set PROFILE_LOOP = const(1)")
+
+    def process_pulses(self):
+        Logger.trace("Applcation.process_pulses")
+
+        self.pulse_scheduler.update(self.now)
+
+    def process_timers(self):
+        Logger.trace("Applcation.process_timers")
+
+        self.timers.update(self.now)
+
+    def process_can_bus(self):
+        Logger.trace("Applcation.process_can_bus")
+
+        self.current_bus_state = self.can.state
+
+        if self.current_bus_state != self.previous_bus_state:
+            Logger.info("CAN bus state: %s", self.current_bus_state)
+            self.previous_bus_state = self.current_bus_state
+            if self.current_bus_state == canio.BusState.BUS_OFF:
+                self.flight_recorder.trigger("bus-off")
+
+        # auto_restart brings the controller back by itself; this only decides what to send
+        if self.bus_supervisor.update(self.can, self.now) == CanBusSupervisor.RECOVERED:
+            # The keypad may have missed LED frames that were shed
+            self.pad.invalidate_colors()
+
+    def process_can_message(self):
+        Logger.trace("Applcation.process_can_message")
+
+        telemetry_slots = self.telemetry_slots
+        telemetry_latest = self.telemetry_latest
+        telemetry_data = self.telemetry_data
+        received = 0
+
+        # Buttons and heartbeats first, in arrival order
+        listener = self.priority_listener
+        while listener is not None and received < self.rx_budget:
+            message = listener.receive()
+            if message is None:
+                break
+            received += 1
+            # Each read of message.data builds a new bytes object: one read,
+            # for the recorder and the handler
+            data = message.data
+            self.flight_recorder.record_rx(message.id, data)
+            self._process_message_based_on_id(message, data)
+
+        listener = self.listener
+        while listener is not None and received < self.rx_budget:
+            message = listener.receive()
+            if message is None:
+                break
+            received += 1
+            data = message.data
+            self.flight_recorder.record_rx(message.id, data)
+
+            slot = telemetry_slots.get(message.id)
+            if slot is None:
+                self._process_message_based_on_id(message, data)
+            else:
+                if telemetry_latest[slot] is not None:
+                    self.rx_collapsed += 1
+                telemetry_latest[slot] = message
+                telemetry_data[slot] = data
+
+        if received >= self.rx_budget:
+            self.rx_budget_exhausted += 1
+
+        self.rx_received += received
+        self.rx_tick = received
+
+        for slot in range(len(telemetry_latest)):
+            message = telemetry_latest[slot]
+            if message is not None:
+                telemetry_latest[slot] = None
+                data = telemetry_data[slot]
+                telemetry_data[slot] = None
+                self._process_message_based_on_id(message, data)
+
+    def process_console(self):
+        Logger.trace("Applcation.process_console")
+
+        self.console.poll()
+
+    def process_buttons(self):
+        Logger.trace("Applcation.process_buttons")
+
+        # Only needed while a button is held or an edge is still debouncing
+        tracker = self.button_tracker
+        if tracker.stable_mask or tracker.raw_mask:
+            tracker.poll(self.now)
+
+    def process_battery_gauge(self):
+        Logger.trace("Applcation.process_battery_gauge")
+
+        voltage = self.battery_gauge.refresh_voltage(self.now)
+        if voltage is not None:
+            self.battery_gauge.update_battery_gauge(self.tesla_ecu.battery_percentage(voltage))
+
+    def process_pad_colors(self):
+        Logger.trace("Applcation.process_pad_colors")
+
+        # RPDOs sent to a keypad that is not started are ignored, and while the bus is
+        # unhealthy only the latest colors matter; both keep them for later
+        # Every state worth keeping across a reset shows on the LEDs, so a sent
+        # frame is what marks it for saving
+        if self.pad.state == PadState.OPERATIONAL and self.bus_supervisor.healthy:
+            if self.pad.flush_colors():
+                self.state_store.changed(self.now)
+
+    def process_cruise(self):
+        Logger.trace("Applcation.process_cruise")
+
+        # Right before the TX stage, so a due frame goes out on this tick
+        self.cruise.update(self.now)
+
+    def process_can_message_queue(self):
+        Logger.trace("Applcation.process_can_message_queue")
+
+        if self.current_bus_state == canio.BusState.BUS_OFF:
+            return
+
+        # While the bus is unhealthy only safety frames compete for it
+        classes = CanPriority.COUNT if self.bus_supervisor.healthy else CanBusSupervisor.DEGRADED_CLASSES
+        for _ in range(self.tx_budget):
+            message = self.can_message_queue.peek(classes)
+            if message is None:
+                return
+
+            try:
+                self.can.send(message)
+            except (RuntimeError, OSError) as e:
+                # Controller could not take the frame; leave it queued for the
+                # next tick. That repeats every tick of an outage, so only its
+                # start is worth a warning.
+                if not self.tx_stalled:
+                    Logger.warning("CAN send deferred: %s", e)
+                    self.tx_stalled = True
+                self.tx_deferred += 1
+                return
+            if self.tx_stalled:
+                Logger.notice("CAN send resumed, %s deferred so far", self.tx_deferred)
+                self.tx_stalled = False
+            # The one read of message.data for this frame
+            data = message.data
+            Logger.debug("Sending CAN message id: %s data: %s", message.id, data)
+            self.flight_recorder.record_tx(message.id, data)
+            self.can_message_queue.pop(classes)
+
+    def persist_state(self):
+        Logger.trace("Applcation.persist_state")
+
+        # A flash write blocks for milliseconds, so like a collection it waits
+        # for an idle tick
+        store = self.state_store
+        if not store.due(self.now):
+            return
+        if self.rx_tick or self.can_message_queue.size or self.button_tracker.raw_mask:
+            return
+
+        pad = self.pad
+        store.save(self.ecu.drive_state, self.state_flags(), pad.red_mask, pad.green_mask, pad.blue_mask)
+
+    def collect_garbage(self):
+        Logger.trace("Applcation.collect_garbage")
+
+        # Only between bursts of work, so a collection never delays a frame or a press
+        if self.rx_tick or self.can_message_queue.size or self.button_tracker.raw_mask:
+            return
+
+        now = self.now
+        if now < self.gc_due_at:
+            free = self.heap_free()
+            if free is None or free >= FeatherSettings.GC_LOW_WATER:
+                return
+
+        gc.collect()
+        elapsed = time.monotonic_ns() - now
+        self.gc_collections += 1
+        if elapsed > self.gc_max_ns:
+            self.gc_max_ns = elapsed
+        self.gc_due_at = now + int(FeatherSettings.GC_INTERVAL * 1_000_000_000)
+
+        free = self.heap_free()
+        if free is not None and (self.heap_free_min is None or free < self.heap_free_min):
+            self.heap_free_min = free
+
+    def heap_free(self):
+        # gc.mem_free is CircuitPython only
+        if hasattr(gc, "mem_free"):
+            return gc.mem_free()
+        return None
+
+    def heap_counters(self):
+        return {
+            "free": self.heap_free(),
+            "free_min": self.heap_free_min,
+            "free_at_boot": self.heap_free_boot,
+            "collections": self.gc_collections,
+            "collect_max_us": self.gc_max_ns // 1000,
+        }
+
+    def rx_counters(self):
+        return {
+            "received": self.rx_received,
+            "collapsed": self.rx_collapsed,
+            "unknown": self.rx_dropped,
+            "budget_exhausted": self.rx_budget_exhausted,
+            "tx_deferred": self.tx_deferred,
+        }
+
+    def pad_counters(self, now):
+        counters = self.pad_watchdog.counters(now)
+        counters["state"] = self.pad.state
+        return counters
+
+    def filter_counters(self):
+        # Frames the filters let through with no handler are false positives
+        counters = self.filter_plan.report()
+        counters["received"] = self.rx_received
+        counters["false_positive_frames"] = self.rx_dropped
+        return counters
+
+    def _process_message_based_on_id(self, message, data):
+        Logger.trace("Applcation._process_message_based_on_id")
+
+        self.message_handlers.get(message.id, self.unknown_message_handler)(message, data)
+
+    def _unknown_message(self, message, data):
+        Logger.trace("Applcation._unknown_message")
+
+        Logger.info("unknown message: [%s] %s", message.id, data)
+        self.rx_dropped += 1
+
+    def _process_pad_heartbeat(self, message, data):
+        Logger.trace("Applcation._process_pad_heartbeat")
+
+        now = time.monotonic_ns()
+        if self.pad.can_is_heartbeat_boot_up(data):
+            self.pad.to_boot_up()
+            self.pad_watchdog.expedite()
+            self.button_tracker.reset(now)
+        elif self.pad.can_is_heartbeat_pre_operational(data):
+            if self.pad.state != PadState.PRE_OPERATIONAL:
+                self.pad.to_pre_operational()
+                self.pad_watchdog.expedite()
+        elif self.pad.can_is_heartbeat_operational(data):
+            if self.pad.state != PadState.OPERATIONAL:
+                self.pad.to_operational()
+                self.pad_watchdog.recovered(now)
+            self.pad_watchdog.heartbeat(now)
+        else:
+            Logger.info("unknown heartbeat: [%s] %s", message.id, data)
+            self.flight_recorder.trigger("unknown heartbeat")
+
+    def _process_pad_button(self, message, data):
+        Logger.trace("Applcation._process_pad_button")
+
+        # Edges, not levels: a held button or a repeated state frame does not re-fire
+        self.button_tracker.update(Pad.decode_button_press(data), time.monotonic_ns())
+
+    def _process_battery_state(self, message, data):
+        Logger.trace("Application._process_battery_state")
+
+        voltage = self.tesla_ecu.decode_battery_state_to_voltage(data)
+        self.battery_gauge.filter_voltage(voltage)
+
+
+def boot():
+    Logger.current_level = Logger.WARNING
+    Logger.info("INIT: Starting Feather M4")
+
+    # If the CAN transceiver has a standby pin, bring it out of standby mode
+    if hasattr(board, 'CAN_STANDBY'):
+        Logger.info("INIT: Setting CAN_STANDBY")
+        standby = digitalio.DigitalInOut(board.CAN_STANDBY)
+        standby.switch_to_output(False)
+
+    # If the CAN transceiver is powered by a boost converter, turn on its supply
+    if hasattr(board, 'BOOST_ENABLE'):
+        Logger.info("INIT: Setting BOOST_ENABLE")
+        boost_enable = digitalio.DigitalInOut(board.BOOST_ENABLE)
+        boost_enable.switch_to_output(True)
+
+    Logger.info("INIT: Setting up main application")
+    application = Application()
+    # Start the loop from a clean heap; from here on collections happen on idle ticks
+    gc.collect()
+    # What is left once every module is loaded; stats heap shows it as free_at_boot
+    application.heap_free_boot = application.heap_free()
+    Logger.info("INIT: heap free after imports: %s", application.heap_free_boot)
+    if PROFILE_LOOP:
+        # The first tick's time starts here, not with the collection above
+        application.profile_tick_at = time.monotonic_ns()
+    return application
@@ -0,0 +1,638 @@
+# CAN plumbing: the prioritized TX queue, bus health, acceptance filter
+# planning, repeated/cyclic frames and the flight recorder.
+
+import struct
+import canio
+import supervisor
+
+from canpad.logger import Logger
+from canpad.timers import TimerScheduler
+
+
+class CanMessage:
+    __slots__ = ("id", "data")
+
+    def __init__(self, id, data):
+        self.id = id
+        # Ensure that data is 8 bytes long, padded with 0x00 if necessary
+        if isinstance(data, (list, bytes, bytearray)):
+            if len(data) > 8:
+                # If data is longer than 8 bytes, truncate it to 8 bytes
+                self.data = bytes(data[:8])
+            else:
+                # If data is shorter than 8 bytes, pad it to 8 bytes with 0x00
+                self.data = bytes(data) + bytes(8 - len(data))
+        else:
+            # If data is not a byte sequence, create a data payload of 8 bytes of 0x00
+            self.data = bytes([0x00] * 8)
+
+    def message(self):
+        Logger.trace("CanMessage.message")
+
+        return canio.Message(id=self.id, data=self.data)
+
+
+class CanPriority:
+    SAFETY = 0
+    KEYPAD = 1
+    LED = 2
+
+    COUNT = 3
+
+
+class CanMessageQueue:
+    DROP_OLDEST = 0
+    DROP_NEWEST = 1
+
+    # Per priority class: SAFETY, KEYPAD, LED
+    CAPACITY = (8, 4, 8)
+    OVERFLOW_POLICY = (DROP_OLDEST, DROP_OLDEST, DROP_OLDEST)
+
+    _instance = None
+
+    @classmethod
+    def get_instance(cls):
+        if cls._instance is None:
+            cls._instance = cls()
+        return cls._instance
+
+    def __init__(self):
+        self.slots = [[None] * capacity for capacity in self.CAPACITY]
+        self.heads = [0] * CanPriority.COUNT
+        self.counts = [0] * CanPriority.COUNT
+        self.size = 0
+
+        self.pushed = [0] * CanPriority.COUNT
+        self.dequeued = [0] * CanPriority.COUNT
+        self.dropped = [0] * CanPriority.COUNT
+        self.high_water = [0] * CanPriority.COUNT
+
+    def __len__(self):
+        return self.size
+
+    def push_with_id(self, id, data, priority=CanPriority.LED):
+        Logger.trace("CanMessageQueue.push_with_id")
+        return self.push(CanMessage(id, data).message(), priority)
+
+    def push(self, message, priority=CanPriority.LED):
+        Logger.trace("CanMessageQueue.push")
+
+        slots = self.slots[priority]
+        capacity = len(slots)
+        count = self.counts[priority]
+        self.pushed[priority] += 1
+
+        if count == capacity:
+            self.dropped[priority] += 1
+            if self.OVERFLOW_POLICY[priority] == self.DROP_NEWEST:
+                Logger.warning("CAN queue class %s full, dropping id %s", priority, message.id)
+                return False
+            Logger.warning("CAN queue class %s full, dropping oldest", priority)
+            slots[self.heads[priority]] = None
+            self.heads[priority] = (self.heads[priority] + 1) % capacity
+            count -= 1
+            self.size -= 1
+
+        slots[(self.heads[priority] + count) % capacity] = message
+        count += 1
+        self.counts[priority] = count
+        self.size += 1
+        if count > self.high_water[priority]:
+            self.high_water[priority] = count
+        return True
+
+    def push_latest(self, message, priority=CanPriority.SAFETY):
+        Logger.trace("CanMessageQueue.push_latest")
+
+        # For frames that carry state: one still queued with the same id is
+        # replaced in place, so a stalled bus holds only the newest. False then.
+        slots = self.slots[priority]
+        capacity = len(slots)
+        head = self.heads[priority]
+        id = message.id
+        for offset in range(self.counts[priority]):
+            index = (head + offset) % capacity
+            if slots[index].id == id:
+                slots[index] = message
+                self.pushed[priority] += 1
+                self.dropped[priority] += 1
+                return False
+        self.push(message, priority)
+        return True
+
+    def peek(self, classes=CanPriority.COUNT):
+        # classes limits the lookup to the most urgent classes, e.g. 1 for SAFETY only
+        if self.size:
+            for priority in range(classes):
+                if self.counts[priority]:
+                    return self.slots[priority][self.heads[priority]]
+        return None
+
+    def pop(self, classes=CanPriority.COUNT):
+        Logger.trace("CanMessageQueue.pop")
+
+        if self.size:
+            for priority in range(classes):
+                if self.counts[priority]:
+                    slots = self.slots[priority]
+                    head = self.heads[priority]
+                    queue_message = slots[head]
+                    slots[head] = None
+                    self.heads[priority] = (head + 1) % len(slots)
+                    self.counts[priority] -= 1
+                    self.size -= 1
+                    self.dequeued[priority] += 1
+
+                    return queue_message
+        return None
+
+    def shed(self, priority):
+        Logger.trace("CanMessageQueue.shed")
+
+        slots = self.slots[priority]
+        count = self.counts[priority]
+        for index in range(len(slots)):
+            slots[index] = None
+        self.heads[priority] = 0
+        self.counts[priority] = 0
+        self.size -= count
+        self.dropped[priority] += count
+        return count
+
+    def collapse(self, priority):
+        Logger.trace("CanMessageQueue.collapse")
+
+        # Keeps only the newest queued frame per CAN id, in their original order
+        slots = self.slots[priority]
+        capacity = len(slots)
+        head = self.heads[priority]
+        count = self.counts[priority]
+        kept = []
+        for offset in range(count - 1, -1, -1):
+            message = slots[(head + offset) % capacity]
+            for newer in kept:
+                if newer.id == message.id:
+                    break
+            else:
+                kept.append(message)
+
+        self.shed(priority)
+        self.dropped[priority] -= len(kept)
+        for index in range(len(kept)):
+            slots[index] = kept[len(kept) - 1 - index]
+        self.counts[priority] = len(kept)
+        self.size += len(kept)
+        return count - len(kept)
+
+    def counters(self):
+        return {
+            "queued": list(self.counts),
+            "pushed": list(self.pushed),
+            "dequeued": list(self.dequeued),
+            "dropped": list(self.dropped),
+            "high_water": list(self.high_water),
+        }
+
+
+class CanBusSupervisor:
+    # Rank of each controller state; ERROR_PASSIVE and worse count as unhealthy
+    STATES = (
+        canio.BusState.ERROR_ACTIVE,
+        canio.BusState.ERROR_WARNING,
+        canio.BusState.ERROR_PASSIVE,
+        canio.BusState.BUS_OFF,
+    )
+    UNHEALTHY_RANK = 2
+    # Queue classes still sent while unhealthy: SAFETY only
+    DEGRADED_CLASSES = 1
+
+    UNCHANGED = 0
+    DEGRADED = 1
+    RECOVERED = 2
+
+    __slots__ = (
+        "can_message_queue", "state", "state_since", "healthy", "unhealthy_since", "time_in_state",
+        "entries", "transmit_error_count", "receive_error_count", "max_transmit_error_count",
+        "max_receive_error_count", "shed", "collapsed", "recoveries", "last_outage_ns",
+    )
+
+    def __init__(self):
+        self.can_message_queue = CanMessageQueue.get_instance()
+        self.state = None
+        self.state_since = 0
+        self.healthy = True
+        self.unhealthy_since = 0
+        self.time_in_state = [0] * len(self.STATES)
+        self.entries = [0] * len(self.STATES)
+        self.transmit_error_count = 0
+        self.receive_error_count = 0
+        self.max_transmit_error_count = 0
+        self.max_receive_error_count = 0
+        self.shed = 0
+        self.collapsed = 0
+        self.recoveries = 0
+        self.last_outage_ns = 0
+
+    def update(self, can, now):
+        # Error counters are cheap attribute reads; a state change is rare
+        self.transmit_error_count = can.transmit_error_count
+        self.receive_error_count = can.receive_error_count
+        if self.transmit_error_count > self.max_transmit_error_count:
+            self.max_transmit_error_count = self.transmit_error_count
+        if self.receive_error_count > self.max_receive_error_count:
+            self.max_receive_error_count = self.receive_error_count
+
+        state = can.state
+        if state == self.state:
+            return CanBusSupervisor.UNCHANGED
+
+        return self.change_state(state, now)
+
+    def change_state(self, state, now):
+        Logger.trace("CanBusSupervisor.change_state")
+
+        if self.state is not None:
+            self.time_in_state[self.STATES.index(self.state)] += now - self.state_since
+        self.state = state
+        self.state_since = now
+        rank = self.STATES.index(state)
+        self.entries[rank] += 1
+
+        healthy = rank < CanBusSupervisor.UNHEALTHY_RANK
+        if healthy == self.healthy:
+            return CanBusSupervisor.UNCHANGED
+
+        self.healthy = healthy
+        if not healthy:
+            # LED frames are state, not events: drop them now and resend the latest on recovery
+            self.unhealthy_since = now
+            self.shed += self.can_message_queue.shed(CanPriority.LED)
+            Logger.warning("CAN bus unhealthy (%s), tec=%s rec=%s", state, self.transmit_error_count, self.receive_error_count)
+            return CanBusSupervisor.DEGRADED
+
+        # Whatever piled up while degraded is stale; keep only the latest frame per id
+        for priority in range(CanPriority.COUNT):
+            self.collapsed += self.can_message_queue.collapse(priority)
+        self.recoveries += 1
+        self.last_outage_ns = now - self.unhealthy_since
+        Logger.warning("CAN bus recovered after %s ms", self.last_outage_ns // 1_000_000)
+        return CanBusSupervisor.RECOVERED
+
+    def counters(self, now):
+        time_in_state = list(self.time_in_state)
+        if self.state is not None:
+            time_in_state[self.STATES.index(self.state)] += now - self.state_since
+        return {
+            "state": self.state,
+            "tec": self.transmit_error_count,
+            "rec": self.receive_error_count,
+            "max_tec": self.max_transmit_error_count,
+            "max_rec": self.max_receive_error_count,
+            "time_in_state_ms": [elapsed // 1_000_000 for elapsed in time_in_state],
+            "entries": list(self.entries),
+            "shed": self.shed,
+            "collapsed": self.collapsed,
+            "recoveries": self.recoveries,
+            "last_outage_ms": self.last_outage_ns // 1_000_000,
+        }
+
+
+class CanFilterPlanner:
+    # Fits the standard ids the firmware handles into the acceptance filters
+    # CircuitPython sets up on the SAM E5x: two RX FIFOs, so at most two listeners,
+    # sharing four filter elements that each take two exact ids or one id/mask.
+    # Priority ids get their own listener and stay exact where they fit; the rest
+    # share the elements left over, merged into masks that let as few other ids
+    # through as the planner can find. Runs once, at boot.
+    FILTER_ELEMENTS = 4
+    MAX_LISTENERS = 2
+    STANDARD_MASK = 0x7FF
+    STANDARD_IDS = 0x800
+
+    __slots__ = ("ids", "priority_groups", "groups")
+
+    def __init__(self, priority_ids, ids, elements=FILTER_ELEMENTS):
+        Logger.trace("CanFilterPlanner.__init__")
+
+        self.ids = tuple(sorted(ids))
+        priority = [id for id in self.ids if id in priority_ids]
+        other = [id for id in self.ids if id not in priority_ids]
+        if not priority:
+            priority_elements = 0
+        elif other:
+            priority_elements = max(1, min(elements - 1, (len(priority) + 1) // 2))
+        else:
+            priority_elements = elements
+        self.priority_groups = self.plan(priority, priority_elements)
+        self.groups = self.plan(other, elements - self.elements(self.priority_groups))
+        if self.elements(self.groups) + self.elements(self.priority_groups) > elements:
+            raise RuntimeError("CAN filters do not fit in %s elements" % elements)
+
+    @staticmethod
+    def elements(groups):
+        exact = 0
+        masked = 0
+        for _, mask in groups:
+            if mask == CanFilterPlanner.STANDARD_MASK:
+                exact += 1
+            else:
+                masked += 1
+        return masked + (exact + 1) // 2
+
+    @staticmethod
+    def accepted(mask):
+        # Ids a single id/mask pair lets through
+        return 1 << (11 - bin(mask).count("1"))
+
+    @staticmethod
+    def covers(group, other):
+        # True when every id other accepts is also accepted by group
+        id, mask = group
+        return other[1] & mask == mask and other[0] & mask == id
+
+    def plan(self, ids, elements):
+        Logger.trace("CanFilterPlanner.plan")
+
+        if (len(ids) + 1) // 2 <= elements:
+            return [(id, CanFilterPlanner.STANDARD_MASK) for id in ids]
+        # Neither way of merging wins every time; keep whichever lets fewer strays in
+        plans = [self.merge(ids, elements)]
+        if len(ids) - 2 * (elements - 1) > 1:
+            plans.append(self.share_mask(ids, elements))
+        plans.sort(key=lambda groups: self.unwanted(groups, ids))
+        return plans[0]
+
+    def merge(self, ids, elements):
+        Logger.trace("CanFilterPlanner.merge")
+
+        # Pairwise: repeatedly merge the two groups whose combined mask accepts the fewest ids
+        groups = [(id, CanFilterPlanner.STANDARD_MASK) for id in ids]
+        while len(groups) > 1 and self.elements(groups) > elements:
+            best = None
+            for i in range(len(groups)):
+                for j in range(i + 1, len(groups)):
+                    mask = groups[i][1] & groups[j][1] & ~(groups[i][0] ^ groups[j][0]) & CanFilterPlanner.STANDARD_MASK
+                    if best is None or self.accepted(mask) < self.accepted(best[1]):
+                        best = (groups[i][0] & mask, mask)
+            # Anything else the new mask covers comes along for free
+            groups = [group for group in groups if not self.covers(best, group)]
+            groups.append(best)
+        groups.sort()
+        return groups
+
+    def share_mask(self, ids, elements):
+        Logger.trace("CanFilterPlanner.share_mask")
+
+        # One mask over the ids that share the most bits; the rest stay exact, in pairs.
+        # A mask only loses bits as ids join, so a branch stops once it cannot win.
+        size = len(ids) - 2 * (elements - 1)
+        best = [0, None]
+
+        def search(start, chosen, mask):
+            bits = bin(mask).count("1")
+            if bits <= best[0]:
+                return
+            if len(chosen) == size:
+                best[0] = bits
+                best[1] = list(chosen)
+                return
+            for index in range(start, len(ids) - (size - len(chosen)) + 1):
+                chosen.append(ids[index])
+                search(index + 1, chosen, mask & ~(chosen[0] ^ ids[index]))
+                chosen.pop()
+
+        search(0, [], CanFilterPlanner.STANDARD_MASK)
+        if best[1] is None:
+            mask = 0
+            shared = (0, 0)
+        else:
+            mask = CanFilterPlanner.STANDARD_MASK
+            for id in best[1]:
+                mask &= ~(best[1][0] ^ id)
+            shared = (best[1][0] & mask, mask)
+        groups = [(id, CanFilterPlanner.STANDARD_MASK) for id in ids if not self.covers(shared, (id, CanFilterPlanner.STANDARD_MASK))]
+        groups.append(shared)
+        groups.sort()
+        return groups
+
+    def unwanted(self, groups, ids):
+        # Ids the masks accept that nobody handles; overlapping masks count twice
+        unwanted = 0
+        for base, mask in groups:
+            if mask != CanFilterPlanner.STANDARD_MASK:
+                unwanted += self.accepted(mask)
+                for id in ids:
+                    if id & mask == base:
+                        unwanted -= 1
+        return unwanted
+
+    @staticmethod
+    def matches(groups):
+        return [
+            canio.Match(id) if mask == CanFilterPlanner.STANDARD_MASK else canio.Match(id, mask=mask)
+            for id, mask in groups
+        ]
+
+    def accepted_ids(self):
+        # Scans every standard id; for reports, not for the loop
+        accepted = 0
+        groups = self.priority_groups + self.groups
+        for id in range(CanFilterPlanner.STANDARD_IDS):
+            for base, mask in groups:
+                if id & mask == base:
+                    accepted += 1
+                    break
+        return accepted
+
+    def report(self):
+        accepted = self.accepted_ids()
+        return {
+            "elements": self.elements(self.priority_groups) + self.elements(self.groups),
+            "priority_matches": ["%03X/%03X" % group for group in self.priority_groups],
+            "matches": ["%03X/%03X" % group for group in self.groups],
+            "subscribed_ids": len(self.ids),
+            "accepted_ids": accepted,
+            "false_positive_ids": accepted - len(self.ids),
+        }
+
+
+class CanTxScheduler:
+    MAX_JOBS = 4
+    CYCLIC = -1
+
+    _instance = None
+
+    @classmethod
+    def get_instance(cls):
+        if cls._instance is None:
+            cls._instance = cls()
+        return cls._instance
+
+    def __init__(self):
+        self.can_message_queue = CanMessageQueue.get_instance()
+        self.timers = TimerScheduler.get_instance()
+        # One job per CAN id; a newer job for the same id replaces the pending one
+        self.ids = [None] * self.MAX_JOBS
+        self.messages = [None] * self.MAX_JOBS
+        self.priorities = [0] * self.MAX_JOBS
+        self.remaining = [0] * self.MAX_JOBS
+        self.timer_handles = [None] * self.MAX_JOBS
+        self.callbacks = tuple(self.job_callback(slot) for slot in range(self.MAX_JOBS))
+        self.sent = 0
+        self.superseded = 0
+
+    def job_callback(self, slot):
+        return lambda now: self.fire(slot)
+
+    def repeat(self, id, data, count, interval_ns, priority=CanPriority.SAFETY):
+        Logger.trace("CanTxScheduler.repeat")
+
+        return self.start(id, data, count, interval_ns, priority)
+
+    def cyclic(self, id, data, interval_ns, priority=CanPriority.SAFETY):
+        Logger.trace("CanTxScheduler.cyclic")
+
+        return self.start(id, data, CanTxScheduler.CYCLIC, interval_ns, priority)
+
+    def start(self, id, data, count, interval_ns, priority):
+        Logger.trace("CanTxScheduler.start")
+
+        slot = self.find(id)
+        if slot is not None:
+            Logger.debug("Superseding pending frames for id %s", id)
+            self.superseded += 1
+            self.release(slot)
+        else:
+            slot = self.find(None)
+            if slot is None:
+                Logger.error("No free TX job for id %s", id)
+                return False
+
+        self.ids[slot] = id
+        self.messages[slot] = CanMessage(id, data).message()
+        self.priorities[slot] = priority
+        self.remaining[slot] = count
+        # The first frame goes out with this tick, the rest on the timer
+        self.fire(slot)
+        if self.ids[slot] is not None:
+            self.timer_handles[slot] = self.timers.periodic(self.callbacks[slot], interval_ns)
+        return True
+
+    def find(self, id):
+        for slot in range(self.MAX_JOBS):
+            if self.ids[slot] == id:
+                return slot
+        return None
+
+    def fire(self, slot):
+        self.can_message_queue.push(self.messages[slot], self.priorities[slot])
+        self.sent += 1
+        if self.remaining[slot] != CanTxScheduler.CYCLIC:
+            self.remaining[slot] -= 1
+            if not self.remaining[slot]:
+                self.release(slot)
+
+    def cancel(self, id):
+        Logger.trace("CanTxScheduler.cancel")
+
+        slot = self.find(id)
+        if slot is None:
+            return False
+        self.release(slot)
+        return True
+
+    def release(self, slot):
+        self.timers.cancel(self.timer_handles[slot])
+        self.timer_handles[slot] = None
+        self.ids[slot] = None
+        self.messages[slot] = None
+        self.remaining[slot] = 0
+
+    def is_active(self, id):
+        return id is not None and id in self.ids
+
+
+class CanFlightRecorder:
+    # One record per frame: ticks_ms, id, dlc, flags, 8 data bytes
+    RECORD_FORMAT = "<IHBB8s"
+    RECORD_SIZE = 16
+    RECORDS = 256
+    # Frames still recorded after a trigger, so the aftermath is captured too
+    POST_TRIGGER_RECORDS = 16
+    TICKS_PERIOD = 1 << 29
+
+    FLAG_TX = 0x01
+
+    _instance = None
+
+    @classmethod
+    def get_instance(cls):
+        if cls._instance is None:
+            cls._instance = cls()
+        return cls._instance
+
+    def __init__(self):
+        self.buffer = bytearray(self.RECORD_SIZE * self.RECORDS)
+        self.next_record = 0
+        self.count = 0
+        self.frozen = False
+        self.trigger_reason = None
+        self.post_trigger_remaining = 0
+
+    def record(self, id, data, flags):
+        # data is the payload the caller already read: each read of
+        # message.data builds a new bytes object
+        if self.frozen:
+            return
+
+        struct.pack_into(self.RECORD_FORMAT, self.buffer, self.next_record * self.RECORD_SIZE,
+                         supervisor.ticks_ms(), id, len(data), flags, data)
+        self.next_record = (self.next_record + 1) % self.RECORDS
+        if self.count < self.RECORDS:
+            self.count += 1
+
+        if self.trigger_reason is not None:
+            self.post_trigger_remaining -= 1
+            if self.post_trigger_remaining <= 0:
+                self.frozen = True
+
+    def record_rx(self, id, data):
+        self.record(id, data, 0)
+
+    def record_tx(self, id, data):
+        self.record(id, data, self.FLAG_TX)
+
+    def trigger(self, reason):
+        if self.trigger_reason is not None:
+            return
+
+        Logger.warning("Flight recorder triggered: %s", reason)
+        self.trigger_reason = reason
+        self.post_trigger_remaining = self.POST_TRIGGER_RECORDS
+        if self.post_trigger_remaining <= 0:
+            self.frozen = True
+
+    def rearm(self):
+        self.frozen = False
+        self.trigger_reason = None
+        self.next_record = 0
+        self.count = 0
+
+    def records(self):
+        first = (self.next_record - self.count) % self.RECORDS
+        for index in range(self.count):
+            yield struct.unpack_from(self.RECORD_FORMAT, self.buffer, ((first + index) % self.RECORDS) * self.RECORD_SIZE)
+
+    def dump(self, write=print, interface="can0"):
+        # candump -L format, timestamps relative to the oldest record:
+        #   (0000000.012000) can0 195#0100000000000000
+        Logger.trace("CanFlightRecorder.dump")
+
+        write(f"# flight recorder: {self.count} frames, trigger: {self.trigger_reason}")
+        start = None
+        for ticks, id, dlc, flags, data in self.records():
+            if start is None:
+                start = ticks
+            elapsed = (ticks - start) % self.TICKS_PERIOD
+            direction = "T" if flags & self.FLAG_TX else "R"
+            write(f"({elapsed // 1000:07d}.{(elapsed % 1000) * 1000:06d}) {interface} {id:03X}#{data[:dlc].hex().upper()} {direction}")
@@ -0,0 +1,203 @@
+# Line commands on the USB serial port.
+
+import binascii
+import time
+import canio
+import usb_cdc
+
+from canpad.canbus import CanFilterPlanner, CanMessage, CanPriority
+from canpad.logger import Logger
+from canpad.pad import PadButton
+
+
+class SerialConsole:
+    # Line commands on the USB serial port, read without blocking once per tick.
+    # Connect with `screen /dev/tty.usbmodem* 115200` and type `help`.
+    LINE_MAX = 64
+    # Bytes taken from the port per tick, so a paste cannot stall the loop
+    READ_MAX = 16
+    LEVELS = ("emergency", "alert", "critical", "error", "warning", "notice", "info", "debug", "trace")
+    HELP = (
+        "log [level]                 show or set the log level (name or 0-8)",
+        "stats [section ...]         counters: queue pad bus rx heap filters nvm cruise",
+        "state                       ECU and keypad state",
+        "led <button|all> <color>    force LED colors until the firmware sets them again",
+        "inject <id>#<hex>           handle a frame as if it was received",
+        "send <id>#<hex>             queue a frame for the bus",
+        "recorder                    dump the CAN flight recorder",
+        "profile                     dump the loop profile",
+    )
+
+    __slots__ = ("application", "serial", "line", "line_length", "overflow", "non_ascii", "commands", "executed")
+
+    def __init__(self, application, serial):
+        self.application = application
+        self.serial = serial
+        if serial is not None:
+            # read() must return what is there, not wait for more
+            serial.timeout = 0
+        self.line = bytearray(SerialConsole.LINE_MAX)
+        self.line_length = 0
+        self.overflow = False
+        # Commands are ASCII; anything else would not decode
+        self.non_ascii = False
+        self.commands = {
+            "help": self.command_help,
+            "log": self.command_log,
+            "stats": self.command_stats,
+            "state": self.command_state,
+            "led": self.command_led,
+            "inject": self.command_inject,
+            "send": self.command_send,
+            "recorder": self.command_recorder,
+            "profile": self.command_profile,
+        }
+        self.executed = 0
+
+    @staticmethod
+    def find_serial():
+        # The data channel when boot.py enables it, so replies do not mix with the REPL
+        if usb_cdc.data is not None:
+            return usb_cdc.data
+        return usb_cdc.console
+
+    def poll(self):
+        # Idle cost is one in_waiting read
+        serial = self.serial
+        if serial is None or not serial.in_waiting:
+            return
+
+        Logger.trace("SerialConsole.poll")
+
+        data = serial.read(min(serial.in_waiting, SerialConsole.READ_MAX))
+        serial.write(data)
+        for byte in data:
+            if byte == 0x0D or byte == 0x0A:
+                if byte == 0x0D:
+                    serial.write(b"\n")
+                if self.overflow:
+                    self.write("error: line longer than %s characters" % SerialConsole.LINE_MAX)
+                elif self.non_ascii:
+                    self.write("error: line has non-ASCII characters")
+                elif self.line_length:
+                    self.execute(str(self.line[:self.line_length], "utf-8"))
+                self.line_length = 0
+                self.overflow = False
+                self.non_ascii = False
+            elif byte >= 0x80:
+                self.non_ascii = True
+            elif self.line_length < SerialConsole.LINE_MAX:
+                self.line[self.line_length] = byte
+                self.line_length += 1
+            else:
+                self.overflow = True
+
+    def write(self, text):
+        self.serial.write(text.encode() + b"\r\n")
+
+    def execute(self, text):
+        Logger.trace("SerialConsole.execute")
+
+        words = text.split()
+        if not words:
+            return
+        command = self.commands.get(words[0].lower())
+        if command is None:
+            self.write("unknown command: %s, try help" % words[0])
+            return
+        self.executed += 1
+        try:
+            command(words[1:])
+        except (ValueError, KeyError, IndexError) as e:
+            self.write("error: %s" % e)
+
+    def write_counters(self, name, counters):
+        self.write("%s: %s" % (name, " ".join("%s=%s" % item for item in counters.items())))
+
+    def parse_frame(self, text):
+        id, _, data = text.partition("#")
+        id = int(id, 16)
+        if not 0 <= id <= CanFilterPlanner.STANDARD_MASK:
+            raise ValueError("not a standard id: %s" % text)
+        data = binascii.unhexlify(data)
+        if len(data) > 8:
+            raise ValueError("more than 8 data bytes")
+        return id, data
+
+    def command_help(self, args):
+        for line in SerialConsole.HELP:
+            self.write(line)
+
+    def command_log(self, args):
+        if args:
+            name = args[0].lower()
+            level = int(name) if name.isdigit() else SerialConsole.LEVELS.index(name)
+            if not 0 <= level < len(SerialConsole.LEVELS):
+                raise ValueError("no log level %s" % name)
+            Logger.current_level = level
+        level = Logger.current_level
+        self.write("log level: %s (%s)" % (level, SerialConsole.LEVELS[level]))
+
+    def command_stats(self, args):
+        application = self.application
+        now = time.monotonic_ns()
+        sections = {
+            "queue": application.can_message_queue.counters,
+            "pad": lambda: application.pad_counters(now),
+            "bus": lambda: application.bus_supervisor.counters(now),
+            "rx": application.rx_counters,
+            "heap": application.heap_counters,
+            "filters": application.filter_counters,
+            "nvm": application.state_store.counters,
+            "cruise": application.cruise.counters,
+        }
+        for name in args or sections:
+            self.write_counters(name, sections[name]())
+
+    def command_state(self, args):
+        ecu = self.application.ecu
+        self.write_counters("ecu", {
+            "drive": ("park", "reverse", "neutral", "drive")[ecu.drive_state],
+            "hazard": ecu.hazard,
+            "regen": ecu.regen_state,
+            "exhaust": ecu.exhaust_sound,
+            "cruise": ecu.cruise_state,
+            "cruise_speed": ecu.target_cruise_speed,
+            "f1": ecu.f1,
+            "f2": ecu.f2,
+        })
+        pad = self.application.pad
+        self.write_counters("pad", {
+            "state": pad.state,
+            "colors": str(binascii.hexlify(pad.encode_button_colors()[:5]), "ascii"),
+        })
+
+    def command_led(self, args):
+        button, color = args[0].upper(), args[1].lower()
+        if color not in PadButton.COLORS:
+            raise ValueError("colors: %s" % " ".join(PadButton.COLORS))
+        if button == "ALL":
+            button_ids = range(PadButton.BUTTON_COUNT)
+        elif button in PadButton.BUTTONS:
+            button_ids = (PadButton.BUTTONS[button],)
+        else:
+            raise ValueError("buttons: all %s" % " ".join(PadButton.BUTTON_NAMES))
+        for button_id in button_ids:
+            self.application.pad.update_color(button_id, color)
+        self.write("ok")
+
+    def command_inject(self, args):
+        id, data = self.parse_frame(args[0])
+        self.application._process_message_based_on_id(canio.Message(id=id, data=data), data)
+        self.write("ok")
+
+    def command_send(self, args):
+        id, data = self.parse_frame(args[0])
+        self.application.can_message_queue.push(CanMessage(id, data).message(), CanPriority.LED)
+        self.write("ok")
+
+    def command_recorder(self, args):
+        self.application.flight_recorder.dump(self.write)
+
+    def command_profile(self, args):
+        self.application.dump_loop_profile(self.write)
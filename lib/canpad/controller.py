@@ -0,0 +1,311 @@
+# What each keypad button does to the ECU and the LEDs.
+
+from canpad.ecu import ECUState
+from canpad.logger import Logger
+from canpad.pad import ButtonEvent, PadButton
+from canpad.timers import TimerScheduler
+
+
+class ButtonKind:
+    # TOGGLE: the action returns the new state, the button shows on or off.
+    # RADIO: the button lights, the rest of its group goes off, then the action.
+    # MOMENTARY: lit while held; the action gets every ButtonEvent and the hold time.
+    TOGGLE = 0
+    RADIO = 1
+    MOMENTARY = 2
+
+
+class VehicleController:
+    HAZARD_BLINK_NS = 1_000_000_000
+    CRUISE_PULSE_NS = 500_000_000
+    INDICATOR_FLASH_NS = 150_000_000
+    INDICATOR_FLASHES = 3
+
+    HAZARD = PadButton.BUTTONS["HAZARD"]
+    AUTOPILOT_ON = PadButton.BUTTONS["AUTOPILOT_ON"]
+    F1 = PadButton.BUTTONS["F1"]
+    F2 = PadButton.BUTTONS["F2"]
+
+    # name: (kind, group, on color, off color, interlock, action)
+    # The action is process_button_pressed_<action>. The interlock names a method
+    # returning False while a press must be ignored. Compiled into the button_*
+    # tuples below by compile_behaviors, so a press costs no name lookups.
+    BUTTON_BEHAVIORS = {
+        "HAZARD": (ButtonKind.TOGGLE, None, "yellow", "black", None, "hazard"),
+        "PARK": (ButtonKind.RADIO, "gear", "blue", "black", None, "park"),
+        "REVERSE": (ButtonKind.RADIO, "gear", "blue", "black", None, "reverse"),
+        "NEUTRAL": (ButtonKind.RADIO, "gear", "blue", "black", None, "neutral"),
+        "DRIVE": (ButtonKind.RADIO, "gear", "blue", "black", None, "drive"),
+        "EXHAUST_SOUND": (ButtonKind.TOGGLE, None, "yellow", "black", None, "exhaust_sound"),
+        "F1": (ButtonKind.RADIO, "function", "cyan", "black", None, "f1"),
+        "F2": (ButtonKind.RADIO, "function", "yellow", "black", None, "f2"),
+        # "REGEN": (ButtonKind.TOGGLE, None, "yellow", "black", None, "regen"),
+        "AUTOPILOT_ON": (ButtonKind.TOGGLE, None, "blue", "black", None, "autopilot_on"),
+        "AUTOPILOT_SPEED_UP": (ButtonKind.MOMENTARY, None, "green", "black", "cruise_engaged", "autopilot_speed_up"),
+        # The keypad LEDs are 1 bit per channel, so no orange; red is the closest
+        "AUTOPILOT_SPEED_DOWN": (ButtonKind.MOMENTARY, None, "red", "black", "cruise_engaged", "autopilot_speed_down"),
+    }
+
+    __slots__ = (
+        "ecu", "pad", "parking_brake", "cruise", "timers", "hazard_timer", "hazard_lit", "cruise_timer",
+        "cruise_lit", "indicator_timer", "indicator_button", "indicator_toggles",
+        "button_kinds", "button_actions", "button_interlocks", "button_on_colors", "button_off_colors",
+    )
+
+    def __init__(self, ecu, pad, parking_brake, cruise):
+        self.ecu = ecu
+        self.pad = pad
+        self.parking_brake = parking_brake
+        self.cruise = cruise
+        self.timers = TimerScheduler.get_instance()
+        self.hazard_timer = None
+        self.hazard_lit = False
+        self.cruise_timer = None
+        self.cruise_lit = False
+        self.indicator_timer = None
+        self.indicator_button = None
+        self.indicator_toggles = 0
+        self.compile_behaviors()
+
+    def compile_behaviors(self):
+        Logger.trace("VehicleController.compile_behaviors")
+
+        # Everything indexed by button id. The colors are (mask, red, green, blue)
+        # for Pad.apply_colors: on covers the whole radio group, off the button.
+        count = PadButton.BUTTON_COUNT
+        kinds = [None] * count
+        actions = [None] * count
+        interlocks = [None] * count
+        on_colors = [None] * count
+        off_colors = [None] * count
+
+        # A button without a group is a group of its own
+        group_masks = {}
+        group_off = {}
+        for name, (kind, group, on, off, interlock, action) in self.BUTTON_BEHAVIORS.items():
+            group = name if group is None else group
+            bit = PadButton.get_button_bit(PadButton.BUTTONS[name])
+            red, green, blue = self.color_bits(off, bit)
+            group_red, group_green, group_blue = group_off.get(group, (0, 0, 0))
+            group_off[group] = (group_red | red, group_green | green, group_blue | blue)
+            group_masks[group] = group_masks.get(group, 0) | bit
+
+        for name, (kind, group, on, off, interlock, action) in self.BUTTON_BEHAVIORS.items():
+            group = name if group is None else group
+            button_id = PadButton.BUTTONS[name]
+            bit = PadButton.get_button_bit(button_id)
+            red, green, blue = self.color_bits(on, bit)
+            group_red, group_green, group_blue = group_off[group]
+            on_colors[button_id] = (
+                group_masks[group], group_red & ~bit | red, group_green & ~bit | green, group_blue & ~bit | blue,
+            )
+            off_colors[button_id] = (bit,) + self.color_bits(off, bit)
+            kinds[button_id] = kind
+            actions[button_id] = getattr(self, "process_button_pressed_" + action)
+            interlocks[button_id] = None if interlock is None else getattr(self, interlock)
+
+        self.button_kinds = tuple(kinds)
+        self.button_actions = tuple(actions)
+        self.button_interlocks = tuple(interlocks)
+        self.button_on_colors = tuple(on_colors)
+        self.button_off_colors = tuple(off_colors)
+
+    @staticmethod
+    def color_bits(color, bit):
+        red, green, blue = PadButton.COLORS[color]
+        return (bit if red else 0, bit if green else 0, bit if blue else 0)
+
+    def init_drive_state(self):
+        Logger.trace("VehicleController.init_drive_state")
+
+        Logger.debug("Initializing drive state")
+
+        button_state = {
+            "DRIVE": "black",
+            "REVERSE": "black",
+            "NEUTRAL": "blue",
+            "PARK": "blue" if self.parking_brake.is_engaged() else "black",
+        }
+
+        if self.parking_brake.is_engaged():
+            Logger.debug("  Parking brake is engaged")
+            self.ecu.set_drive_state(ECUState.PARK)
+            self.parking_brake.engage()
+
+        for button, color in button_state.items():
+            button_id = PadButton.get_button_id(button)
+            Logger.debug("  Attempting to set button %s to color %s", button_id, color)
+            self.pad.update_color(button_id, color)
+
+    def process_button_pressed(self, button_id):
+        Logger.trace("VehicleController.process_button_pressed")
+
+        kind = self.button_kinds[button_id]
+        if kind is None:
+            Logger.info("No action defined for button ID: %s", button_id)
+            return
+
+        interlock = self.button_interlocks[button_id]
+        if interlock is not None and not interlock():
+            Logger.info("Button %s interlocked", button_id)
+            return
+
+        if kind == ButtonKind.TOGGLE:
+            self.light(button_id, self.button_actions[button_id]())
+        elif kind == ButtonKind.RADIO:
+            self.light(button_id, True)
+            self.button_actions[button_id]()
+        else:
+            self.light(button_id, True)
+            self.button_actions[button_id](ButtonEvent.PRESS, 0)
+
+    def process_button_event(self, button_id, event, held_ns):
+        Logger.trace("VehicleController.process_button_event")
+
+        if event == ButtonEvent.PRESS:
+            self.process_button_pressed(button_id)
+        elif self.button_kinds[button_id] == ButtonKind.MOMENTARY:
+            # A release always turns the LED off, even if the interlock closed meanwhile
+            if event == ButtonEvent.RELEASE:
+                self.light(button_id, False)
+            else:
+                interlock = self.button_interlocks[button_id]
+                if interlock is not None and not interlock():
+                    return
+            self.button_actions[button_id](event, held_ns)
+
+    def light(self, button_id, on):
+        # One mask update for the button, or for its whole radio group when on
+        mask, red, green, blue = self.button_on_colors[button_id] if on else self.button_off_colors[button_id]
+        self.pad.apply_colors(mask, red, green, blue)
+
+    def process_button_pressed_hazard(self):
+        Logger.trace("VehicleController.process_button_hazard")
+
+        self.timers.cancel(self.hazard_timer)
+        self.hazard_timer = None
+        self.ecu.set_hazard_lights(not self.ecu.hazard)
+        if self.ecu.hazard == ECUState.ENABLED:
+            self.hazard_lit = True
+            self.hazard_timer = self.timers.periodic(self.blink_hazard, VehicleController.HAZARD_BLINK_NS)
+        return self.ecu.hazard
+
+    def blink_hazard(self, now):
+        self.hazard_lit = not self.hazard_lit
+        self.light(VehicleController.HAZARD, self.hazard_lit)
+
+    def flash_indicator(self, button_id):
+        Logger.trace("VehicleController.flash_indicator")
+
+        # Blinks the newly selected button a few times, then leaves it lit
+        self.timers.cancel(self.indicator_timer)
+        self.indicator_button = button_id
+        self.indicator_toggles = 2 * VehicleController.INDICATOR_FLASHES
+        self.indicator_timer = self.timers.periodic(self.toggle_indicator, VehicleController.INDICATOR_FLASH_NS)
+
+    def toggle_indicator(self, now):
+        self.indicator_toggles -= 1
+        self.light(self.indicator_button, self.indicator_toggles % 2 == 0)
+        if not self.indicator_toggles:
+            self.timers.cancel(self.indicator_timer)
+            self.indicator_timer = None
+
+    def process_button_drive_change(self, new_state):
+        Logger.trace("VehicleController.process_button_drive_change")
+
+        if new_state == ECUState.REVERSE or new_state == ECUState.DRIVE:
+            self.parking_brake.disengage()
+
+        if self.ecu.drive_state != new_state:
+            self.ecu.set_drive_state(new_state)
+
+    def process_button_pressed_park(self):
+        Logger.trace("VehicleController.process_button_pressed_park")
+
+        self.process_button_drive_change(ECUState.PARK)
+        self.parking_brake.engage()
+
+    def process_button_pressed_reverse(self):
+        Logger.trace("VehicleController.process_button_pressed_reverse")
+
+        self.process_button_drive_change(ECUState.REVERSE)
+        self.ecu.drive_state_command(ECUState.REVERSE)
+
+    def process_button_pressed_neutral(self):
+        Logger.trace("VehicleController.process_button_pressed_neutral")
+
+        self.process_button_drive_change(ECUState.NEUTRAL)
+        self.ecu.drive_state_command(ECUState.NEUTRAL)
+
+    def process_button_pressed_drive(self):
+        Logger.trace("VehicleController.process_button_pressed_drive")
+
+        self.process_button_drive_change(ECUState.DRIVE)
+        self.ecu.drive_state_command(ECUState.DRIVE)
+
+    def process_button_pressed_exhaust_sound(self):
+        Logger.trace("VehicleController.process_button_pressed_exhaust_sound")
+
+        self.ecu.set_exhaust_sound(not self.ecu.exhaust_sound)
+        return self.ecu.exhaust_sound
+
+    def process_button_pressed_f1(self):
+        Logger.trace("VehicleController.process_button_pressed_f1")
+
+        self.ecu.set_f1(ECUState.ENABLED)
+        self.ecu.set_f2(ECUState.DISABLED)
+        self.flash_indicator(VehicleController.F1)
+
+    def process_button_pressed_f2(self):
+        Logger.trace("VehicleController.process_button_pressed_f2")
+
+        self.ecu.set_f2(ECUState.ENABLED)
+        self.ecu.set_f1(ECUState.DISABLED)
+        self.flash_indicator(VehicleController.F2)
+
+    def process_button_pressed_regen(self):
+        Logger.trace("VehicleController.process_button_pressed_regen")
+
+        self.ecu.set_regen_state(not self.ecu.regen_state)
+        return self.ecu.regen_state
+
+    def process_button_pressed_autopilot_on(self):
+        Logger.trace("VehicleController.process_button_pressed_autopilot_on")
+
+        self.timers.cancel(self.cruise_timer)
+        self.cruise_timer = None
+        if self.ecu.cruise_state == ECUState.DISABLED:
+            self.ecu.set_cruise_state(ECUState.ENABLED)
+            self.cruise_lit = True
+            self.cruise_timer = self.timers.periodic(self.pulse_cruise, VehicleController.CRUISE_PULSE_NS)
+        else:
+            self.ecu.set_cruise_state(ECUState.DISABLED)
+        return self.ecu.cruise_state
+
+    def cruise_engaged(self):
+        return self.ecu.cruise_state == ECUState.ENABLED
+
+    def pulse_cruise(self, now):
+        self.cruise_lit = not self.cruise_lit
+        self.light(VehicleController.AUTOPILOT_ON, self.cruise_lit)
+
+    def process_button_pressed_autopilot_speed_up(self, event, held_ns):
+        Logger.trace("VehicleController.process_button_pressed_autopilot_speed_up")
+
+        self.process_cruise_speed_button(1, event, held_ns)
+
+    def process_button_pressed_autopilot_speed_down(self, event, held_ns):
+        Logger.trace("VehicleController.process_button_pressed_autopilot_speed_down")
+
+        self.process_cruise_speed_button(-1, event, held_ns)
+
+    def process_cruise_speed_button(self, step, event, held_ns):
+        Logger.trace("VehicleController.process_cruise_speed_button")
+
+        # One step on press, then bigger steps the longer it is held
+        if event == ButtonEvent.PRESS:
+            self.ecu.modify_cruise_speed(step)
+        elif event == ButtonEvent.HOLD_REPEAT:
+            self.cruise.ramp(step, held_ns)
+        elif event == ButtonEvent.RELEASE:
+            Logger.debug("Cruise speed %s held for %s ms", step, held_ns // 1_000_000)
@@ -0,0 +1,125 @@
+# Cruise command frames for the openpilot side: the enable flag and target
+# speed at a fixed rate, however often the buttons change them.
+
+import array
+import canio
+
+from canpad.canbus import CanPriority
+from canpad.ecu import ECUState
+from canpad.logger import Logger
+
+
+class CruiseCommand:
+    # Payload: byte 0 bit 0 cruise enabled, bytes 1-2 target speed (little
+    # endian), byte 3 a rolling counter so the receiver can tell a frame was lost
+    FLAG_ENABLED = 0x01
+    # (held at least, step) per hold repeat of a speed button, longest hold first
+    RAMP = ((3_000_000_000, 5), (1_500_000_000, 2), (0, 1))
+    # Upper edges of the jitter histogram buckets; the last bucket takes the rest
+    JITTER_EDGES_NS = (250_000, 500_000, 1_000_000, 2_000_000, 5_000_000)
+    # The running jitter average weighs about the last 2**SHIFT intervals;
+    # a plain sum would outgrow a small int and allocate on every frame
+    JITTER_AVERAGE_SHIFT = 4
+
+    __slots__ = (
+        "ecu", "id", "period_ns", "can_message_queue", "payload", "messages", "message_index",
+        "counter", "next_at", "sent_at", "sent", "missed", "superseded", "jitter_average_ns",
+        "early_max_ns", "late_max_ns", "jitter_counts",
+    )
+
+    def __init__(self, ecu, can_message_queue, id, period_ns):
+        self.ecu = ecu
+        self.can_message_queue = can_message_queue
+        self.id = id
+        self.period_ns = period_ns
+        self.payload = bytearray(8)
+        # At most one of them is ever queued (push_latest), so two are enough
+        self.messages = (canio.Message(id=id, data=bytes(8)), canio.Message(id=id, data=bytes(8)))
+        self.message_index = 0
+        self.counter = 0
+        # First frame on the first tick
+        self.next_at = 0
+        self.sent_at = None
+        self.sent = 0
+        self.missed = 0
+        self.superseded = 0
+        self.jitter_average_ns = 0
+        self.early_max_ns = 0
+        self.late_max_ns = 0
+        # Raw machine words, so counting allocates nothing
+        self.jitter_counts = array.array("L", [0] * (len(CruiseCommand.JITTER_EDGES_NS) + 1))
+
+    def ramp(self, direction, held_ns):
+        Logger.trace("CruiseCommand.ramp")
+
+        for held, step in CruiseCommand.RAMP:
+            if held_ns >= held:
+                self.ecu.modify_cruise_speed(direction * step)
+                return
+
+    def update(self, now):
+        # Nothing due is the common case: one compare
+        if now < self.next_at:
+            return False
+
+        # Next deadline off the last one, not off now, so late ticks do not
+        # slow the rate down
+        deadline = self.next_at + self.period_ns
+        if deadline <= now:
+            # Fell behind by more than a period; skip the missed frames
+            if self.sent_at is not None:
+                self.missed += (now - self.next_at) // self.period_ns
+            deadline = now + self.period_ns
+        self.next_at = deadline
+
+        if self.sent_at is not None:
+            self.record_jitter(now - self.sent_at - self.period_ns)
+        self.sent_at = now
+        self.send()
+        return True
+
+    def send(self):
+        ecu = self.ecu
+        speed = ecu.target_cruise_speed
+        payload = self.payload
+        payload[0] = CruiseCommand.FLAG_ENABLED if ecu.cruise_state == ECUState.ENABLED else 0
+        payload[1] = speed & 0xFF
+        payload[2] = (speed >> 8) & 0xFF
+        payload[3] = self.counter
+        self.counter = (self.counter + 1) & 0xFF
+
+        message = self.messages[self.message_index]
+        self.message_index ^= 1
+        message.data = payload
+        # A frame still queued from the last period is stale: replace it
+        if not self.can_message_queue.push_latest(message, CanPriority.SAFETY):
+            self.superseded += 1
+        self.sent += 1
+
+    def record_jitter(self, jitter_ns):
+        if jitter_ns < 0:
+            jitter_ns = -jitter_ns
+            if jitter_ns > self.early_max_ns:
+                self.early_max_ns = jitter_ns
+        elif jitter_ns > self.late_max_ns:
+            self.late_max_ns = jitter_ns
+        self.jitter_average_ns += (jitter_ns - self.jitter_average_ns) >> CruiseCommand.JITTER_AVERAGE_SHIFT
+
+        edges = CruiseCommand.JITTER_EDGES_NS
+        bucket = 0
+        while bucket < len(edges) and jitter_ns >= edges[bucket]:
+            bucket += 1
+        self.jitter_counts[bucket] += 1
+
+    def counters(self):
+        return {
+            "sent": self.sent,
+            "missed": self.missed,
+            "superseded": self.superseded,
+            "period_us": self.period_ns // 1000,
+            "jitter_average_us": self.jitter_average_ns // 1000,
+            "early_max_us": self.early_max_ns // 1000,
+            "late_max_us": self.late_max_ns // 1000,
+            # Intervals by jitter: <250 us, <500 us, <1 ms, <2 ms, <5 ms, more
+            "jitter_us": list(self.jitter_counts),
+        }
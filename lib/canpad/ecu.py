@@ -0,0 +1,236 @@
+# Drive unit outputs (gear pins and shift frames) and Tesla signal decoding.
+
+import time
+import digitalio
+import dbc_signals
+
+from canpad.canbus import CanPriority, CanTxScheduler
+from canpad.logger import Logger
+
+
+class ECUState:
+    ENABLED = True
+    DISABLED = False
+    PARK = 0
+    REVERSE = 1
+    NEUTRAL = 2
+    DRIVE = 3
+    HIGH_POWER = 1
+    LOW_POWER = 0
+
+
+class PulseScheduler:
+    MAX_PULSES = 4
+
+    _instance = None
+
+    @classmethod
+    def get_instance(cls):
+        if cls._instance is None:
+            cls._instance = cls()
+        return cls._instance
+
+    def __init__(self):
+        self.pins = [None] * self.MAX_PULSES
+        self.groups = [None] * self.MAX_PULSES
+        self.deadlines = [0] * self.MAX_PULSES
+        self.active = 0
+
+    def pulse(self, pin, duration_ns, group=None):
+        Logger.trace("PulseScheduler.pulse")
+
+        deadline = time.monotonic_ns() + duration_ns
+        free_slot = None
+
+        for slot in range(self.MAX_PULSES):
+            active_pin = self.pins[slot]
+            if active_pin is pin:
+                # Re-pulsing a pin that is still high just extends it
+                self.deadlines[slot] = deadline
+                self.groups[slot] = group
+                return True
+            if active_pin is None:
+                if free_slot is None:
+                    free_slot = slot
+            elif group is not None and self.groups[slot] == group:
+                # A newer request in the same group cancels the pin still held high
+                Logger.debug("Cancelling pulse in slot %s for group %s", slot, group)
+                self.release(slot)
+                if free_slot is None:
+                    free_slot = slot
+
+        if free_slot is None:
+            Logger.error("No free pulse slot")
+            return False
+
+        pin.value = ECUState.ENABLED
+        self.pins[free_slot] = pin
+        self.groups[free_slot] = group
+        self.deadlines[free_slot] = deadline
+        self.active += 1
+        return True
+
+    def release(self, slot):
+        Logger.trace("PulseScheduler.release")
+
+        self.pins[slot].value = ECUState.DISABLED
+        self.pins[slot] = None
+        self.groups[slot] = None
+        self.active -= 1
+
+    def cancel(self, pin):
+        Logger.trace("PulseScheduler.cancel")
+
+        for slot in range(self.MAX_PULSES):
+            if self.pins[slot] is pin:
+                self.release(slot)
+
+    def is_active(self, pin):
+        return pin in self.pins
+
+    def update(self, now):
+        if not self.active:
+            return
+
+        for slot in range(self.MAX_PULSES):
+            if self.pins[slot] is not None and now >= self.deadlines[slot]:
+                self.release(slot)
+
+
+class ECU:
+    DRIVE_SHIFT_ID = 0x697
+    DRIVE_PULSE_NS = 500_000_000
+    DRIVE_PULSE_GROUP = "drive"
+    DRIVE_SHIFT_REPEATS = 4
+    DRIVE_SHIFT_INTERVAL_NS = 20_000_000
+    CRUISE_SPEED_MAX = 200
+
+    __slots__ = (
+        "hazard", "drive_state", "exhaust_sound", "power_state", "regen_state", "cruise_state",
+        "target_cruise_speed", "f1", "f2", "reverse_pin", "neutral_pin", "drive_pin",
+        "pulse_scheduler", "tx_scheduler",
+    )
+
+    def __init__(self, reverse_pin, neutral_pin, drive_pin):
+        self.hazard = ECUState.DISABLED
+        self.drive_state = ECUState.PARK
+        self.exhaust_sound = ECUState.DISABLED
+        self.power_state = ECUState.LOW_POWER
+        self.regen_state = ECUState.ENABLED
+        self.cruise_state = ECUState.DISABLED
+        self.target_cruise_speed = 0
+        self.f1 = ECUState.DISABLED
+        self.f2 = ECUState.DISABLED
+
+        self.reverse_pin = digitalio.DigitalInOut(reverse_pin)
+        self.reverse_pin.direction = digitalio.Direction.OUTPUT
+        self.reverse_pin.value = ECUState.DISABLED
+
+        self.neutral_pin = digitalio.DigitalInOut(neutral_pin)
+        self.neutral_pin.direction = digitalio.Direction.OUTPUT
+        self.neutral_pin.value = ECUState.DISABLED
+
+        self.drive_pin = digitalio.DigitalInOut(drive_pin)
+        self.drive_pin.direction = digitalio.Direction.OUTPUT
+        self.drive_pin.value = ECUState.DISABLED
+
+        self.pulse_scheduler = PulseScheduler.get_instance()
+        self.tx_scheduler = CanTxScheduler.get_instance()
+
+    def set_hazard_lights(self, state):
+        self.hazard = state
+
+    def set_exhaust_sound(self, state):
+        self.exhaust_sound = state
+
+    def set_f1(self, state):
+        self.f1 = state
+
+    def set_f2(self, state):
+        self.f2 = state
+
+    def set_drive_state(self, state):
+        self.drive_state = state
+
+    def set_power_state(self, state):
+        self.power_state = state
+
+    def set_regen_state(self, state):
+        self.regen_state = state
+
+    def set_cruise_state(self, state):
+        self.cruise_state = state
+        if state == ECUState.ENABLED:
+            self.target_cruise_speed = self.get_current_speed()
+
+    def modify_cruise_speed(self, modifier):
+        self.target_cruise_speed = max(0, min(ECU.CRUISE_SPEED_MAX, self.target_cruise_speed + modifier))
+
+    def get_current_speed(self):
+        Logger.trace("ECU.get_current_speed")
+
+        return 0
+
+    def drive_state_command(self, command):
+        Logger.trace("ECU.drive_state_command")
+
+        pin_data = {
+            ECUState.REVERSE: self.reverse_pin,
+            ECUState.NEUTRAL: self.neutral_pin,
+            ECUState.DRIVE: self.drive_pin,
+        }
+
+        pin = pin_data.get(command, None)
+        if pin is not None:
+            Logger.debug("Setting drive state to %s", command)
+            # Released by PulseScheduler.update on a later tick
+            self.pulse_scheduler.pulse(pin, ECU.DRIVE_PULSE_NS, ECU.DRIVE_PULSE_GROUP)
+        else:
+            Logger.info("No pin for drivestate command %s", command)
+
+    def can_drive_state_command(self, state):
+        Logger.trace("ECU.can_drive_state_command")
+
+        can_data = {
+            ECUState.DRIVE: [0x0d, 0xbe, 0xef],
+            ECUState.NEUTRAL: [0x0e, 0xbe, 0xef],
+            ECUState.REVERSE: [0x0f, 0xbe, 0xef],
+        }
+
+        data = can_data.get(state, None)  # Set default value to None
+        if data is not None:
+            Logger.debug("Sending drive state command %s with data %s", state, data)
+            # Repeated so a lost frame is covered; a newer gear replaces the pending repeats
+            self.tx_scheduler.repeat(ECU.DRIVE_SHIFT_ID, data, ECU.DRIVE_SHIFT_REPEATS, ECU.DRIVE_SHIFT_INTERVAL_NS, CanPriority.SAFETY)
+        else:
+            Logger.info("No data for drivestate command %s", state)
+
+
+class TeslaECU:
+    # TODO: Test out actual MAX_BATTERY_VOLTAGE and MIN_BATTERY_VOLTAGE values
+    MAX_BATTERY_VOLTAGE = 400
+    MIN_BATTERY_VOLTAGE = 325
+    BATTERY_ID = dbc_signals.DI_HVBUSSTATUS_ID
+
+    __slots__ = ()
+
+    # Decoders are generated from dbc/tesla_subset.dbc by tools/dbc_codegen.py
+    def decode_battery_state_to_voltage(self, can_payload):
+        Logger.trace("TeslaECU.decode_battery_state")
+
+        voltage = dbc_signals.decode_di_voltage(can_payload)
+        Logger.debug("voltage: %s", voltage)
+
+        return voltage
+
+    def battery_percentage(self, voltage):
+        Logger.trace("TeslaECU.battery_percentage")
+
+        percentage = (voltage - self.MIN_BATTERY_VOLTAGE) / (self.MAX_BATTERY_VOLTAGE - self.MIN_BATTERY_VOLTAGE)
+        Logger.debug("battery percentage : %s", percentage)
+        return percentage
+
+    def decode_battery_state_to_percentage(self, data):
+        Logger.trace("TeslaECU.decode_battery_state_to_percentage")
+        voltage = self.decode_battery_state_to_voltage(data)
+        return self.battery_percentage(voltage)
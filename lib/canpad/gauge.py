@@ -0,0 +1,84 @@
+# Battery level shown on a servo gauge.
+
+import pwmio
+from adafruit_motor import servo
+
+from canpad.logger import Logger
+
+
+class BatteryGauge:
+    MIN_ANGLE = 57
+    MAX_ANGLE = 119
+    # Servo is written at most this often, however fast 0x126 arrives
+    REFRESH_INTERVAL_NS = 500_000_000
+    # Needle moves smaller than this are not worth a PWM write
+    DEADBAND_ANGLE = 1.0
+    # Weight of each refresh window's mean voltage in the moving average
+    FILTER_ALPHA = 0.3
+
+    __slots__ = (
+        "pwm", "servo", "angle", "first_boot", "samples", "sample_count", "window_sum",
+        "window_count", "voltage", "next_refresh", "writes",
+    )
+
+    def __init__(self, gauge_pin):
+        self.pwm = pwmio.PWMOut(gauge_pin, duty_cycle=2 ** 15, frequency=50)
+        self.servo = servo.Servo(self.pwm, min_pulse=500, max_pulse=2500)
+        self.angle = (self.MAX_ANGLE + self.MIN_ANGLE) / 2
+        self.servo.angle = self.angle
+        self.first_boot = True
+        self.samples = [0.0, 0.0, 0.0]
+        self.sample_count = 0
+        self.window_sum = 0.0
+        self.window_count = 0
+        self.voltage = None
+        self.next_refresh = 0
+        self.writes = 0
+
+    def filter_voltage(self, voltage):
+        samples = self.samples
+        samples[self.sample_count % 3] = voltage
+        self.sample_count += 1
+
+        # Median of the last three drops single-frame spikes
+        if self.sample_count >= 3:
+            a, b, c = samples
+            if a > b:
+                a, b = b, a
+            voltage = b if b < c else (a if a > c else c)
+
+        self.window_sum += voltage
+        self.window_count += 1
+
+    def refresh_voltage(self, now):
+        # Once per refresh interval: average the window, then smooth across
+        # windows, so the result does not depend on how fast 0x126 arrives
+        if not self.window_count or now < self.next_refresh:
+            return None
+
+        self.next_refresh = now + self.REFRESH_INTERVAL_NS
+        mean = self.window_sum / self.window_count
+        self.window_sum = 0.0
+        self.window_count = 0
+
+        if self.voltage is None:
+            self.voltage = mean
+        else:
+            self.voltage += self.FILTER_ALPHA * (mean - self.voltage)
+        return self.voltage
+
+    def update_battery_gauge(self, percentage):
+        Logger.trace('BatteryGauge.update_battery_gauge')
+
+        if percentage < 0:
+            percentage = 0
+        elif percentage > 1:
+            percentage = 1
+        angle = self.MIN_ANGLE + (self.MAX_ANGLE - self.MIN_ANGLE) * percentage
+
+        if self.first_boot or abs(angle - self.angle) >= self.DEADBAND_ANGLE:
+            Logger.debug("Updating battery gauge to percentage: %s with angle: %s", percentage, angle)
+            self.servo.angle = angle
+            self.angle = angle
+            self.writes += 1
+            self.first_boot = False
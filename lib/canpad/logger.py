@@ -0,0 +1,74 @@
+# Leveled console logging; messages are only formatted when the level is on.
+
+
+class Logger:
+    EMERGENCY = 0
+    ALERT = 1
+    CRITICAL = 2
+    ERROR = 3
+    WARNING = 4
+    NOTICE = 5
+    INFO = 6
+    DEBUG = 7
+    TRACE = 8
+
+    current_level = DEBUG
+
+    # Messages are %-format strings rendered only when the level is enabled:
+    #   Logger.debug("voltage: %s", voltage)
+    # tools/strip_logging.py removes trace/debug calls from the deployed file.
+    @classmethod
+    def log(cls, level, message, *args):
+        if level <= cls.current_level:
+            cls.write(level, message, args)
+
+    @classmethod
+    def write(cls, level, message, args):
+        if args:
+            message = message % args
+        print(f"level={level} message=\"{message}\"")
+
+    @classmethod
+    def emergency(cls, message, *args):
+        if cls.current_level >= cls.EMERGENCY:
+            cls.write(cls.EMERGENCY, message, args)
+
+    @classmethod
+    def alert(cls, message, *args):
+        if cls.current_level >= cls.ALERT:
+            cls.write(cls.ALERT, message, args)
+
+    @classmethod
+    def critical(cls, message, *args):
+        if cls.current_level >= cls.CRITICAL:
+            cls.write(cls.CRITICAL, message, args)
+
+    @classmethod
+    def error(cls, message, *args):
+        if cls.current_level >= cls.ERROR:
+            cls.write(cls.ERROR, message, args)
+
+    @classmethod
+    def warning(cls, message, *args):
+        if cls.current_level >= cls.WARNING:
+            cls.write(cls.WARNING, message, args)
+
+    @classmethod
+    def notice(cls, message, *args):
+        if cls.current_level >= cls.NOTICE:
+            cls.write(cls.NOTICE, message, args)
+
+    @classmethod
+    def info(cls, message, *args):
+        if cls.current_level >= cls.INFO:
+            cls.write(cls.INFO, message, args)
+
+    @classmethod
+    def debug(cls, message, *args):
+        if cls.current_level >= cls.DEBUG:
+            cls.write(cls.DEBUG, message, args)
+
+    @classmethod
+    def trace(cls, message, *args):
+        if cls.current_level >= cls.TRACE:
+            cls.write(cls.TRACE, message, args)
@@ -0,0 +1,425 @@
+# The Blink Marine PKP-2600 keypad: buttons, LED colors, CANopen state,
+# heartbeat watchdog and debouncing.
+
+import canio
+
+from canpad.canbus import CanMessageQueue, CanPriority
+from canpad.logger import Logger
+
+
+class PadButton:
+    COLORS = {
+        "red": (1, 0, 0),
+        "blue": (0, 0, 1),
+        "green": (0, 1, 0),
+        "magenta": (1, 0, 1),
+        "cyan": (0, 1, 1),
+        "yellow": (1, 1, 0),
+        "white": (1, 1, 1),
+        "black": (0, 0, 0),
+    }
+
+    BUTTONS = {
+        "HAZARD": 11,
+        "PARK": 10,
+        "REVERSE": 9,
+        "NEUTRAL": 8,
+        "DRIVE": 7,
+        "AUTOPILOT_SPEED_UP": 6,
+        "EXHAUST_SOUND": 5,
+        "F1": 4,
+        "F2": 3,
+        "REGEN": 2,
+        "AUTOPILOT_ON": 1,
+        "AUTOPILOT_SPEED_DOWN": 0,
+    }
+    # Button names indexed by button id
+    BUTTON_NAMES = tuple(sorted(BUTTONS, key=BUTTONS.get))
+    BUTTON_COUNT = 12
+
+    @classmethod
+    def get_button_id(cls, button):
+        return cls.BUTTONS.get(button)
+
+    @classmethod
+    def get_pressed_button_id(cls, button):
+        button_id = cls.BUTTONS.get(button)
+        return button_id if button_id is not None else None
+
+    @classmethod
+    def get_button_names(cls):
+        return list(cls.BUTTONS.keys())
+
+    @classmethod
+    def get_button_bit(cls, button_id):
+        # Keypad button n (1-12) is bit n-1 of the pad's color masks
+        return 1 << (cls.BUTTON_COUNT - 1 - button_id)
+
+    __slots__ = ("id", "bit", "pad")
+
+    def __init__(self, id, pad):
+        self.id = id
+        self.bit = PadButton.get_button_bit(id)
+        self.pad = pad
+
+    # The pad's color masks are the only copy of the LED state
+    @property
+    def red(self):
+        return 1 if self.pad.red_mask & self.bit else 0
+
+    @property
+    def green(self):
+        return 1 if self.pad.green_mask & self.bit else 0
+
+    @property
+    def blue(self):
+        return 1 if self.pad.blue_mask & self.bit else 0
+
+    def change_color(self, color):
+        Logger.trace("PadButton.change_color")
+
+        color_values = self.COLORS.get(color)
+
+        if color_values:
+            Logger.debug("Changing id %s to color %s with color_values %s", self.id, color, color_values)
+            red, green, blue = color_values
+            bit = self.bit
+            self.pad.apply_colors(bit, bit if red else 0, bit if green else 0, bit if blue else 0)
+        else:
+            Logger.info("Invalid color")
+
+        return self
+
+
+class PadState:
+    UNKNOWN = "Unknown"
+    BOOT_UP = "Boot-up"
+    PRE_OPERATIONAL = "Pre-operational"
+    OPERATIONAL = "Operational"
+
+
+class ButtonEvent:
+    PRESS = 0
+    RELEASE = 1
+    HOLD_REPEAT = 2
+    LONG_PRESS = 3
+
+
+class Pad:
+    HEARTBEAT_ID = 0x715
+    BUTTON_EVENT_ID = 0x195
+    COLOR_REFRESH_ID = 0x215
+
+    HEARTBEAT_BOOT_UP = b"\x00"
+    HEARTBEAT_PRE_OPERATIONAL = b"\x7f"
+    HEARTBEAT_OPERATIONAL = b"\x05"
+
+    __slots__ = (
+        "state", "buttons", "button_indexes", "can_message_queue", "red_mask", "green_mask",
+        "blue_mask", "color_payload", "last_color_payload", "last_color_payload_valid",
+        "colors_dirty", "color_messages", "color_message_index",
+    )
+
+    def __init__(self):
+        self.state = PadState.UNKNOWN
+        self.buttons = sorted([PadButton(id, self) for name, id in PadButton.BUTTONS.items()], key=lambda button: -button.id)
+        self.button_indexes = tuple(self.buttons.index(button) for button in sorted(self.buttons, key=lambda button: button.id))
+        self.can_message_queue = CanMessageQueue.get_instance()
+        self.red_mask = self.green_mask = self.blue_mask = 0
+        # Padded to the 8 bytes the keypad expects; only the first 5 carry colors
+        self.color_payload = bytearray(8)
+        self.last_color_payload = bytearray(8)
+        self.last_color_payload_valid = False
+        self.colors_dirty = False
+        # Reused round-robin; a message is only rewritten after the LED queue class
+        # has turned over completely, so a queued frame is never changed under it
+        self.color_messages = tuple(
+            canio.Message(id=Pad.COLOR_REFRESH_ID, data=bytes(8))
+            for _ in range(CanMessageQueue.CAPACITY[CanPriority.LED] + 1)
+        )
+        self.color_message_index = 0
+
+    def get_button_index_from_id(self, id):
+        Logger.trace("Pad.get_button_index_from_id")
+
+        if 0 <= id < len(self.button_indexes):
+            return self.button_indexes[id]
+        return None  # Return None if the button ID is not found
+
+    def to_boot_up(self):
+        Logger.trace("Pad.to_boot_up")
+
+        if self.state == PadState.UNKNOWN or self.state == PadState.OPERATIONAL:
+            self.state = PadState.BOOT_UP
+            # A rebooted keypad has lost its LEDs, resend even if nothing changed
+            self.invalidate_colors()
+            Logger.info("Pad is now in Boot up.")
+        elif self.state == PadState.BOOT_UP:
+            pass
+        else:
+            Logger.info("Transition to Boot-up is not allowed from %s", self.state)
+
+    def to_operational(self):
+        Logger.trace("Pad.to_operational")
+
+        if self.state != PadState.OPERATIONAL:
+            self.state = PadState.OPERATIONAL
+            Logger.info("Pad is transitioning to Operational.")
+        elif self.state == PadState.OPERATIONAL:
+            pass
+        else:
+            Logger.info("Transition to Operational is not allowed from %s", self.state)
+
+    def to_pre_operational(self):
+        Logger.trace("Pad.to_pre_operational")
+
+        if self.state != PadState.PRE_OPERATIONAL:
+            self.state = PadState.PRE_OPERATIONAL
+            # RPDOs are ignored until the keypad is started again
+            self.invalidate_colors()
+            Logger.info("Pad is now in Pre-operational.")
+
+    def reset(self):
+        Logger.trace("Pad.reset")
+
+        self.state = PadState.UNKNOWN
+        self.invalidate_colors()
+        Logger.info("Pad has been reset to Unknown state.")
+
+    def can_activate_keypad(self):
+        Logger.trace("Pad.can_activate_keypad")
+
+        id = 0x0
+        data = [0x01]
+
+        return id, data
+
+    def can_refresh_button_colors(self):
+        Logger.trace("Pad.can_refresh_button_colors")
+
+        return Pad.COLOR_REFRESH_ID, self.encode_button_colors()
+
+    def encode_button_colors(self):
+        # 0x215 payload is the 12 red bits, then 12 green, then 12 blue, little endian
+        red = self.red_mask
+        green = self.green_mask
+        blue = self.blue_mask
+        payload = self.color_payload
+        payload[0] = red & 0xFF
+        payload[1] = (red >> 8) | ((green & 0x0F) << 4)
+        payload[2] = green >> 4
+        payload[3] = blue & 0xFF
+        payload[4] = blue >> 8
+
+        return payload
+
+    def can_is_heartbeat_boot_up(self, data):
+        return Pad.HEARTBEAT_BOOT_UP == data
+
+    def can_is_heartbeat_pre_operational(self, data):
+        return Pad.HEARTBEAT_PRE_OPERATIONAL == data
+
+    def can_is_heartbeat_operational(self, data):
+        return Pad.HEARTBEAT_OPERATIONAL == data
+
+    def update_color(self, button_id, color):
+        Logger.trace("Pad.update_color")
+
+        Logger.info("updating color for button ID %s to color %s", button_id, color)
+        button_index = self.get_button_index_from_id(button_id)
+        self.buttons[button_index].change_color(color)
+
+    def apply_colors(self, mask, red, green, blue):
+        # The buttons in mask take their bits from red, green and blue, the rest
+        # keep theirs. Sent once per tick by flush_colors.
+        keep = ~mask
+        self.red_mask = self.red_mask & keep | red
+        self.green_mask = self.green_mask & keep | green
+        self.blue_mask = self.blue_mask & keep | blue
+        self.colors_dirty = True
+
+    def restore_colors(self, red, green, blue):
+        Logger.trace("Pad.restore_colors")
+
+        self.red_mask = red
+        self.green_mask = green
+        self.blue_mask = blue
+        self.invalidate_colors()
+
+    def invalidate_colors(self):
+        self.last_color_payload_valid = False
+        self.colors_dirty = True
+
+    def flush_colors(self):
+        Logger.trace("Pad.flush_colors")
+
+        if not self.colors_dirty:
+            return False
+
+        self.colors_dirty = False
+        data = self.encode_button_colors()
+        if self.last_color_payload_valid and data == self.last_color_payload:
+            return False
+
+        self.last_color_payload[:] = data
+        self.last_color_payload_valid = True
+        message = self.color_messages[self.color_message_index]
+        self.color_message_index = (self.color_message_index + 1) % len(self.color_messages)
+        # Copied into the message's own buffer, nothing is allocated
+        message.data = data
+        self.can_message_queue.push(message, CanPriority.LED)
+        return True
+
+    @staticmethod
+    def decode_button_press(state):
+        # 12-bit mask, bit n-1 set while keypad button n is down (button id 11 - bit)
+        return state[0] | ((state[1] & 0x0F) << 8)
+
+    def __str__(self):
+        return f"Pad(state={self.state})"
+
+
+class PadWatchdog:
+    __slots__ = (
+        "timeout_ns", "backoff_ns", "backoff_max_ns", "last_heartbeat_at", "retry_at",
+        "retry_delay_ns", "lost_at", "losses", "activations", "last_recovery_ns",
+    )
+
+    def __init__(self, timeout_ns, backoff_ns, backoff_max_ns):
+        self.timeout_ns = timeout_ns
+        self.backoff_ns = backoff_ns
+        self.backoff_max_ns = backoff_max_ns
+        self.last_heartbeat_at = None
+        self.retry_at = None
+        self.retry_delay_ns = backoff_ns
+        self.lost_at = None
+        self.losses = 0
+        self.activations = 0
+        self.last_recovery_ns = None
+
+    def heartbeat(self, now):
+        self.last_heartbeat_at = now
+
+    def expired(self, now):
+        return self.last_heartbeat_at is not None and now - self.last_heartbeat_at > self.timeout_ns
+
+    def lost(self, now):
+        Logger.trace("PadWatchdog.lost")
+
+        self.losses += 1
+        self.lost_at = now
+        self.last_heartbeat_at = None
+        self.retry_at = None
+        self.retry_delay_ns = self.backoff_ns
+
+    def activation_due(self, now):
+        Logger.trace("PadWatchdog.activation_due")
+
+        # The first attempt goes out at once, then the delay doubles per attempt
+        if self.retry_at is not None and now < self.retry_at:
+            return False
+
+        self.retry_at = now + self.retry_delay_ns
+        self.retry_delay_ns = min(2 * self.retry_delay_ns, self.backoff_max_ns)
+        self.activations += 1
+        return True
+
+    def expedite(self):
+        # The keypad is back and waiting to be started, skip the remaining backoff
+        self.retry_at = None
+        self.retry_delay_ns = self.backoff_ns
+
+    def recovered(self, now):
+        Logger.trace("PadWatchdog.recovered")
+
+        if self.lost_at is not None:
+            self.last_recovery_ns = now - self.lost_at
+            self.lost_at = None
+        self.expedite()
+        # Grace period: the keypad gets a full timeout to send its first heartbeat
+        self.last_heartbeat_at = now
+
+    def counters(self, now):
+        return {
+            "heartbeat_age_ms": None if self.last_heartbeat_at is None else (now - self.last_heartbeat_at) // 1_000_000,
+            "losses": self.losses,
+            "activations": self.activations,
+            "last_recovery_ms": None if self.last_recovery_ns is None else self.last_recovery_ns // 1_000_000,
+        }
+
+
+class PadButtonTracker:
+    DEBOUNCE_NS = 20_000_000
+    REPEAT_DELAY_NS = 500_000_000
+    REPEAT_INTERVAL_NS = 250_000_000
+    LONG_PRESS_NS = 1_000_000_000
+
+    __slots__ = ("handler", "raw_mask", "stable_mask", "long_press_mask", "edge_at", "pressed_at", "next_repeat_at")
+
+    def __init__(self, handler):
+        # handler(button_id, ButtonEvent, held_ns)
+        self.handler = handler
+        # Bit n-1 is keypad button n, as in Pad.decode_button_press
+        self.raw_mask = 0
+        self.stable_mask = 0
+        self.long_press_mask = 0
+        self.edge_at = [0] * PadButton.BUTTON_COUNT
+        self.pressed_at = [0] * PadButton.BUTTON_COUNT
+        self.next_repeat_at = [0] * PadButton.BUTTON_COUNT
+
+    def update(self, mask, now):
+        Logger.trace("PadButtonTracker.update")
+
+        self.raw_mask = mask
+        if mask != self.stable_mask:
+            self.settle(now)
+
+    def settle(self, now):
+        changed = self.raw_mask ^ self.stable_mask
+        bit = 0
+
+        while changed:
+            # Edges inside the debounce window are picked up by a later poll
+            if changed & 1 and now - self.edge_at[bit] >= self.DEBOUNCE_NS:
+                flag = 1 << bit
+                button_id = PadButton.BUTTON_COUNT - 1 - bit
+                self.edge_at[bit] = now
+                if self.raw_mask & flag:
+                    self.stable_mask |= flag
+                    self.long_press_mask &= ~flag
+                    self.pressed_at[bit] = now
+                    self.next_repeat_at[bit] = now + self.REPEAT_DELAY_NS
+                    self.handler(button_id, ButtonEvent.PRESS, 0)
+                else:
+                    self.stable_mask &= ~flag
+                    self.handler(button_id, ButtonEvent.RELEASE, now - self.pressed_at[bit])
+            changed >>= 1
+            bit += 1
+
+    def poll(self, now):
+        if self.raw_mask != self.stable_mask:
+            self.settle(now)
+
+        held = self.stable_mask
+        bit = 0
+
+        while held:
+            if held & 1:
+                held_ns = now - self.pressed_at[bit]
+                flag = 1 << bit
+                button_id = PadButton.BUTTON_COUNT - 1 - bit
+                if held_ns >= self.LONG_PRESS_NS and not self.long_press_mask & flag:
+                    self.long_press_mask |= flag
+                    self.handler(button_id, ButtonEvent.LONG_PRESS, held_ns)
+                if now >= self.next_repeat_at[bit]:
+                    self.next_repeat_at[bit] += self.REPEAT_INTERVAL_NS
+                    self.handler(button_id, ButtonEvent.HOLD_REPEAT, held_ns)
+            held >>= 1
+            bit += 1
+
+    def reset(self, now):
+        Logger.trace("PadButtonTracker.reset")
+
+        # A rebooted keypad will never report the release of buttons held before
+        self.raw_mask = 0
+        self.settle(now)
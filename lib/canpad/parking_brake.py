@@ -0,0 +1,75 @@
+# Parking brake position sensors and actuator triggers.
+
+import digitalio
+
+from canpad.ecu import ECUState
+from canpad.logger import Logger
+
+
+class ParkingBrake:
+    __slots__ = (
+        "sensor_engaged_pin", "sensor_disengaged_pin", "trigger_engage_pin",
+        "trigger_disengage_pin", "engaged",
+    )
+
+    def __init__(self, engaged_pin, disengaged_pin, engage_pin, disengage_pin):
+        self.sensor_engaged_pin = digitalio.DigitalInOut(engaged_pin)
+        self.sensor_engaged_pin.direction = digitalio.Direction.INPUT
+        self.sensor_engaged_pin.pull = digitalio.Pull.UP
+
+        self.sensor_disengaged_pin = digitalio.DigitalInOut(disengaged_pin)
+        self.sensor_disengaged_pin.direction = digitalio.Direction.INPUT
+        self.sensor_disengaged_pin.pull = digitalio.Pull.UP
+
+        self.trigger_engage_pin = digitalio.DigitalInOut(engage_pin)
+        self.trigger_engage_pin.direction = digitalio.Direction.OUTPUT
+
+        self.trigger_disengage_pin = digitalio.DigitalInOut(disengage_pin)
+        self.trigger_disengage_pin.direction = digitalio.Direction.OUTPUT
+
+        self.engaged = ECUState.DISABLED
+        self.init_current_state()
+
+    def init_current_state(self):
+        Logger.trace("ParkingBrake.init_current_state")
+
+        Logger.debug("--- ParkingBrake.init_current_state ---")
+        Logger.debug("Engaged Pin State: %s", self.sensor_engaged_pin.value)
+        Logger.debug("Disengaged Pin State: %s", self.sensor_disengaged_pin.value)
+        Logger.debug("---------------------------------------")
+
+        if self.sensor_engaged_pin.value:
+            self.engage()
+        elif self.sensor_disengaged_pin.value:
+            self.disengage()
+        else:
+            Logger.error("The parking brake sensor pins are not in a valid state.")
+
+    def is_engaged(self):
+        Logger.trace("ParkingBrake.is_engaged")
+
+        return self.engaged
+
+    def engage(self):
+        Logger.trace("ParkingBrake.engage")
+
+        if not self.engaged:
+            self.trigger_disengage_pin.value = ECUState.DISABLED
+            self.trigger_engage_pin.value = ECUState.ENABLED
+            self.engaged = ECUState.ENABLED
+
+    def disengage(self):
+        Logger.trace("ParkingBrake.disengage")
+
+        if self.engaged:
+            self.trigger_engage_pin.value = ECUState.DISABLED
+            self.trigger_disengage_pin.value = ECUState.ENABLED
+            self.engaged = ECUState.DISABLED
+
+    def toggle(self):
+        Logger.trace("ParkingBrake.toggle")
+
+        if self.engaged:
+            self.disengage()
+        else:
+            self.engage()
@@ -0,0 +1,94 @@
+# Per-stage tick timing histograms. Only imported while PROFILE_LOOP is on.
+
+from canpad.logger import Logger
+
+
+class LoopProfiler:
+    # Bucket n holds durations below 2**(17 + n) ns: ~131 us, 262 us, 524 us, ...
+    # up to ~33.5 ms; the last bucket takes everything slower
+    BUCKET_SHIFT = 17
+    BUCKETS = 10
+
+    def __init__(self, names):
+        self.names = names
+        self.counts = [[0] * self.BUCKETS for _ in names]
+        # Microseconds, and reset with the window, so the sums stay small ints
+        self.total_us = [0] * len(names)
+        # Ticks sampled since the last reset
+        self.samples = 0
+        self.max_ns = [0] * len(names)
+        # Bucket by duration >> BUCKET_SHIFT, so record() needs no search
+        self.bucket_table = bytearray(1 << (self.BUCKETS - 2))
+        for index in range(1, len(self.bucket_table)):
+            bucket = 0
+            while (1 << bucket) <= index:
+                bucket += 1
+            self.bucket_table[index] = bucket
+
+    def record(self, stamps):
+        # One sampled tick: its start, then the clock after each stage. The
+        # stages go to their own histograms, the whole tick to the last one.
+        # All in one call with the lookups hoisted; it runs on the device.
+        table = self.bucket_table
+        limit = len(table)
+        shift = self.BUCKET_SHIFT
+        last_bucket = self.BUCKETS - 1
+        counts = self.counts
+        total_us = self.total_us
+        max_ns = self.max_ns
+        tick = len(stamps) - 1
+        for index in range(len(stamps)):
+            if index < tick:
+                elapsed_ns = stamps[index + 1] - stamps[index]
+            else:
+                elapsed_ns = stamps[tick] - stamps[0]
+            scaled = elapsed_ns >> shift
+            counts[index][table[scaled] if scaled < limit else last_bucket] += 1
+            total_us[index] += elapsed_ns // 1000
+            if elapsed_ns > max_ns[index]:
+                max_ns[index] = elapsed_ns
+        self.samples += 1
+
+    def edge_us(self, bucket):
+        # Upper edge of a bucket, None for the open-ended last one
+        if bucket >= self.BUCKETS - 1:
+            return None
+        return (1 << (self.BUCKET_SHIFT + bucket)) // 1000
+
+    def percentile_us(self, index, pct):
+        # Upper edge of the bucket holding the pct-th sample
+        counts = self.counts[index]
+        target = (sum(counts) * pct + 99) // 100
+        seen = 0
+        for bucket in range(len(counts)):
+            seen += counts[bucket]
+            if seen >= target:
+                return self.edge_us(bucket)
+        return None
+
+    def reset(self):
+        for index in range(len(self.names)):
+            counts = self.counts[index]
+            for bucket in range(len(counts)):
+                counts[bucket] = 0
+            self.total_us[index] = 0
+            self.max_ns[index] = 0
+        self.samples = 0
+
+    def format_us(self, edge):
+        return str(edge) if edge is not None else f">{self.edge_us(self.BUCKETS - 2)}"
+
+    def dump(self, write=print):
+        Logger.trace("LoopProfiler.dump")
+
+        edges = " ".join(f"<{self.edge_us(bucket)}" for bucket in range(self.BUCKETS - 1))
+        write(f"# loop profile, us: stage count mean p50 p99 max | {edges} {self.format_us(None)}")
+        for index in range(len(self.names)):
+            counts = self.counts[index]
+            samples = sum(counts)
+            if not samples:
+                continue
+            mean = self.total_us[index] // samples
+            p50 = self.format_us(self.percentile_us(index, 50))
+            p99 = self.format_us(self.percentile_us(index, 99))
+            write(f"{self.names[index]} {samples} {mean} {p50} {p99} {self.max_ns[index] // 1000} | {' '.join(str(count) for count in counts)}")
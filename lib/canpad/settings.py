@@ -0,0 +1,32 @@
+# Tunables, in seconds and bytes unless the name says otherwise.
+
+
+class FeatherSettings:
+    CAN_REFRESH_RATE = 0.5
+    # Most frames handed to the CAN controller per loop iteration
+    CAN_TX_BUDGET = 4
+    # Most frames drained from the CAN listener per loop iteration
+    CAN_RX_BUDGET = 16
+    # Keypad heartbeat silence, in seconds, after which it is treated as lost
+    PAD_HEARTBEAT_TIMEOUT = 1.5
+    # First NMT start retry delay while the keypad is not operational, doubled up to the max
+    PAD_ACTIVATE_BACKOFF = 0.05
+    PAD_ACTIVATE_BACKOFF_MAX = 2.0
+    # Garbage is collected on idle ticks: at least this often, in seconds...
+    GC_INTERVAL = 1.0
+    # ...or as soon as free heap drops below this many bytes
+    GC_LOW_WATER = 16 * 1024
+    # Drive/function state is written to NVM this many seconds after the last
+    # change, on an idle tick
+    NVM_WRITE_DELAY = 0.5
+    # Cruise command frame for the openpilot side: CAN id, and frames per second
+    CRUISE_COMMAND_ID = 0x2F0
+    CRUISE_COMMAND_RATE = 50
+    # While PROFILE_LOOP is on, histograms sample every Nth tick; the max tick
+    # time is still tracked on every tick. A sampled tick reads the clock after
+    # every stage, so this keeps the profiling cost to a few percent.
+    PROFILE_SAMPLE_EVERY = 64
+    # Sampled ticks per histogram window; a full window starts over
+    PROFILE_WINDOW = 1024
+    # Seconds between loop profile summaries on the console; 0 for never
+    PROFILE_DUMP_INTERVAL = 0
@@ -0,0 +1,155 @@
+# Drive and function state kept in microcontroller.nvm across resets.
+
+import struct
+import time
+
+from canpad.logger import Logger
+from canpad.pad import PadButton
+
+
+class NvmStateStore:
+    # One record per slot: version, sequence, drive state, flags, the red, green
+    # and blue LED masks, then a CRC-16 of the rest
+    RECORD_FORMAT = "<BHBBHHHH"
+    RECORD_SIZE = 13
+    VERSION = 1
+    # Records rotate through the slots. A torn write only ever loses the newest
+    # record, and the previous one is still there to restore.
+    SLOTS = 32
+    SEQUENCE_MODULO = 0x10000
+
+    FLAG_F1 = 0x01
+    FLAG_F2 = 0x02
+    FLAG_REGEN = 0x04
+    FLAG_EXHAUST = 0x08
+
+    # Blinking or held LEDs; their colors are never stored, so a blink is no write
+    VOLATILE_BUTTONS = ("HAZARD", "AUTOPILOT_ON", "AUTOPILOT_SPEED_UP", "AUTOPILOT_SPEED_DOWN")
+    COLOR_MASK = 0xFFF & ~sum(PadButton.get_button_bit(PadButton.BUTTONS[name]) for name in VOLATILE_BUTTONS)
+
+    __slots__ = (
+        "nvm", "slots", "delay_ns", "record", "slot", "sequence", "drive_state", "flags", "red",
+        "green", "blue", "dirty", "due_at", "writes", "write_max_ns",
+    )
+
+    def __init__(self, nvm, delay_ns, slots=SLOTS):
+        self.nvm = nvm
+        self.slots = 0 if nvm is None else min(slots, len(nvm) // NvmStateStore.RECORD_SIZE)
+        self.delay_ns = delay_ns
+        self.record = bytearray(NvmStateStore.RECORD_SIZE)
+        # Slot and sequence of the newest record; the next one goes in the slot after
+        self.slot = -1
+        self.sequence = 0
+        self.drive_state = None
+        self.flags = 0
+        self.red = self.green = self.blue = 0
+        self.dirty = False
+        self.due_at = 0
+        self.writes = 0
+        self.write_max_ns = 0
+
+    @staticmethod
+    def crc16(data, length):
+        # CRC-16/CCITT-FALSE, bitwise; a write or a restore checks one record
+        crc = 0xFFFF
+        for index in range(length):
+            crc ^= data[index] << 8
+            for _ in range(8):
+                crc = ((crc << 1) ^ 0x1021) & 0xFFFF if crc & 0x8000 else (crc << 1) & 0xFFFF
+        return crc
+
+    @staticmethod
+    def newer(sequence, other):
+        # Serial number arithmetic, so the sequence can wrap
+        return sequence != other and (sequence - other) % NvmStateStore.SEQUENCE_MODULO < NvmStateStore.SEQUENCE_MODULO // 2
+
+    def read(self, slot):
+        start = slot * NvmStateStore.RECORD_SIZE
+        self.record[:] = self.nvm[start:start + NvmStateStore.RECORD_SIZE]
+        return struct.unpack_from(NvmStateStore.RECORD_FORMAT, self.record)
+
+    def load(self):
+        Logger.trace("NvmStateStore.load")
+
+        # Newest record by sequence whose CRC checks out; erased flash reads 0xFF
+        candidates = []
+        for slot in range(self.slots):
+            fields = self.read(slot)
+            if fields[0] == NvmStateStore.VERSION:
+                candidates.append((fields[1], slot))
+
+        while candidates:
+            newest = candidates[0]
+            for candidate in candidates:
+                if self.newer(candidate[0], newest[0]):
+                    newest = candidate
+            candidates.remove(newest)
+
+            fields = self.read(newest[1])
+            if fields[7] != self.crc16(self.record, NvmStateStore.RECORD_SIZE - 2):
+                Logger.warning("NVM slot %s failed its CRC", newest[1])
+                continue
+            self.slot = newest[1]
+            self.sequence = fields[1]
+            self.drive_state, self.flags, self.red, self.green, self.blue = fields[2:7]
+            return True
+
+        # Nothing valid: start from the last slot so the first write goes in slot 0
+        self.slot = self.slots - 1
+        return False
+
+    def changed(self, now):
+        # Written once things have been quiet for delay_ns
+        self.dirty = True
+        self.due_at = now + self.delay_ns
+
+    def due(self, now):
+        return self.dirty and self.slots and now >= self.due_at
+
+    def save(self, drive_state, flags, red, green, blue):
+        Logger.trace("NvmStateStore.save")
+
+        self.dirty = False
+        mask = NvmStateStore.COLOR_MASK
+        red &= mask
+        green &= mask
+        blue &= mask
+        if (drive_state == self.drive_state and flags == self.flags and red == self.red
+                and green == self.green and blue == self.blue):
+            return False
+
+        started = time.monotonic_ns()
+        slot = (self.slot + 1) % self.slots
+        sequence = (self.sequence + 1) % NvmStateStore.SEQUENCE_MODULO
+        record = self.record
+        struct.pack_into(NvmStateStore.RECORD_FORMAT, record, 0,
+                         NvmStateStore.VERSION, sequence, drive_state, flags, red, green, blue, 0)
+        crc = self.crc16(record, NvmStateStore.RECORD_SIZE - 2)
+        record[-2] = crc & 0xFF
+        record[-1] = crc >> 8
+        start = slot * NvmStateStore.RECORD_SIZE
+        # Blocks while the flash row is erased and rewritten
+        self.nvm[start:start + NvmStateStore.RECORD_SIZE] = record
+
+        self.slot = slot
+        self.sequence = sequence
+        self.drive_state = drive_state
+        self.flags = flags
+        self.red = red
+        self.green = green
+        self.blue = blue
+        self.writes += 1
+        elapsed = time.monotonic_ns() - started
+        if elapsed > self.write_max_ns:
+            self.write_max_ns = elapsed
+        return True
+
+    def counters(self):
+        return {
+            "slots": self.slots,
+            "slot": self.slot,
+            "sequence": self.sequence,
+            "writes": self.writes,
+            "write_max_us": self.write_max_ns // 1000,
+            "pending": self.dirty,
+        }
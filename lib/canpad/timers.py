@@ -0,0 +1,143 @@
+# Deadline timers run from the tick loop, off monotonic_ns.
+
+import time
+
+from canpad.logger import Logger
+
+
+class TimerScheduler:
+    MAX_TIMERS = 16
+
+    _instance = None
+
+    @classmethod
+    def get_instance(cls):
+        if cls._instance is None:
+            cls._instance = cls()
+        return cls._instance
+
+    def __init__(self):
+        # Slot arrays plus a binary min-heap of slot numbers ordered by deadline
+        self.deadlines = [0] * self.MAX_TIMERS
+        self.periods = [0] * self.MAX_TIMERS
+        self.callbacks = [None] * self.MAX_TIMERS
+        self.generations = [0] * self.MAX_TIMERS
+        self.heap = [0] * self.MAX_TIMERS
+        self.heap_index = [-1] * self.MAX_TIMERS
+        self.free_slots = list(range(self.MAX_TIMERS - 1, -1, -1))
+        self.size = 0
+        self.fired = 0
+
+    def schedule(self, callback, delay_ns, period_ns=0):
+        Logger.trace("TimerScheduler.schedule")
+
+        if not self.free_slots:
+            Logger.error("No free timer slot")
+            return None
+
+        slot = self.free_slots.pop()
+        self.deadlines[slot] = time.monotonic_ns() + delay_ns
+        self.periods[slot] = period_ns
+        self.callbacks[slot] = callback
+        self.heap[self.size] = slot
+        self.heap_index[slot] = self.size
+        self.size += 1
+        self.sift_up(self.size - 1)
+        # The generation makes a stale handle harmless once its slot is reused
+        return self.generations[slot] * self.MAX_TIMERS + slot
+
+    def periodic(self, callback, period_ns):
+        return self.schedule(callback, period_ns, period_ns)
+
+    def cancel(self, handle):
+        Logger.trace("TimerScheduler.cancel")
+
+        if handle is None:
+            return False
+
+        slot = handle % self.MAX_TIMERS
+        if self.generations[slot] != handle // self.MAX_TIMERS or self.heap_index[slot] < 0:
+            return False
+
+        self.remove(self.heap_index[slot])
+        return True
+
+    def is_active(self, handle):
+        if handle is None:
+            return False
+
+        slot = handle % self.MAX_TIMERS
+        return self.generations[slot] == handle // self.MAX_TIMERS and self.heap_index[slot] >= 0
+
+    def remove(self, index):
+        slot = self.heap[index]
+        self.size -= 1
+        if index != self.size:
+            self.move(self.size, index)
+            self.sift_down(index)
+            self.sift_up(index)
+
+        self.heap_index[slot] = -1
+        self.callbacks[slot] = None
+        self.generations[slot] += 1
+        self.free_slots.append(slot)
+
+    def move(self, source, target):
+        slot = self.heap[source]
+        self.heap[target] = slot
+        self.heap_index[slot] = target
+
+    def swap(self, first, second):
+        slot = self.heap[first]
+        self.move(second, first)
+        self.heap[second] = slot
+        self.heap_index[slot] = second
+
+    def sift_up(self, index):
+        deadlines = self.deadlines
+        heap = self.heap
+        while index:
+            parent = (index - 1) >> 1
+            if deadlines[heap[parent]] <= deadlines[heap[index]]:
+                break
+            self.swap(parent, index)
+            index = parent
+
+    def sift_down(self, index):
+        deadlines = self.deadlines
+        heap = self.heap
+        while True:
+            child = 2 * index + 1
+            if child >= self.size:
+                break
+            if child + 1 < self.size and deadlines[heap[child + 1]] < deadlines[heap[child]]:
+                child += 1
+            if deadlines[heap[index]] <= deadlines[heap[child]]:
+                break
+            self.swap(index, child)
+            index = child
+
+    def update(self, now):
+        # Nothing due is the common case: one compare
+        if not self.size:
+            return
+
+        heap = self.heap
+        deadlines = self.deadlines
+        while self.size and deadlines[heap[0]] <= now:
+            slot = heap[0]
+            callback = self.callbacks[slot]
+            period = self.periods[slot]
+            if period:
+                # Rescheduled before the callback runs so it may cancel itself
+                deadline = deadlines[slot] + period
+                if deadline <= now:
+                    # Fell behind by more than a period; skip the missed firings
+                    deadline = now + period
+                deadlines[slot] = deadline
+                self.sift_down(0)
+            else:
+                self.remove(0)
+
+            self.fired += 1
+            callback(now)
@@ -0,0 +1,20 @@
+# Generated by tools/dbc_codegen.py from tesla_subset.dbc. Do not edit; regenerate instead.
+
+DI_HVBUSSTATUS_ID = 0x126
+
+
+def decode_di_voltage(data):
+    # DI_hvBusStatus DI_voltage: 0|10@1+ (0.5,0) "V"
+    return (((data[1] & 0x3) << 8) | data[0]) * 0.5
+
+
+def decode_di_current(data):
+    # DI_hvBusStatus DI_current: 10|11@1+ (1,0) "A"
+    return ((data[2] & 0x1F) << 6) | (data[1] >> 2)
+
+
+# signal name -> (message id, decoder)
+SIGNALS = {
+    "DI_voltage": (0x126, decode_di_voltage),
+    "DI_current": (0x126, decode_di_current),
+}
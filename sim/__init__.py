@@ -0,0 +1,21 @@
+# Host-side simulator for the Feather M4 CAN firmware.
+#
+# sim/stubs holds stand-ins for the CircuitPython modules the firmware imports
+# (board, canio, digitalio, microcontroller, pwmio, usb_cdc, adafruit_motor.servo).
+# They talk to the virtual bus and clock published in sim.env by the running
+# Simulation.
+#
+#   python -m sim.bench            run every benchmark
+#   python -m sim.bench loop       run one benchmark by name
+import os
+import sys
+
+STUBS_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "stubs")
+if STUBS_PATH not in sys.path:
+    sys.path.insert(0, STUBS_PATH)
+# Firmware modules that live on CIRCUITPY/lib (the stubs shadow the .mpy libraries)
+LIB_PATH = os.path.normpath(os.path.join(os.path.dirname(STUBS_PATH), "..", "lib"))
+if LIB_PATH not in sys.path:
+    sys.path.append(LIB_PATH)
+
+from sim.harness import Simulation  # noqa: E402
@@ -0,0 +1,41 @@
+# Benchmark registry for the host simulator. Each benchmark is a function that
+# returns a list of (metric, value, unit) rows.
+import math
+import time
+
+BENCHMARKS = {}
+
+
+def benchmark(name):
+    def register(function):
+        BENCHMARKS[name] = function
+        return function
+    return register
+
+
+def percentile(values, pct):
+    if not values:
+        return float("nan")
+    ordered = sorted(values)
+    index = max(0, min(len(ordered) - 1, math.ceil(pct / 100 * len(ordered)) - 1))
+    return ordered[index]
+
+
+def load_all():
+    from sim.bench import behavior, boot, busfault, buttons, console, cruise, decode, dispatch, filters, gauge, heap, led, logger, loop, profile, recorder, replay, shift, timers, txsched, warmboot, watchdog  # noqa: F401
+
+
+def run(names=None):
+    load_all()
+    names = names or list(BENCHMARKS)
+    unknown = [name for name in names if name not in BENCHMARKS]
+    if unknown:
+        raise SystemExit(f"unknown benchmark(s): {', '.join(unknown)}; available: {', '.join(BENCHMARKS)}")
+    for name in names:
+        started = time.perf_counter()
+        rows = BENCHMARKS[name]()
+        print(f"== {name} ({time.perf_counter() - started:.1f}s host)")
+        for metric, value, unit in rows:
+            if isinstance(value, float):
+                value = f"{value:.2f}"
+            print(f"   {metric:<32} {value:>12} {unit}")
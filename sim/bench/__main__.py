@@ -0,0 +1,5 @@
+import sys
+
+from sim.bench import run
+
+run(sys.argv[1:])
@@ -0,0 +1,85 @@
+# Button behavior table: a press updates its whole radio group with one mask
+# update, and what that costs against the old one-button-at-a-time updates.
+import time
+
+from sim import Simulation
+from sim.bench import benchmark
+from sim.devices import Keypad, TeslaBattery
+from sim.harness import DEVICE_CPU_SCALE
+
+PRESS_CALLS = 5_000
+GEARS = ("PARK", "REVERSE", "NEUTRAL", "DRIVE")
+FUNCTIONS = ("F1", "F2")
+
+
+def legacy_gear_leds(pad, PadButton, active_button):
+    # VehicleController.process_button_drive_change before the behavior table
+    buttons = ['PARK', 'REVERSE', 'NEUTRAL', 'DRIVE']
+    colors = ['black' for _ in buttons]
+    colors[buttons.index(active_button)] = 'blue'
+    for button, color in zip(buttons, colors):
+        pad.update_color(PadButton.get_button_id(button), color)
+
+
+def lit(pad, PadButton, names):
+    masks = pad.red_mask | pad.green_mask | pad.blue_mask
+    return [name for name in names if masks & PadButton.get_button_bit(PadButton.BUTTONS[name])]
+
+
+def timed_ns(function, *args):
+    started = time.perf_counter_ns()
+    for _ in range(PRESS_CALLS):
+        function(*args)
+    return (time.perf_counter_ns() - started) / PRESS_CALLS
+
+
+@benchmark("behavior")
+def behavior_benchmark():
+    sim = Simulation()
+    firmware = sim.firmware
+    PadButton = firmware.PadButton
+    sim.add(Keypad())
+    sim.add(TeslaBattery())
+    app = sim.boot()
+    sim.run(seconds=1.0)
+    controller = app.controller
+    pad = app.pad
+
+    updates = []
+    apply_colors = firmware.Pad.apply_colors
+
+    def counting_apply_colors(self, mask, red, green, blue):
+        updates.append(mask)
+        apply_colors(self, mask, red, green, blue)
+
+    firmware.Pad.apply_colors = counting_apply_colors
+    try:
+        for group in (GEARS, FUNCTIONS, GEARS[::-1]):
+            for name in group:
+                del updates[:]
+                controller.process_button_event(PadButton.BUTTONS[name], firmware.ButtonEvent.PRESS, 0)
+                if len(updates) != 1:
+                    raise AssertionError(f"{name} press made {len(updates)} mask updates")
+                if lit(pad, PadButton, group) != [name]:
+                    raise AssertionError(f"{name} pressed, lit: {lit(pad, PadButton, group)}")
+                sim.run(seconds=1.0)
+    finally:
+        firmware.Pad.apply_colors = apply_colors
+    if app.ecu.drive_state != firmware.ECUState.PARK or not app.ecu.f2 or app.ecu.f1:
+        raise AssertionError(f"drive {app.ecu.drive_state}, f1 {app.ecu.f1}, f2 {app.ecu.f2}")
+
+    legacy_ns = timed_ns(legacy_gear_leds, pad, PadButton, "DRIVE")
+    table_ns = timed_ns(controller.light, PadButton.BUTTONS["DRIVE"], True)
+    press = controller.process_button_pressed
+    toggle_ns = timed_ns(press, PadButton.BUTTONS["EXHAUST_SOUND"])
+    radio_ns = timed_ns(press, PadButton.BUTTONS["F1"])
+
+    return [
+        ("gear LEDs, 4 update_color calls", legacy_ns / 1000, "us"),
+        ("gear LEDs, one mask update", table_ns / 1000, "us"),
+        ("speedup", legacy_ns / table_ns, "x"),
+        ("toggle press (host)", toggle_ns / 1000, "us"),
+        ("toggle press (device est.)", toggle_ns * DEVICE_CPU_SCALE / 1000, "us"),
+        ("radio press (host)", radio_ns / 1000, "us"),
+        ("radio press (device est.)", radio_ns * DEVICE_CPU_SCALE / 1000, "us"),
+    ]
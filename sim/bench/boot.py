@@ -0,0 +1,126 @@
+# Boot time: from the interpreter starting code.py to the first canio.CAN
+# listen, with the firmware compiled from source on every boot (what the board
+# does with .py files) and precompiled (the .mpy build, here CPython's .pyc).
+# Each run is a fresh interpreter, so nothing is imported yet.
+#
+#   python -m sim.bench.boot            one probe run, printed as JSON
+import json
+import os
+import runpy
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+
+from sim.bench import benchmark, percentile
+from sim.harness import ENTRY_PATH, FIRMWARE_PACKAGE, FIRMWARE_PATH, REPO_ROOT
+
+RUNS = 5
+# Imported by Application after CAN is listening; none may be loaded before.
+# The profiler only while PROFILE_LOOP is on.
+LAZY_MODULES = ("console", "controller", "cruise", "gauge", "parking_brake", "profiler", "state_store")
+
+
+def probe(entry=ENTRY_PATH, heap=False):
+    # code.py imported as the board would run it, then boot(). Times are
+    # time.monotonic_ns(), which the parent process shares.
+    import canio
+
+    from sim import env
+    from sim.clock import SimClock
+    from sim.vbus import VirtualBus
+
+    env.clock = SimClock(1)
+    env.bus = VirtualBus(env.clock, 500_000)
+    listened = []
+    listen = canio.CAN.listen
+
+    def first_listen(self, *args, **kwargs):
+        if not listened:
+            listened.append((time.monotonic_ns(), sorted(name for name in sys.modules if name.startswith(FIRMWARE_PACKAGE + "."))))
+        return listen(self, *args, **kwargs)
+
+    canio.CAN.listen = first_listen
+    if heap:
+        tracemalloc.start()
+    started = time.monotonic_ns()
+    namespace = runpy.run_path(entry, run_name="firmware")
+    imported = time.monotonic_ns()
+    imported_bytes = tracemalloc.get_traced_memory()[0] if heap else None
+    namespace["boot"]()
+    booted = time.monotonic_ns()
+    booted_bytes = tracemalloc.get_traced_memory()[0] if heap else None
+    return {
+        "started": started,
+        "imported": imported,
+        "listened": listened[0][0],
+        "booted": booted,
+        "modules_at_listen": listened[0][1],
+        "modules": sorted(name for name in sys.modules if name.startswith(FIRMWARE_PACKAGE + ".")),
+        "imported_bytes": imported_bytes,
+        "booted_bytes": booted_bytes,
+    }
+
+
+def run_probe(pycache, heap=False):
+    # pycache: where CPython keeps compiled modules (PYTHONPYCACHEPREFIX)
+    environment = dict(os.environ, PYTHONPYCACHEPREFIX=pycache)
+    environment.pop("PYTHONDONTWRITEBYTECODE", None)
+    command = [sys.executable, "-m", "sim.bench.boot"] + (["--heap"] if heap else [])
+    spawned = time.monotonic_ns()
+    output = subprocess.run(command, cwd=REPO_ROOT, env=environment, check=True, capture_output=True, text=True).stdout
+    result = json.loads(output.strip().splitlines()[-1])
+    result["spawned"] = spawned
+    return result
+
+
+def runs(pycache, compiled):
+    # Python itself and the simulator stay compiled. Without compiled, the
+    # firmware under lib/ is compiled again on every run, as the board does
+    # with .py files; code.py always is, on the board too.
+    firmware_cache = os.path.join(pycache, os.path.dirname(FIRMWARE_PATH).lstrip(os.sep))
+    results = []
+    for _ in range(RUNS):
+        if not compiled:
+            shutil.rmtree(firmware_cache, ignore_errors=True)
+        results.append(run_probe(pycache))
+    return results
+
+
+def median_ms(results, start, end):
+    return percentile([(result[end] - result[start]) / 1e6 for result in results], 50)
+
+
+@benchmark("boot")
+def boot_benchmark():
+    pycache = tempfile.mkdtemp()
+    try:
+        run_probe(pycache)
+        source = runs(pycache, compiled=False)
+        compiled = runs(pycache, compiled=True)
+        heap = run_probe(pycache, heap=True)
+    finally:
+        shutil.rmtree(pycache)
+
+    early = [name for name in compiled[0]["modules_at_listen"] if name.rsplit(".", 1)[1] in LAZY_MODULES]
+    if early:
+        raise AssertionError(f"imported before the first CAN listen: {early}")
+    missing = [name for name in LAZY_MODULES if f"{FIRMWARE_PACKAGE}.{name}" not in compiled[0]["modules"] and name != "profiler"]
+    if missing:
+        raise AssertionError(f"never imported by boot(): {missing}")
+
+    rows = []
+    for name, results in (("source", source), ("precompiled", compiled)):
+        rows.append((f"{name}: interpreter start to listen", median_ms(results, "spawned", "listened"), "ms"))
+        rows.append((f"{name}: code.py start to listen", median_ms(results, "started", "listened"), "ms"))
+        rows.append((f"{name}: code.py start to boot() done", median_ms(results, "started", "booted"), "ms"))
+    rows.append(("modules loaded at first listen", len(compiled[0]["modules_at_listen"]), f"of {len(compiled[0]['modules'])}"))
+    rows.append(("allocated by imports (host)", heap["imported_bytes"] / 1024, "KB"))
+    rows.append(("allocated after boot() (host)", heap["booted_bytes"] / 1024, "KB"))
+    return rows
+
+
+if __name__ == "__main__":
+    print(json.dumps(probe(heap="--heap" in sys.argv)))
@@ -0,0 +1,72 @@
+# Bus faults while the keypad is busy: what is sent while the bus is unhealthy,
+# how long recovery takes with auto_restart, and what goes out afterwards.
+from sim import Simulation
+from sim.bench import benchmark
+from sim.devices import MS, Keypad, TeslaBattery
+from sim.vbus import VirtualBus
+
+HAZARD = 1
+DRIVE = 5
+NEUTRAL = 4
+# Long enough to span a hazard blink toggle, so the firmware tries to transmit
+FAULT_MS = 1200
+# Gear shifts and the cruise command
+SAFETY_IDS = (0x697, 0x2F0)
+# Fixed loop time on a Simulation(cpu_scale=0): a host stall times cpu_scale
+# would otherwise eat into the 50 ms after recovery
+TICK_NS = 1_000_000
+
+
+def fault_run(kind):
+    sim = Simulation(cpu_scale=0)
+    keypad = sim.add(Keypad(heartbeat_ms=100))
+    sim.add(TeslaBattery(period_ms=10))
+    sim.boot()
+    sim.run(seconds=1.0, tick_ns=TICK_NS)
+    keypad.press(HAZARD, sim.now_ns())
+    sim.run(seconds=0.5, tick_ns=TICK_NS)
+
+    fault_at = sim.now_ns()
+    fault_end = fault_at + FAULT_MS * MS
+    sim.bus.fault(fault_at, FAULT_MS, kind)
+    # Colour changes during the fault, on top of the hazard blink. On a shorted
+    # bus these presses never reach the firmware.
+    keypad.press(DRIVE, fault_at + 100 * MS)
+    keypad.press(NEUTRAL, fault_at + 300 * MS)
+    sim.run(seconds=FAULT_MS / 1000 + 0.05, tick_ns=TICK_NS)
+    _, payload = sim.app.pad.can_refresh_button_colors()
+    payload = bytes(payload[:5])
+    sim.run(seconds=1.0, tick_ns=TICK_NS)
+
+    supervisor = sim.app.bus_supervisor
+    counters = supervisor.counters(sim.now_ns())
+    if supervisor.recoveries != 1 or not supervisor.healthy:
+        raise AssertionError(f"{kind}: expected one recovery, got {counters}")
+
+    # Within 50 ms of the fault clearing the keypad must show the current colours.
+    # A frame stuck in the controller may still go out first.
+    after = [frame for frame in sim.bus.frames(sender="ecu") if frame.ts_ns >= fault_end]
+    led_after = [frame for frame in after if frame.id == Keypad.LED_ID and frame.ts_ns < fault_end + 50 * MS]
+    during = [frame for frame in sim.bus.frames(sender="ecu") if fault_at <= frame.ts_ns < fault_end]
+    low_priority_during = [frame for frame in during if frame.id not in SAFETY_IDS]
+    if len(low_priority_during) > 1:
+        # Only the frame already in the controller when the fault hit may get out
+        raise AssertionError(f"{kind}: {len(low_priority_during)} low-priority frames sent while unhealthy")
+    if not led_after or bytes(led_after[-1].data[:5]) != payload:
+        raise AssertionError(f"{kind}: LEDs not brought up to date after recovery: {led_after}")
+
+    return sim, counters, len(led_after)
+
+
+@benchmark("busfault")
+def busfault_benchmark():
+    rows = []
+    for kind, state in ((VirtualBus.NO_ACK, 2), (VirtualBus.SHORT, 3)):
+        sim, counters, led_frames = fault_run(kind)
+        rows.append((f"{kind}: time unhealthy", counters["last_outage_ms"], "ms"))
+        rows.append((f"{kind}: time in worst state", counters["time_in_state_ms"][state], "ms"))
+        rows.append((f"{kind}: max tec/rec", f"{counters['max_tec']}/{counters['max_rec']}", ""))
+        rows.append((f"{kind}: LED frames shed", counters["shed"], "frames"))
+        rows.append((f"{kind}: stale frames collapsed", counters["collapsed"], "frames"))
+        rows.append((f"{kind}: LED frames in 50 ms after recovery", led_frames, "frames"))
+    return rows
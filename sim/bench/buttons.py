@@ -0,0 +1,51 @@
+# Edge detection and hold tracking with a keypad that repeats its state frame.
+from sim import Simulation
+from sim.bench import benchmark
+from sim.devices import MS, Keypad, TeslaBattery
+
+HAZARD = 1
+SPEED_UP = 6
+HOLD_MS = 2000
+
+
+@benchmark("buttons")
+def buttons_benchmark():
+    sim = Simulation()
+    keypad = sim.add(Keypad(repeat_ms=50))
+    sim.add(TeslaBattery(period_ms=10))
+    app = sim.boot()
+    sim.run(seconds=1.0)
+
+    events = []
+    handler = app.button_tracker.handler
+
+    def recording_handler(button_id, event, held_ns):
+        events.append((button_id, event, held_ns))
+        handler(button_id, event, held_ns)
+
+    app.button_tracker.handler = recording_handler
+    # The speed buttons are interlocked until cruise is on
+    app.ecu.set_cruise_state(sim.firmware.ECUState.ENABLED)
+    start = sim.now_ns()
+    keypad.press(HAZARD, start, hold_ms=600)
+    keypad.press(SPEED_UP, start + 1000 * MS, hold_ms=HOLD_MS)
+    button_frames_before = len(sim.bus.frames(id=Keypad.BUTTON_EVENT_ID))
+    led_frames_before = len(keypad.led_frames)
+    sim.run(seconds=4.0)
+
+    ButtonEvent = sim.firmware.ButtonEvent
+    speed_up = sim.firmware.PadButton.BUTTONS["AUTOPILOT_SPEED_UP"]
+    hazard = sim.firmware.PadButton.BUTTONS["HAZARD"]
+    released = [held_ns for button_id, event, held_ns in events if button_id == speed_up and event == ButtonEvent.RELEASE]
+    repeats = sum(1 for button_id, event, _ in events if button_id == speed_up and event == ButtonEvent.HOLD_REPEAT)
+    hazard_presses = sum(1 for button_id, event, _ in events if button_id == hazard and event == ButtonEvent.PRESS)
+
+    return [
+        ("0x195 frames on bus", len(sim.bus.frames(id=Keypad.BUTTON_EVENT_ID)) - button_frames_before, "frames"),
+        ("hazard presses dispatched", hazard_presses, "of 1 (held 600 ms)"),
+        ("speed-up hold reported", released[0] / MS if released else 0.0, f"ms of {HOLD_MS}"),
+        ("speed-up HOLD_REPEAT events", repeats, "events"),
+        ("speed-up LONG_PRESS events", sum(1 for button_id, event, _ in events if button_id == speed_up and event == ButtonEvent.LONG_PRESS), "events"),
+        ("target cruise speed", app.ecu.target_cruise_speed, ""),
+        ("LED frames sent", len(keypad.led_frames) - led_frames_before, "frames"),
+    ]
@@ -0,0 +1,94 @@
+# Serial console: what an idle poll costs per tick, and that commands typed
+# into the port change the log level, force LEDs and inject frames.
+import time
+
+from sim import Simulation
+from sim.bench import benchmark
+from sim.devices import Keypad, TeslaBattery
+from sim.harness import DEVICE_CPU_SCALE
+
+POLL_CALLS = 20_000
+HAZARD = 1
+DRIVE = 5
+
+
+def command(sim, text, seconds=0.05):
+    sim.serial.type(text + (b"\r" if isinstance(text, bytes) else "\r"))
+    sim.run(seconds=seconds)
+    return sim.serial.replies()
+
+
+def idle_poll_ns(app):
+    console = app.console
+    started = time.perf_counter_ns()
+    for _ in range(POLL_CALLS):
+        console.poll()
+    return (time.perf_counter_ns() - started) / POLL_CALLS
+
+
+def button_frame(button):
+    mask = Keypad().button_bit(button) if button else 0
+    return f"{Keypad.BUTTON_EVENT_ID:03X}#{mask & 0xFF:02X}{mask >> 8:02X}000000000000"
+
+
+@benchmark("console")
+def console_benchmark():
+    sim = Simulation()
+    firmware = sim.firmware
+    keypad = sim.add(Keypad())
+    sim.add(TeslaBattery())
+    app = sim.boot()
+    sim.run(seconds=1.0)
+    idle_ns = idle_poll_ns(app)
+
+    level = firmware.Logger.current_level
+    reply = command(sim, "log debug", seconds=0.001)
+    if firmware.Logger.current_level != firmware.Logger.DEBUG or "log level: 7 (debug)" not in reply:
+        raise AssertionError(f"log level not set: {reply!r}")
+    firmware.Logger.current_level = level
+
+    reply = command(sim, "stats")
+    sections = [line.split(":")[0] for line in reply.splitlines() if ": " in line]
+    if sections != ["queue", "pad", "bus", "rx", "heap", "filters", "nvm", "cruise"]:
+        raise AssertionError(f"stats sections {sections}")
+
+    led_frames = len(keypad.led_frames)
+    reply = command(sim, "led hazard red")
+    if len(keypad.led_frames) != led_frames + 1 or keypad.led_colors()[HAZARD - 1] != (1, 0, 0):
+        raise AssertionError(f"hazard LED not forced red: {reply!r} {keypad.led_colors()}")
+
+    command(sim, f"inject {button_frame(DRIVE)}")
+    command(sim, f"inject {button_frame(0)}")
+    reply = command(sim, "state")
+    if app.ecu.drive_state != firmware.ECUState.DRIVE or "drive=drive" not in reply:
+        raise AssertionError(f"injected DRIVE press not handled: {reply!r}")
+
+    before = len(sim.bus.frames(id=0x123, sender="ecu"))
+    command(sim, "send 123#0102")
+    if len(sim.bus.frames(id=0x123, sender="ecu")) != before + 1:
+        raise AssertionError("send did not put the frame on the bus")
+
+    reply = command(sim, "x" * (firmware.SerialConsole.LINE_MAX + 10))
+    if "error: line longer" not in reply:
+        raise AssertionError(f"overlong line not rejected: {reply!r}")
+    # Would not decode; must be answered, not raised out of tick()
+    reply = command(sim, b"stats \xff")
+    if "error: line has non-ASCII" not in reply:
+        raise AssertionError(f"non-ASCII line not rejected: {reply!r}")
+    reply = command(sim, "inject 7ff#zz")
+    if "error" not in reply:
+        raise AssertionError(f"bad frame not rejected: {reply!r}")
+
+    # A pasted burst is taken READ_MAX bytes per tick
+    burst = "stats queue\r" * 20
+    sim.serial.type(burst)
+    stats = sim.run(ticks=len(burst) // firmware.SerialConsole.READ_MAX + 1)
+    replies = sim.serial.replies().count("queue: ")
+
+    return [
+        ("idle poll (host)", idle_ns, "ns/tick"),
+        ("idle poll (device est.)", idle_ns * DEVICE_CPU_SCALE / 1000, "us/tick"),
+        ("commands executed", app.console.executed, "commands"),
+        ("pasted commands answered", replies, f"of 20 in {stats.ticks} ticks"),
+        ("longest tick with a paste", stats.max_tick_ns / 1e6, "ms"),
+    ]
@@ -0,0 +1,115 @@
+# Cruise command rate: frames on the wire at CRUISE_COMMAND_RATE on an idle
+# bus and with the keypad and battery at their busiest, and the target speed
+# ramping with the hold time of the speed button.
+from sim import Simulation
+from sim.bench import benchmark, percentile
+from sim.devices import MS, Keypad, TeslaBattery
+
+# Physical keypad buttons
+HAZARD = 1
+DRIVE = 5
+NEUTRAL = 4
+SPEED_UP = 6
+AUTOPILOT_ON = 11
+RUN_S = 6.0
+HOLD_MS = 4000
+# Gear presses on top of the held speed button
+GEAR_EVERY_MS = 250
+# Fixed loop time on a Simulation(cpu_scale=0), so host noise stays out of
+# the intervals. Not a divisor of the period: deadlines land mid-tick.
+TICK_NS = 1_700_000
+# Frames on the wire over the run may differ from rate * time by this many
+COUNT_TOLERANCE = 1
+
+
+def cruise_frames(sim, since_ns):
+    cruise_id = sim.firmware.FeatherSettings.CRUISE_COMMAND_ID
+    return [frame for frame in sim.bus.frames(cruise_id, "ecu") if frame.ts_ns >= since_ns]
+
+
+def busy_keypad(keypad, start):
+    # Hazard blinking throughout, cruise on, then the speed button held while
+    # the gear buttons are pressed over and over
+    keypad.press(HAZARD, start)
+    keypad.press(AUTOPILOT_ON, start + 200 * MS)
+    held_from = start + 500 * MS
+    speed_up = keypad.button_bit(SPEED_UP)
+    keypad.set_mask(held_from, speed_up)
+    for index, at_ms in enumerate(range(GEAR_EVERY_MS, HOLD_MS, GEAR_EVERY_MS)):
+        gear = keypad.button_bit(DRIVE if index % 2 else NEUTRAL)
+        keypad.set_mask(held_from + at_ms * MS, speed_up | gear)
+        keypad.set_mask(held_from + (at_ms + 50) * MS, speed_up)
+    keypad.set_mask(held_from + HOLD_MS * MS, 0)
+
+
+def cruise_run(busy):
+    sim = Simulation(cpu_scale=0)
+    if busy:
+        # State frame repeated every 10 ms on top of the edges, battery at 1 kHz
+        keypad = sim.add(Keypad(heartbeat_ms=100, repeat_ms=10))
+        sim.add(TeslaBattery(period_ms=1))
+    else:
+        keypad = sim.add(Keypad())
+        sim.add(TeslaBattery())
+    sim.boot()
+    sim.run(seconds=1.0, tick_ns=TICK_NS)
+
+    start = sim.now_ns()
+    missed_before = sim.app.cruise.missed
+    if busy:
+        busy_keypad(keypad, start)
+    stats = sim.run(seconds=RUN_S, tick_ns=TICK_NS)
+    return sim, start, sim.app.cruise.missed - missed_before, stats
+
+
+def check_frames(sim, frames, missed, label):
+    # With a fixed loop time every deadline is met within one tick: the full
+    # rate on the wire, nothing skipped or lost in the TX queue, and no
+    # interval off the period by more than a tick
+    firmware = sim.firmware
+    cruise = sim.app.cruise
+    period_ms = 1000 / firmware.FeatherSettings.CRUISE_COMMAND_RATE
+    expected = RUN_S * firmware.FeatherSettings.CRUISE_COMMAND_RATE
+    if missed or abs(len(frames) - expected) > COUNT_TOLERANCE:
+        raise AssertionError(f"{label}: {len(frames)} cruise frames and {missed} skipped in {RUN_S} s, expected {expected:.0f}")
+    counters = [frame.data[3] for frame in frames]
+    gaps = [(earlier, later) for earlier, later in zip(counters, counters[1:]) if (later - earlier) & 0xFF != 1]
+    if gaps or cruise.superseded:
+        raise AssertionError(f"{label}: counter jumps {gaps[:5]}, {cruise.superseded} frames superseded")
+    deviations = [abs((later.ts_ns - earlier.ts_ns) / MS - period_ms) for earlier, later in zip(frames, frames[1:])]
+    if max(deviations) > TICK_NS / MS:
+        raise AssertionError(f"{label}: interval error max {max(deviations):.2f} ms, tick {TICK_NS / MS} ms")
+    return deviations
+
+
+@benchmark("cruise")
+def cruise_benchmark():
+    rows = []
+    for label, busy in (("idle", False), ("peak", True)):
+        sim, start, missed, stats = cruise_run(busy)
+        frames = cruise_frames(sim, start)
+        deviations = check_frames(sim, frames, missed, label)
+        cruise = sim.app.cruise
+        rows.append((f"{label}: cruise frames/sec", len(frames) / RUN_S, "frames/s"))
+        rows.append((f"{label}: interval error p50", percentile(deviations, 50), "ms"))
+        rows.append((f"{label}: interval error p99", percentile(deviations, 99), "ms"))
+        rows.append((f"{label}: interval error max", max(deviations), "ms"))
+        rows.append((f"{label}: missed / superseded", f"{missed}/{cruise.superseded}", "frames"))
+        rows.append((f"{label}: RX frames/sec", stats.frames_per_sec, "frames/s"))
+
+    # The peak run's speed button: one step on press, bigger the longer it is held
+    speeds = [int.from_bytes(frame.data[1:3], "little") for frame in frames if frame.data[0] & 0x01]
+    if not speeds:
+        raise AssertionError("cruise never enabled in the frames")
+    steps = sorted({later - earlier for earlier, later in zip(speeds, speeds[1:]) if later != earlier})
+    ramp = sorted(step for _, step in sim.firmware.CruiseCommand.RAMP)
+    if steps != ramp:
+        raise AssertionError(f"speed steps {steps}, expected the ramp steps {ramp}")
+    if sim.app.ecu.target_cruise_speed != speeds[-1]:
+        raise AssertionError(f"last frame says {speeds[-1]}, target is {sim.app.ecu.target_cruise_speed}")
+
+    counters = cruise.counters()
+    rows.append(("peak: firmware jitter average", counters["jitter_average_us"] / 1000, "ms"))
+    rows.append(("peak: firmware late max", counters["late_max_us"] / 1000, "ms"))
+    rows.append(("peak: speed after hold", speeds[-1], f"after {HOLD_MS} ms"))
+    return rows
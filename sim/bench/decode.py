@@ -0,0 +1,44 @@
+# Generated DBC decoders against the hand-written DI_hvBusStatus decoder.
+import random
+import time
+
+from sim import Simulation
+from sim.bench import benchmark
+
+CALLS = 200_000
+
+
+def legacy_decode_voltage(can_payload):
+    # TeslaECU.decode_battery_state_to_voltage before the generated decoders
+    voltage_raw = (can_payload[0] & 0b11111111) | ((can_payload[1] & 0b00000011) << 8)
+    return voltage_raw * 0.5
+
+
+def time_calls(function, data):
+    started = time.perf_counter_ns()
+    for _ in range(CALLS):
+        function(data)
+    return (time.perf_counter_ns() - started) / CALLS
+
+
+@benchmark("decode")
+def decode_benchmark():
+    Simulation()
+    import dbc_signals
+
+    rng = random.Random(0x126)
+    payloads = [bytes(rng.randrange(256) for _ in range(3)) for _ in range(10_000)]
+    mismatches = sum(1 for data in payloads if dbc_signals.decode_di_voltage(data) != legacy_decode_voltage(data))
+    if mismatches:
+        raise AssertionError(f"{mismatches} DI_voltage decodes differ from the hand-written decoder")
+
+    data = payloads[0]
+    legacy_ns = time_calls(legacy_decode_voltage, data)
+    generated_ns = time_calls(dbc_signals.decode_di_voltage, data)
+    current_ns = time_calls(dbc_signals.decode_di_current, data)
+    return [
+        ("payloads matching legacy", len(payloads) - mismatches, f"of {len(payloads)}"),
+        ("legacy DI_voltage", 1e9 / legacy_ns, "decodes/s"),
+        ("generated DI_voltage", 1e9 / generated_ns, "decodes/s"),
+        ("generated DI_current", 1e9 / current_ns, "decodes/s"),
+    ]
@@ -0,0 +1,47 @@
+# Frames/sec through Application._process_message_based_on_id.
+import time
+
+from sim import Simulation
+from sim.bench import benchmark
+
+FRAMES = 50_000
+HAZARD = 1
+
+
+@benchmark("dispatch")
+def dispatch_benchmark():
+    sim = Simulation()
+    app = sim.boot()
+    canio = sim.firmware.canio
+
+    frames = {
+        "0x715 heartbeat": canio.Message(id=0x715, data=bytes([0x05])),
+        "0x126 battery": canio.Message(id=0x126, data=(720).to_bytes(3, "little")),
+        "0x195 release (no buttons)": canio.Message(id=0x195, data=bytes(8)),
+        "0x195 hazard held": canio.Message(id=0x195, data=bytes([1 << (HAZARD - 1), 0, 0, 0, 0, 0, 0, 0])),
+        "0x7ff unknown": canio.Message(id=0x7FF, data=bytes(8)),
+    }
+
+    rows = []
+    dispatch = app._process_message_based_on_id
+    for label, message in frames.items():
+        started = time.perf_counter_ns()
+        for _ in range(FRAMES):
+            # The read of message.data is part of the receive path
+            dispatch(message, message.data)
+        elapsed = time.perf_counter_ns() - started
+        rows.append((label, FRAMES * 1e9 / elapsed, "frames/s"))
+
+    mix = list(frames.values())[:4]
+    started = time.perf_counter_ns()
+    for index in range(FRAMES):
+        message = mix[index & 3]
+        dispatch(message, message.data)
+    rows.append(("mixed", FRAMES * 1e9 / (time.perf_counter_ns() - started), "frames/s"))
+
+    button_data = frames["0x195 hazard held"].data
+    started = time.perf_counter_ns()
+    for _ in range(FRAMES):
+        sim.firmware.Pad.decode_button_press(button_data)
+    rows.append(("Pad.decode_button_press", (time.perf_counter_ns() - started) / FRAMES, "ns/frame"))
+    return rows
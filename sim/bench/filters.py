@@ -0,0 +1,139 @@
+# CAN acceptance filters: how the planner packs today's ids and a grown id set
+# into the SAM E5x filter elements, what that lets through by mistake, and
+# whether a telemetry flood can still starve buttons and heartbeats.
+import random
+
+from sim import Simulation
+from sim.bench import benchmark
+from sim.devices import MS, Device, Keypad, TeslaBattery
+
+# Ids we expect to subscribe to next: speed, gear, openpilot's cruise state
+FUTURE_IDS = (0x118, 0x257, 0x229, 0x2B9, 0x313, 0x399, 0x488)
+# Other traffic on the chassis bus: (id, Hz), fixed seed so runs compare
+BUS_IDS = 60
+BUS_SEED = 2600
+DRIVE_CYCLE = (5, 4, 3, 2, 1, 8, 9, 1)
+PRESSES = 40
+PRESS_INTERVAL_MS = 130
+# Telemetry arriving back to back at wire speed, BURST_FRAMES every BURST_PERIOD_MS
+BURST_FRAMES = 16
+BURST_PERIOD_MS = 5
+# Fixed tick step, so host hiccups do not decide what gets lost; a busy tick,
+# long enough for a burst to overrun a 3-frame FIFO
+TICK_NS = 1_000_000
+
+
+class TelemetryBurst(Device):
+    name = "burst"
+
+    def __init__(self, period_ms=BURST_PERIOD_MS, frames=BURST_FRAMES):
+        self.period_ns = period_ms * MS
+        self.frames = frames
+        self.burst_start_ns = 0
+        self.index = 0
+
+    def next_event_ns(self):
+        return self.burst_start_ns + self.index * self.bus.frame_time_ns(8)
+
+    def poll(self, now_ns):
+        while self.next_event_ns() <= now_ns:
+            self.bus.publish(self, TeslaBattery.BATTERY_ID, bytes(8), self.next_event_ns())
+            self.index += 1
+            if self.index == self.frames:
+                self.index = 0
+                self.burst_start_ns += self.period_ns
+
+
+def bus_traffic(subscribed):
+    generator = random.Random(BUS_SEED)
+    traffic = {id: 10 for id in subscribed}
+    while len(traffic) < len(subscribed) + BUS_IDS:
+        traffic.setdefault(generator.randrange(0x800), generator.choice((1, 10, 20, 50, 100)))
+    return traffic
+
+
+def false_positive_share(plan, traffic):
+    # Share of accepted frames, weighted by rate, that no handler wants
+    groups = plan.priority_groups + plan.groups
+    accepted = 0
+    unwanted = 0
+    for id, rate in traffic.items():
+        if any(id & mask == base for base, mask in groups):
+            accepted += rate
+            if id not in plan.ids:
+                unwanted += rate
+    return 100 * unwanted / accepted if accepted else 0.0
+
+
+def flood(priority_ids):
+    # Telemetry bursts while buttons are pressed. Returns (button/heartbeat
+    # frames lost, RX frames lost in all, presses answered).
+    sim = Simulation(cpu_scale=0)
+    if priority_ids is not None:
+        sim.firmware.Application.PRIORITY_IDS = priority_ids
+    keypad = sim.add(Keypad())
+    sim.add(TelemetryBurst())
+    app = sim.boot()
+    handled = [0]
+    for id in (Keypad.HEARTBEAT_ID, Keypad.BUTTON_EVENT_ID):
+        app.message_handlers[id] = counted(app.message_handlers[id], handled)
+    sim.run(seconds=0.5, tick_ns=TICK_NS)
+    start = sim.now_ns()
+    for index in range(PRESSES):
+        keypad.press(DRIVE_CYCLE[index % len(DRIVE_CYCLE)], start + index * PRESS_INTERVAL_MS * MS + index * MS // 7)
+    sim.run(seconds=PRESSES * PRESS_INTERVAL_MS / 1000 + 0.5, tick_ns=TICK_NS)
+    lost = sum(listener.lost for listener in sim.bus.controllers[0].listeners)
+    return len(sim.bus.frames(sender=keypad.name)) - handled[0], lost, len(keypad.press_latencies_ns())
+
+
+def counted(handler, count):
+    def handle(message, data):
+        count[0] += 1
+        handler(message, data)
+    return handle
+
+
+@benchmark("filters")
+def filters_benchmark():
+    sim = Simulation()
+    firmware = sim.firmware
+    app = sim.boot()
+    planner = firmware.CanFilterPlanner
+    elements = sim.firmware.canio.Listener.elements
+
+    today = app.filter_plan.report()
+    if today["false_positive_ids"]:
+        raise AssertionError(f"today's ids should fit exactly: {today}")
+
+    ids = tuple(app.message_handlers) + FUTURE_IDS
+    grown = planner(firmware.Application.PRIORITY_IDS, ids)
+    report = grown.report()
+    used = elements(planner.matches(grown.priority_groups)) + elements(planner.matches(grown.groups))
+    if used > planner.FILTER_ELEMENTS or used != report["elements"]:
+        raise AssertionError(f"grown plan takes {used} filter elements: {report}")
+    if any(mask != planner.STANDARD_MASK for _, mask in grown.priority_groups):
+        raise AssertionError(f"priority ids were merged into a mask: {report['priority_matches']}")
+    groups = grown.priority_groups + grown.groups
+    missed = [id for id in ids if not any(id & mask == base for base, mask in groups)]
+    if missed:
+        raise AssertionError(f"grown plan drops subscribed ids {missed}")
+
+    split_priority_lost, split_lost, split_answered = flood(None)
+    shared_priority_lost, shared_lost, shared_answered = flood(())
+    if split_priority_lost:
+        raise AssertionError(f"{split_priority_lost} button/heartbeat frames lost with their own listener")
+
+    return [
+        ("today: filter elements", today["elements"], f"of {planner.FILTER_ELEMENTS}"),
+        ("today: accepted ids", today["accepted_ids"], f"for {today['subscribed_ids']}"),
+        ("grown: filter elements", report["elements"], f"of {planner.FILTER_ELEMENTS}"),
+        ("grown: matches", " ".join(report["priority_matches"] + report["matches"]), ""),
+        ("grown: false positive ids", report["false_positive_ids"], f"of {planner.STANDARD_IDS}"),
+        ("grown: false positive frames", false_positive_share(grown, bus_traffic(ids)), "%"),
+        ("flood, own FIFO: priority lost", split_priority_lost, "frames"),
+        ("flood, own FIFO: all RX lost", split_lost, "frames"),
+        ("flood, own FIFO: presses answered", split_answered, f"of {PRESSES}"),
+        ("flood, shared FIFO: priority lost", shared_priority_lost, "frames"),
+        ("flood, shared FIFO: all RX lost", shared_lost, "frames"),
+        ("flood, shared FIFO: presses answered", shared_answered, f"of {PRESSES}"),
+    ]
@@ -0,0 +1,42 @@
+# Battery gauge servo writes per minute under a busy, noisy 0x126 stream.
+import math
+import random
+
+from sim import Simulation
+from sim.bench import benchmark
+from sim.devices import TeslaBattery
+
+MINUTE = 60.0
+
+
+def noisy_discharge(seed):
+    # 390 V sagging by 10 V over the minute, with +/-3 V of frame-to-frame noise
+    rng = random.Random(seed)
+
+    def voltage(at_ns):
+        seconds = at_ns / 1e9
+        return 390 - 10 * seconds / MINUTE + 1.5 * math.sin(seconds * 7) + rng.uniform(-1.5, 1.5)
+    return voltage
+
+
+def gauge_run(period_ms):
+    sim = Simulation()
+    sim.add(TeslaBattery(period_ms=period_ms, voltage=noisy_discharge(period_ms)))
+    app = sim.boot()
+    writes = app.battery_gauge.servo.writes
+    writes_before = len(writes)
+    stats = sim.run(seconds=MINUTE)
+    angles = [angle for _, angle in writes[writes_before:]]
+    return (len(angles)) * 60e9 / stats.sim_ns, angles
+
+
+@benchmark("gauge")
+def gauge_benchmark():
+    rows = []
+    for period_ms in (10, 1):
+        writes_per_minute, angles = gauge_run(period_ms)
+        rate = 1000 // period_ms
+        rows.append((f"servo writes/min, 0x126 at {rate} Hz", writes_per_minute, "writes"))
+        if angles:
+            rows.append((f"angle range, 0x126 at {rate} Hz", f"{min(angles):.1f}-{max(angles):.1f}", "deg"))
+    return rows
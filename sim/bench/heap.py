@@ -0,0 +1,57 @@
+# Steady-state allocation check: after warm-up, 10k ticks of normal traffic
+# must not leave any memory allocated by the firmware behind.
+import os
+import tracemalloc
+
+from sim import Simulation
+from sim.bench import benchmark
+from sim.devices import Keypad, TeslaBattery
+from sim.harness import FIRMWARE_PATH
+
+WARMUP_S = 2.0
+TICKS = 10_000
+# Counters and timestamps are int objects that get replaced, not accumulated;
+# a few of them being larger than before is not growth
+GROWTH_LIMIT_BYTES = 512
+FIRMWARE_FILES = tracemalloc.Filter(True, os.path.join(FIRMWARE_PATH, "*"))
+# Fixed loop time on a Simulation(cpu_scale=0), about a busy tick on the
+# device: which counters happen to be replaced no longer depends on host speed
+TICK_NS = 4_000_000
+
+
+def firmware_traced_bytes(snapshot):
+    return sum(stat.size for stat in snapshot.filter_traces([FIRMWARE_FILES]).statistics("filename"))
+
+
+@benchmark("heap")
+def heap_benchmark():
+    sim = Simulation(cpu_scale=0)
+    keypad = sim.add(Keypad(heartbeat_ms=100))
+    sim.add(TeslaBattery(period_ms=10))
+    sim.boot()
+    # Hazard blinking keeps timers, LED frames and TX traffic going throughout
+    keypad.press(1, sim.now_ns())
+    sim.run(seconds=WARMUP_S, tick_ns=TICK_NS)
+
+    tracemalloc.start()
+    try:
+        before = tracemalloc.take_snapshot()
+        stats = sim.run(ticks=TICKS, tick_ns=TICK_NS)
+        after = tracemalloc.take_snapshot()
+    finally:
+        tracemalloc.stop()
+
+    growth = firmware_traced_bytes(after) - firmware_traced_bytes(before)
+    top = after.filter_traces([FIRMWARE_FILES]).compare_to(
+        before.filter_traces([FIRMWARE_FILES]), "lineno")[:3]
+    if growth > GROWTH_LIMIT_BYTES:
+        raise AssertionError(f"firmware heap grew by {growth} bytes over {TICKS} ticks: {top}")
+
+    heap = sim.app.heap_counters()
+    return [
+        ("ticks", stats.ticks, ""),
+        ("simulated time", stats.sim_ns / 1e9, "s"),
+        ("firmware heap growth", growth, "bytes"),
+        ("idle-tick gc.collect() calls", heap["collections"], ""),
+        ("frames on bus", stats.frames, "frames"),
+    ]
@@ -0,0 +1,100 @@
+# Golden check and microbenchmark for the 0x215 LED payload encoder.
+import random
+import time
+
+from sim import Simulation
+from sim.bench import benchmark
+
+SAMPLES = 50_000
+TIMING_CALLS = 20_000
+
+
+def legacy_rgb_matrices(buttons):
+    # Pad.rgb_matrices before the bit-packed encoder
+    i = 0
+    pad_rgb_matrix = [
+        [0] * 12,
+        [0] * 12,
+        [0] * 12,
+    ]
+
+    for button in buttons[0:12]:
+        pad_rgb_matrix[0][i] = button.red
+        pad_rgb_matrix[1][i] = button.green
+        pad_rgb_matrix[2][i] = button.blue
+        i = i + 1
+
+    return pad_rgb_matrix
+
+
+def legacy_rgb_matrix_to_hex(matrix):
+    # Pad.rgb_matrix_to_hex before the bit-packed encoder
+    rr = matrix[0][::-1]
+    gr = matrix[1][::-1]
+    br = matrix[2][::-1]
+
+    b0 = rr[4:]
+    b1 = gr[8:] + rr[:4]
+    b2 = gr[:8]
+    b3 = br[4:]
+    b4 = [0] * 4 + br[:4]
+
+    bb0 = bin(int(''.join(map(str, b0)), 2))
+    bb1 = bin(int(''.join(map(str, b1)), 2))
+    bb2 = bin(int(''.join(map(str, b2)), 2))
+    bb3 = bin(int(''.join(map(str, b3)), 2))
+    bb4 = bin(int(''.join(map(str, b4)), 2))
+
+    return [int(bb0, 2), int(bb1, 2), int(bb2, 2), int(bb3, 2), int(bb4, 2)]
+
+
+class Reference:
+    def __init__(self, red, green, blue):
+        self.red = red
+        self.green = green
+        self.blue = blue
+
+
+@benchmark("led")
+def led_benchmark():
+    sim = Simulation()
+    firmware = sim.firmware
+    pad = firmware.Pad()
+    colors = list(firmware.PadButton.COLORS)
+    rng = random.Random(0x215)
+
+    # Start from a random full assignment, then keep changing single buttons so
+    # the masks are exercised in place (set and clear) rather than rebuilt.
+    assignment = [rng.choice(colors) for _ in pad.buttons]
+    for button, color in zip(pad.buttons, assignment):
+        button.change_color(color)
+
+    mismatches = 0
+    for sample in range(SAMPLES):
+        index = rng.randrange(12)
+        assignment[index] = rng.choice(colors)
+        pad.buttons[index].change_color(assignment[index])
+        expected = legacy_rgb_matrix_to_hex(legacy_rgb_matrices(
+            [Reference(*firmware.PadButton.COLORS[color]) for color in assignment]))
+        _, payload = pad.can_refresh_button_colors()
+        if list(payload[:5]) != expected:
+            mismatches += 1
+    if mismatches:
+        raise AssertionError(f"{mismatches} of {SAMPLES} LED payloads differ from the legacy encoder")
+
+    started = time.perf_counter_ns()
+    for _ in range(TIMING_CALLS):
+        legacy_rgb_matrix_to_hex(legacy_rgb_matrices(pad.buttons))
+    legacy_ns = (time.perf_counter_ns() - started) / TIMING_CALLS
+
+    started = time.perf_counter_ns()
+    for _ in range(TIMING_CALLS):
+        pad.can_refresh_button_colors()
+    packed_ns = (time.perf_counter_ns() - started) / TIMING_CALLS
+
+    return [
+        ("golden samples matching legacy", SAMPLES - mismatches, f"of {SAMPLES}"),
+        ("legacy rgb_matrix_to_hex", legacy_ns / 1000, "us/call"),
+        ("bit-packed encoder", packed_ns / 1000, "us/call"),
+        ("speedup", legacy_ns / packed_ns, "x"),
+    ]
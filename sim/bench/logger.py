@@ -0,0 +1,66 @@
+# Cost of disabled logging: eager f-string vs lazy args vs stripped call sites.
+import os
+import shutil
+import sys
+import tempfile
+import time
+
+from sim import Simulation
+from sim.bench import benchmark
+from sim.bench.loop import drive_cycle_simulation
+from sim.harness import FIRMWARE_PATH, REPO_ROOT
+
+CALLS = 200_000
+
+
+def strip(path):
+    # A stripped copy of the package at path, in a temporary directory
+    sys.path.insert(0, os.path.join(REPO_ROOT, "tools"))
+    try:
+        from strip_logging import strip_tree
+    finally:
+        sys.path.pop(0)
+    stripped = os.path.join(tempfile.mkdtemp(), os.path.basename(path))
+    return stripped, strip_tree(path, stripped)
+
+
+def time_calls(function):
+    started = time.perf_counter_ns()
+    for _ in range(CALLS):
+        function()
+    return (time.perf_counter_ns() - started) / CALLS
+
+
+@benchmark("logging")
+def logging_benchmark():
+    Logger = Simulation().firmware.Logger
+    command, data = 3, [0x0d, 0xbe, 0xef]
+
+    def eager():
+        Logger.debug(f"Sending drive state command {command} with data {data}")
+
+    def lazy():
+        Logger.debug("Sending drive state command %s with data %s", command, data)
+
+    def stripped_call():
+        pass
+
+    eager_ns = time_calls(eager)
+    lazy_ns = time_calls(lazy)
+    stripped_ns = time_calls(stripped_call)
+
+    _, _, logged = drive_cycle_simulation()
+    stripped_path, removed = strip(FIRMWARE_PATH)
+    try:
+        _, _, bare = drive_cycle_simulation(firmware_path=stripped_path)
+    finally:
+        shutil.rmtree(os.path.dirname(stripped_path))
+
+    return [
+        ("disabled debug, eager f-string", eager_ns, "ns/call"),
+        ("disabled debug, lazy args", lazy_ns, "ns/call"),
+        ("stripped call site", stripped_ns, "ns/call"),
+        ("call sites stripped", removed, "calls"),
+        ("host time per tick, logging calls", logged.host_us_per_tick, "us"),
+        ("host time per tick, stripped", bare.host_us_per_tick, "us"),
+    ]
@@ -0,0 +1,83 @@
+# Main loop throughput and button-to-LED latency under a busy bus.
+from sim import Simulation
+from sim.bench import benchmark, percentile
+from sim.devices import MS, Keypad, TeslaBattery
+from sim.harness import FIRMWARE_PATH
+
+DRIVE_CYCLE = (5, 4, 3, 2, 1, 8, 9, 1)
+PRESS_INTERVAL_MS = 1500
+
+
+def drive_cycle_simulation(presses=24, battery_period_ms=10, firmware_path=FIRMWARE_PATH, profile_loop=False):
+    sim = Simulation(firmware_path)
+    # A global of canpad.app in the simulator; on the device it is a compile-time const
+    sim.firmware.app.PROFILE_LOOP = int(profile_loop)
+    keypad = sim.add(Keypad())
+    sim.add(TeslaBattery(period_ms=battery_period_ms))
+    sim.boot()
+    sim.run(seconds=1.0)
+
+    start = sim.now_ns()
+    for index in range(presses):
+        keypad.press(DRIVE_CYCLE[index % len(DRIVE_CYCLE)], start + index * PRESS_INTERVAL_MS * MS)
+    stats = sim.run(seconds=presses * PRESS_INTERVAL_MS / 1000)
+    return sim, keypad, stats
+
+
+@benchmark("loop")
+def loop_benchmark():
+    sim, keypad, stats = drive_cycle_simulation()
+    latencies_ms = [latency / MS for latency in keypad.press_latencies_ns()]
+    lost = sum(listener.lost for can in sim.bus.controllers for listener in can.listeners)
+    queue = sim.firmware.CanMessageQueue.get_instance()
+    app = sim.app
+    return [
+        ("ticks/sec (simulated)", stats.ticks_per_sec, "ticks/s"),
+        ("host time per tick", stats.host_us_per_tick, "us"),
+        ("frames processed/sec", stats.frames_per_sec, "frames/s"),
+        ("RX frames lost to FIFO overflow", lost, "frames"),
+        ("RX telemetry frames collapsed", app.rx_collapsed, "frames"),
+        ("button->LED latency p50", percentile(latencies_ms, 50), "ms"),
+        ("button->LED latency p99", percentile(latencies_ms, 99), "ms"),
+        ("presses with no LED change", len(keypad.presses) - len(latencies_ms), "presses"),
+        ("TX queue high water (per class)", "/".join(str(count) for count in queue.high_water), "frames"),
+        ("TX frames dropped", sum(queue.dropped), "frames"),
+    ]
+
+
+@benchmark("rx-burst")
+def rx_burst_benchmark():
+    # 0x126 at 1 kHz: button frames must still get through, and the battery
+    # frame is decoded at most once per tick.
+    sim = Simulation()
+    keypad = sim.add(Keypad())
+    sim.add(TeslaBattery(period_ms=1))
+    app = sim.boot()
+    sim.run(seconds=1.0)
+
+    decodes = [0]
+    battery_id = sim.firmware.TeslaECU.BATTERY_ID
+    handler = app.message_handlers[battery_id]
+
+    def counting_handler(message, data):
+        decodes[0] += 1
+        return handler(message, data)
+
+    app.message_handlers[battery_id] = counting_handler
+    start = sim.now_ns()
+    presses = 20
+    for index in range(presses):
+        keypad.press(DRIVE_CYCLE[index % 4], start + index * 500 * MS)
+    received_before = app.rx_received
+    stats = sim.run(seconds=presses * 0.5)
+    lost = sum(listener.lost for can in sim.bus.controllers for listener in can.listeners)
+
+    return [
+        ("ticks/sec (simulated)", stats.ticks_per_sec, "ticks/s"),
+        ("frames drained/sec", (app.rx_received - received_before) * 1e9 / stats.sim_ns, "frames/s"),
+        ("battery decodes per tick", decodes[0] / stats.ticks, ""),
+        ("telemetry frames collapsed", app.rx_collapsed, "frames"),
+        ("RX budget exhausted", app.rx_budget_exhausted, "ticks"),
+        ("RX frames lost to FIFO overflow", lost, "frames"),
+        ("presses with an LED response", len(keypad.press_latencies_ns()), f"of {presses}"),
+    ]
@@ -0,0 +1,97 @@
+# Per-stage loop timing: what the histograms show for a drive cycle, and what
+# turning them on costs.
+import time
+
+from sim import Simulation
+from sim.bench import benchmark, percentile
+from sim.bench.loop import drive_cycle_simulation
+from sim.devices import Keypad, TeslaBattery
+
+PRESSES = 16
+# Overhead: plain and profiled ticks in alternating blocks on one simulation
+# with a fixed loop time, so both see the same traffic. Host speed drifts
+# more than the effect, so it is the median ratio of neighbouring blocks.
+TICK_NS = 1_000_000
+BLOCK_TICKS = 320
+ROUNDS = 101
+OVERHEAD_LIMIT_PCT = 5.0
+
+
+def block_host_ns(sim, profile_loop):
+    sim.firmware.app.PROFILE_LOOP = profile_loop
+    app = sim.app
+    clock = sim.clock
+    elapsed = 0
+    for _ in range(BLOCK_TICKS):
+        now = sim.now_ns()
+        started = time.perf_counter_ns()
+        app.tick()
+        elapsed += time.perf_counter_ns() - started
+        clock.advance_to(now + TICK_NS)
+    return elapsed
+
+
+def profiling_overhead():
+    # Returns (plain, profiled) host us per tick and the overhead in percent.
+    # The profiler is set up at boot; PROFILE_LOOP is a global in the
+    # simulator, so tick() can switch branches while the traffic keeps running.
+    sim = Simulation(cpu_scale=0)
+    sim.firmware.app.PROFILE_LOOP = 1
+    sim.add(Keypad(heartbeat_ms=100))
+    sim.add(TeslaBattery(period_ms=10))
+    sim.boot()
+    sim.run(seconds=0.5, tick_ns=TICK_NS)
+    plain = []
+    profiled = []
+    for index in range(ROUNDS):
+        # Alternate which goes first, so neither always gets the warm caches
+        if index % 2:
+            plain.append(block_host_ns(sim, 0))
+            profiled.append(block_host_ns(sim, 1))
+        else:
+            profiled.append(block_host_ns(sim, 1))
+            plain.append(block_host_ns(sim, 0))
+    sim.firmware.app.PROFILE_LOOP = 1
+    ratios = [after / before for before, after in zip(plain, profiled)]
+    return (
+        percentile(plain, 50) / BLOCK_TICKS / 1000,
+        percentile(profiled, 50) / BLOCK_TICKS / 1000,
+        100 * (percentile(ratios, 50) - 1),
+    )
+
+
+@benchmark("profile")
+def profile_benchmark():
+    sim, _, stats = drive_cycle_simulation(PRESSES, profile_loop=True)
+    app = sim.app
+    profiler = app.profiler
+    lines = []
+    app.dump_loop_profile(lines.append)
+    stage_lines = [line for line in lines if not line.startswith("#")]
+    if len(stage_lines) != len(profiler.names):
+        raise AssertionError(f"profile dump has {len(stage_lines)} stage lines, expected {len(profiler.names)}")
+    tick = len(profiler.names) - 1
+    samples = [sum(counts) for counts in profiler.counts]
+    # One sample per stage on every Nth tick, the warm-up second included,
+    # counted from the start of the current window
+    every = sim.firmware.FeatherSettings.PROFILE_SAMPLE_EVERY
+    in_window = app.profile_ticks // every % sim.firmware.FeatherSettings.PROFILE_WINDOW
+    if len(set(samples)) != 1 or samples[tick] != profiler.samples or profiler.samples != in_window or app.profile_ticks < stats.ticks:
+        raise AssertionError(f"histogram sample counts {samples} for at least {stats.ticks} ticks")
+
+    plain, profiled, overhead = profiling_overhead()
+    if overhead > OVERHEAD_LIMIT_PCT:
+        raise AssertionError(f"profiling costs {overhead:.1f}% per tick, limit {OVERHEAD_LIMIT_PCT}%")
+
+    rows = [
+        ("tick p50 (bucket edge)", profiler.format_us(profiler.percentile_us(tick, 50)), "us"),
+        ("tick p99 (bucket edge)", profiler.format_us(profiler.percentile_us(tick, 99)), "us"),
+        ("tick max (every tick)", max(app.profile_max_ns, profiler.max_ns[tick]) / 1000, "us"),
+    ]
+    slowest = sorted(range(tick), key=lambda index: -profiler.max_ns[index])[:3]
+    for index in slowest:
+        rows.append((f"max {profiler.names[index]}", profiler.max_ns[index] / 1000, "us"))
+    rows.append(("host time per tick, plain", plain, "us"))
+    rows.append(("host time per tick, profiled", profiled, "us"))
+    rows.append(("profiling overhead (host)", overhead, "%"))
+    return rows
@@ -0,0 +1,51 @@
+# Flight recorder: per-frame record cost, trigger/freeze and candump dump.
+import time
+
+from sim.bench import benchmark
+from sim.bench.loop import drive_cycle_simulation
+from sim.devices import Keypad
+
+CALLS = 100_000
+DRIVE = 5
+
+
+@benchmark("recorder")
+def recorder_benchmark():
+    sim, keypad, _ = drive_cycle_simulation(presses=8)
+    keypad.press(DRIVE, sim.now_ns())
+    sim.run(seconds=0.5)
+    recorder = sim.firmware.CanFlightRecorder.get_instance()
+    full = recorder.count
+
+    lines = []
+    recorder.dump(lines.append)
+    frames = [line for line in lines if not line.startswith("#")]
+    dumped_tx = [line.split()[2] for line in frames if line.endswith(" T")]
+    ecu_frames = [frame for frame in sim.bus.log if frame.sender == "ecu"][-len(dumped_tx):]
+    expected_tx = [f"{frame.id:03X}#{bytes(frame.data).hex().upper()}" for frame in ecu_frames]
+    if not dumped_tx or dumped_tx != expected_tx:
+        raise AssertionError(f"dumped TX frames {dumped_tx} do not match the bus {expected_tx}")
+
+    # An unknown heartbeat freezes the buffer after the post-trigger frames
+    sim.bus.publish(keypad, Keypad.HEARTBEAT_ID, [0x42], sim.now_ns())
+    sim.run(seconds=1.0)
+    frozen_at = recorder.next_record
+    sim.run(seconds=1.0)
+    reason = recorder.trigger_reason
+    stayed_frozen = recorder.frozen and recorder.next_record == frozen_at
+
+    data = bytes(3)
+    recorder.rearm()
+    started = time.perf_counter_ns()
+    for _ in range(CALLS):
+        recorder.record_rx(0x126, data)
+    record_ns = (time.perf_counter_ns() - started) / CALLS
+
+    return [
+        ("records held", full, f"of {recorder.RECORDS}"),
+        ("buffer size", len(recorder.buffer), "bytes"),
+        ("dumped lines", len(frames), "frames"),
+        ("trigger reason", reason or "none", ""),
+        ("frozen after trigger", "yes" if stayed_frozen else "no", ""),
+        ("record() cost", record_ns, "ns/frame"),
+    ]
@@ -0,0 +1,119 @@
+# Capture replay: a synthetic candump capture replayed at the captured rate,
+# ten times faster and as fast as possible. Same capture and pace, same trace;
+# across paces the traces differ, since debounce, holds and the gauge filter
+# follow the clock.
+import os
+import tempfile
+
+from sim.bench import benchmark
+from sim.devices import MS, Keypad, TeslaBattery
+from sim.replay import read_asc, read_candump, read_log, replay
+
+CAPTURE_SECONDS = 30
+PRESS_INTERVAL_MS = 1500
+DRIVE_CYCLE = (5, 4, 3, 2, 1, 8, 9, 1)
+# Traffic on the car's bus the firmware does not subscribe to
+OTHER_IDS = (0x118, 0x3E9)
+
+
+def capture_frames(seconds=CAPTURE_SECONDS):
+    # (ts_ns, id, data, extended), as a keypad, a drive inverter and the rest of the car would produce
+    frames = []
+    for index in range(seconds * 2):
+        frames.append((index * 500 * MS, Keypad.HEARTBEAT_ID, bytes([Keypad.OPERATIONAL]), False))
+    battery = TeslaBattery(voltage=lambda ts_ns: 340 + 40 * (ts_ns % (10_000 * MS)) / (10_000 * MS))
+    for index in range(seconds * 100):
+        ts_ns = index * 10 * MS + 3 * MS
+        frames.append((ts_ns, TeslaBattery.BATTERY_ID, battery.payload(ts_ns), False))
+        for id in OTHER_IDS:
+            frames.append((ts_ns + MS, id, bytes(8), False))
+    frames.append((5 * MS, 0x18FEF100, bytes(8), True))
+    for index in range(seconds * 1000 // PRESS_INTERVAL_MS - 1):
+        at_ns = 1000 * MS + index * PRESS_INTERVAL_MS * MS
+        mask = 1 << (DRIVE_CYCLE[index % len(DRIVE_CYCLE)] - 1)
+        frames.append((at_ns, Keypad.BUTTON_EVENT_ID, bytes([mask & 0xFF, mask >> 8, 0, 0, 0, 0, 0, 0]), False))
+        frames.append((at_ns + 80 * MS, Keypad.BUTTON_EVENT_ID, bytes(8), False))
+    frames.sort(key=lambda frame: frame[0])
+    return frames
+
+
+def candump_lines(frames, epoch_s=1_700_000_000):
+    for ts_ns, id, data, extended in frames:
+        stamp = epoch_s * 1_000_000_000 + ts_ns
+        name = f"{id:08X}" if extended else f"{id:03X}"
+        yield f"({stamp // 1_000_000_000}.{stamp % 1_000_000_000 // 1000:06d}) can0 {name}#{data.hex().upper()}\n"
+
+
+def asc_lines(frames):
+    yield "date Fri Oct 16 09:00:00.000 am 2026\n"
+    yield "base hex  timestamps absolute\n"
+    yield "Begin Triggerblock Fri Oct 16 09:00:00.000 am 2026\n"
+    yield "   0.000000 Start of measurement\n"
+    for ts_ns, id, data, extended in frames:
+        name = f"{id:X}x" if extended else f"{id:X}"
+        payload = " ".join(f"{byte:02X}" for byte in data)
+        yield f"   {ts_ns / 1e9:.6f} 1  {name:<15} Rx   d {len(data)} {payload}  Length = 0 BitCount = 0 ID = {id}\n"
+    yield "End TriggerBlock\n"
+
+
+@benchmark("replay")
+def replay_benchmark():
+    frames = capture_frames()
+    parsed = [(frame.ts_ns, frame.id, frame.data, frame.extended) for frame in read_asc(asc_lines(frames))]
+    if parsed != frames:
+        raise AssertionError("ASC capture did not parse back to the frames written")
+
+    capture = tempfile.NamedTemporaryFile("w", suffix=".log", delete=False)
+    try:
+        capture.writelines(candump_lines(frames))
+        capture.close()
+        first = [frame.ts_ns for frame in read_log(capture.name)][0]
+        with open(capture.name) as log_file:
+            parsed = [(frame.ts_ns - first, frame.id, frame.data, frame.extended) for frame in read_candump(log_file)]
+        if parsed != frames:
+            raise AssertionError("candump capture did not parse back to the frames written")
+
+        traces = {}
+        results = {}
+        runs = (
+            ("real-time", 1.0, False),
+            ("real-time again", 1.0, False),
+            ("10x", 10.0, False),
+            ("fast", None, False),
+            ("fast again", None, False),
+            ("dispatch", None, True),
+        )
+        for mode, speed, dispatch in runs:
+            trace = []
+            results[mode] = replay(read_log(capture.name), speed=speed, dispatch=dispatch, write=trace.append)
+            traces[mode] = trace
+    finally:
+        os.unlink(capture.name)
+
+    expected = len(frames) - 1
+    for mode, stats in results.items():
+        if stats.frames != expected or stats.extended != 1:
+            raise AssertionError(f"{mode}: replayed {stats.frames} frames and skipped {stats.extended}, expected {expected} and 1")
+    for mode in ("real-time", "fast"):
+        if traces[f"{mode} again"] != traces[mode]:
+            raise AssertionError(f"{mode}: replaying the same capture twice gave different traces")
+    if results["fast"].lost:
+        raise AssertionError(f"fast replay overran the RX FIFO: {results['fast'].lost} frames lost")
+    presses = sum(1 for _, id, data, _ in frames if id == Keypad.BUTTON_EVENT_ID and any(data))
+    led_frames = sum(1 for line in traces["real-time"] if " tx 215#" in line)
+    if led_frames < presses:
+        raise AssertionError(f"{presses} presses replayed but only {led_frames} LED frames sent")
+
+    real_time = results["real-time"]
+    return [
+        ("frames replayed", real_time.frames, "frames"),
+        ("trace lines (real-time)", len(traces["real-time"]), "lines"),
+        ("frames sent by the firmware", real_time.tx_frames, "frames"),
+        ("real-time frames/sec (host)", real_time.frames_per_host_sec, "frames/s"),
+        ("10x RX frames lost", results["10x"].lost, "frames"),
+        ("10x frames/sec (simulated)", results["10x"].frames_per_sim_sec, "frames/s"),
+        ("fast frames/sec (host)", results["fast"].frames_per_host_sec, "frames/s"),
+        ("fast frames/sec (simulated)", results["fast"].frames_per_sim_sec, "frames/s"),
+        ("dispatch frames/sec (host)", results["dispatch"].frames_per_host_sec, "frames/s"),
+        ("dispatch host time per frame", results["dispatch"].host_us_per_frame, "us"),
+    ]
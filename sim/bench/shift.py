@@ -0,0 +1,71 @@
+# RX/TX flow while a gear pulse is held, including a gear change that
+# overrides a pulse still in progress.
+import board
+
+from sim import Simulation
+from sim.bench import benchmark
+from sim.devices import MS, Keypad, TeslaBattery
+
+DRIVE = 5
+NEUTRAL = 4
+OVERRIDE_AFTER_MS = 200
+
+
+def high_durations_ns(pin):
+    durations = []
+    raised_at = None
+    for ts_ns, value in pin.history:
+        if value:
+            raised_at = ts_ns
+        elif raised_at is not None:
+            durations.append(ts_ns - raised_at)
+            raised_at = None
+    return durations
+
+
+def overlap_ns(pin_a, pin_b):
+    # Total time both pins were driven high together
+    events = sorted([(ts_ns, 0, value) for ts_ns, value in pin_a.history] + [(ts_ns, 1, value) for ts_ns, value in pin_b.history])
+    levels = [False, False]
+    overlap = 0
+    since = None
+    for ts_ns, index, value in events:
+        if since is not None:
+            overlap += ts_ns - since
+            since = None
+        levels[index] = value
+        if levels[0] and levels[1]:
+            since = ts_ns
+    return overlap
+
+
+@benchmark("shift")
+def shift_benchmark():
+    sim = Simulation()
+    keypad = sim.add(Keypad(heartbeat_ms=100))
+    sim.add(TeslaBattery(period_ms=10))
+    sim.boot()
+    sim.run(seconds=1.0)
+
+    start = sim.now_ns()
+    keypad.press(DRIVE, start)
+    keypad.press(NEUTRAL, start + OVERRIDE_AFTER_MS * MS)
+    frames_before = len(sim.bus.log)
+    stats = sim.run(seconds=1.0)
+    window = sim.bus.log[frames_before:]
+
+    tx_frames = sum(1 for frame in window if frame.sender == "ecu")
+    heartbeats = sum(1 for frame in window if frame.id == Keypad.HEARTBEAT_ID)
+    lost = sum(listener.lost for can in sim.bus.controllers for listener in can.listeners)
+    drive_pulses = high_durations_ns(board.D13)
+    neutral_pulses = high_durations_ns(board.D12)
+    return [
+        ("longest tick during shift", stats.max_tick_ns / MS, "ms"),
+        ("RX frames processed", stats.frames, "frames"),
+        ("TX frames sent", tx_frames, "frames"),
+        ("keypad heartbeats on bus", heartbeats, "frames"),
+        ("RX frames lost to FIFO overflow", lost, "frames"),
+        ("drive pin high (overridden)", drive_pulses[0] / MS if drive_pulses else 0.0, "ms"),
+        ("neutral pin high", neutral_pulses[0] / MS if neutral_pulses else 0.0, "ms"),
+        ("drive/neutral pins high together", overlap_ns(board.D13, board.D12) / MS, "ms"),
+    ]
@@ -0,0 +1,113 @@
+# TimerScheduler overhead with N active timers, plus an end-to-end check of
+# the hazard blink period seen on the keypad LEDs.
+import time
+
+from sim import Simulation
+from sim.bench import benchmark, percentile
+from sim.devices import MS, Keypad, TeslaBattery
+from sim.harness import DEVICE_CPU_SCALE
+
+TIMER_COUNTS = (0, 1, 4, 16)
+UPDATE_CALLS = 20_000
+HAZARD = 1
+HAZARD_LED = 0
+BLINK_TOLERANCE_MS = 50
+# Fixed loop time for the blink run on a Simulation(cpu_scale=0): a host
+# stall times cpu_scale would otherwise show up as a late toggle
+TICK_NS = 1_000_000
+
+
+def idle_update_ns(firmware, count):
+    # N timers armed far in the future: the per-tick cost when nothing is due
+    scheduler = firmware.TimerScheduler()
+    for _ in range(count):
+        scheduler.periodic(lambda now: None, 3_600 * 1_000_000_000)
+    now = firmware.time.monotonic_ns()
+    started = time.perf_counter_ns()
+    for _ in range(UPDATE_CALLS):
+        scheduler.update(now)
+    return (time.perf_counter_ns() - started) / UPDATE_CALLS
+
+
+def due_update_ns(firmware, count):
+    # N periodic timers that are all due on every call
+    scheduler = firmware.TimerScheduler()
+    for _ in range(count):
+        scheduler.periodic(lambda now: None, 1)
+    started = time.perf_counter_ns()
+    for _ in range(UPDATE_CALLS):
+        firmware.time.sleep(0.000001)
+        scheduler.update(firmware.time.monotonic_ns())
+    elapsed = time.perf_counter_ns() - started
+    if scheduler.fired < UPDATE_CALLS * count:
+        raise AssertionError(f"{count} due timers fired {scheduler.fired} times in {UPDATE_CALLS} updates")
+    return elapsed / UPDATE_CALLS
+
+
+def check_cancel(firmware):
+    scheduler = firmware.TimerScheduler()
+    fired = []
+    handles = [scheduler.schedule(lambda now, n=n: fired.append(n), n) for n in range(8)]
+    for handle in handles[::2]:
+        scheduler.cancel(handle)
+    # Stale handles must not cancel whatever reuses the slot
+    reused = scheduler.schedule(lambda now: fired.append("reused"), 0)
+    if scheduler.cancel(handles[0]) or not scheduler.is_active(reused):
+        raise AssertionError("stale timer handle cancelled a reused slot")
+    firmware.time.sleep(0.001)
+    scheduler.update(firmware.time.monotonic_ns())
+    if sorted(fired, key=str) != sorted([1, 3, 5, 7, "reused"], key=str):
+        raise AssertionError(f"unexpected timers fired: {fired}")
+
+
+def hazard_toggles_ns(keypad, since_ns):
+    toggles = []
+    lit = None
+    for ts_ns, data in keypad.led_frames:
+        if ts_ns < since_ns:
+            continue
+        red, green, _ = keypad.led_colors(data)[HAZARD_LED]
+        state = bool(red and green)
+        if state != lit:
+            if lit is not None:
+                toggles.append(ts_ns)
+            lit = state
+    return toggles
+
+
+@benchmark("timers")
+def timers_benchmark():
+    # Microbenchmarks get their own firmware instance: the simulated clock keeps
+    # running with host time, which would delay the keypad run below
+    firmware = Simulation().firmware
+    check_cancel(firmware)
+
+    rows = []
+    for count in TIMER_COUNTS:
+        rows.append((f"update, {count} idle timers (host)", idle_update_ns(firmware, count), "ns"))
+    for count in TIMER_COUNTS[1:]:
+        host_ns = due_update_ns(firmware, count)
+        rows.append((f"update, {count} due timers (host)", host_ns, "ns"))
+        rows.append((f"update, {count} due timers (device est.)", host_ns * DEVICE_CPU_SCALE / 1000, "us"))
+
+    sim = Simulation(cpu_scale=0)
+    keypad = sim.add(Keypad(heartbeat_ms=100))
+    sim.add(TeslaBattery(period_ms=10))
+    sim.boot()
+    sim.run(seconds=1.0, tick_ns=TICK_NS)
+    pressed_at = sim.now_ns()
+    keypad.press(HAZARD, pressed_at)
+    sim.run(seconds=6.0, tick_ns=TICK_NS)
+
+    toggles = hazard_toggles_ns(keypad, pressed_at)
+    periods_ms = [(later - earlier) / MS for earlier, later in zip(toggles, toggles[1:])]
+    if len(periods_ms) < 4:
+        raise AssertionError(f"hazard LED toggled only {len(toggles)} times in 6 s")
+    worst = max(abs(period - 1000) for period in periods_ms)
+    if worst > BLINK_TOLERANCE_MS:
+        raise AssertionError(f"hazard blink period off by {worst:.1f} ms: {periods_ms}")
+
+    rows.append(("hazard blink half-periods", len(periods_ms), ""))
+    rows.append(("hazard blink half-period p50", percentile(periods_ms, 50), "ms"))
+    rows.append(("hazard blink worst error", worst, "ms"))
+    return rows
@@ -0,0 +1,68 @@
+# Repeated and cyclic transmit jobs: spacing on the wire, a newer gear command
+# superseding the old one's repeats, and cancellation of a cyclic job.
+from sim import Simulation
+from sim.bench import benchmark, percentile
+from sim.devices import MS, Keypad, TeslaBattery
+
+SUPERSEDE_AFTER_MS = 30
+CYCLIC_ID = 0x698
+CYCLIC_MS = 100
+SPACING_TOLERANCE_MS = 5
+# Fixed loop time on a Simulation(cpu_scale=0), so a host stall cannot make
+# a repeat late
+TICK_NS = 1_000_000
+
+
+@benchmark("txsched")
+def txsched_benchmark():
+    sim = Simulation(cpu_scale=0)
+    sim.add(Keypad(heartbeat_ms=100))
+    sim.add(TeslaBattery(period_ms=10))
+    sim.boot()
+    sim.run(seconds=1.0, tick_ns=TICK_NS)
+    firmware = sim.firmware
+    ecu = sim.app.ecu
+    shift_id = firmware.ECU.DRIVE_SHIFT_ID
+
+    started = sim.now_ns()
+    ecu.can_drive_state_command(firmware.ECUState.DRIVE)
+    sim.run(seconds=SUPERSEDE_AFTER_MS / 1000, tick_ns=TICK_NS)
+    superseded_at = sim.now_ns()
+    ecu.can_drive_state_command(firmware.ECUState.NEUTRAL)
+    sim.run(seconds=0.5, tick_ns=TICK_NS)
+
+    frames = [frame for frame in sim.bus.frames(shift_id, "ecu") if frame.ts_ns >= started]
+    drive = [frame for frame in frames if frame.data[0] == 0x0D]
+    neutral = [frame for frame in frames if frame.data[0] == 0x0E]
+    if len(neutral) != firmware.ECU.DRIVE_SHIFT_REPEATS:
+        raise AssertionError(f"{len(neutral)} neutral frames, expected {firmware.ECU.DRIVE_SHIFT_REPEATS}")
+    if any(frame.ts_ns > neutral[0].ts_ns for frame in drive):
+        raise AssertionError("drive repeats sent after the neutral command superseded them")
+    spacing_ms = [(later.ts_ns - earlier.ts_ns) / MS for earlier, later in zip(neutral, neutral[1:])]
+    interval_ms = firmware.ECU.DRIVE_SHIFT_INTERVAL_NS / MS
+    worst = max(abs(spacing - interval_ms) for spacing in spacing_ms)
+    if worst > SPACING_TOLERANCE_MS:
+        raise AssertionError(f"repeat spacing off by {worst:.1f} ms: {spacing_ms}")
+
+    scheduler = firmware.CanTxScheduler.get_instance()
+    cyclic_from = sim.now_ns()
+    scheduler.cyclic(CYCLIC_ID, [0x01], CYCLIC_MS * MS, firmware.CanPriority.LED)
+    sim.run(seconds=1.0, tick_ns=TICK_NS)
+    scheduler.cancel(CYCLIC_ID)
+    cancelled_at = sim.now_ns()
+    sim.run(seconds=0.5, tick_ns=TICK_NS)
+    cyclic = [frame for frame in sim.bus.frames(CYCLIC_ID, "ecu") if frame.ts_ns >= cyclic_from]
+    after_cancel = [frame for frame in cyclic if frame.ts_ns > cancelled_at]
+    if after_cancel or not 10 <= len(cyclic) <= 11:
+        raise AssertionError(f"{len(cyclic)} cyclic frames in 1 s, {len(after_cancel)} after cancel")
+    cyclic_ms = [(later.ts_ns - earlier.ts_ns) / MS for earlier, later in zip(cyclic, cyclic[1:])]
+
+    return [
+        ("drive frames before superseded", len(drive), "frames"),
+        ("supersede to first neutral frame", (neutral[0].ts_ns - superseded_at) / MS, "ms"),
+        ("neutral repeat spacing p50", percentile(spacing_ms, 50), "ms"),
+        ("neutral repeat spacing worst error", worst, "ms"),
+        ("cyclic frames in 1 s", len(cyclic), "frames"),
+        ("cyclic period p50", percentile(cyclic_ms, 50), "ms"),
+        ("cyclic period p99", percentile(cyclic_ms, 99), "ms"),
+    ]
@@ -0,0 +1,129 @@
+# Warm boot: the Feather resets with the car on (a brown-out) while the keypad
+# stays up. With the state in NVM the first LED frame already shows the gear and
+# functions from before the reset; from blank NVM it shows the defaults.
+import os
+import tempfile
+
+from sim import Simulation
+from sim.bench import benchmark
+from sim.devices import MS, Keypad, TeslaBattery
+
+# Physical keypad buttons
+HAZARD = 1
+DRIVE = 5
+EXHAUST = 7
+F2 = 9
+SESSION_PRESSES = (DRIVE, F2, EXHAUST)
+# Longer than the indicator flash plus the write holdoff, so every press is saved
+PRESS_INTERVAL_MS = 1200
+TOGGLES = 96
+TOGGLE_INTERVAL_MS = 700
+
+
+def running_keypad():
+    # Already started by the Feather before it reset, so no boot-up heartbeat
+    keypad = Keypad(boot_at_ns=None)
+    keypad.state = Keypad.OPERATIONAL
+    keypad.next_heartbeat_ns = 0
+    return keypad
+
+
+def drive(nvm_path, presses, parking_brake_engaged=True, seconds=2.0, interval_ms=PRESS_INTERVAL_MS):
+    sim = Simulation(nvm_path=nvm_path, parking_brake_engaged=parking_brake_engaged)
+    keypad = sim.add(Keypad())
+    sim.add(TeslaBattery())
+    sim.boot()
+    sim.run(seconds=1.0)
+    start = sim.now_ns()
+    for index, button in enumerate(presses):
+        keypad.press(button, start + index * interval_ms * MS)
+    sim.run(seconds=len(presses) * interval_ms / 1000 + seconds)
+    return sim, keypad
+
+
+def reset(nvm_path, parking_brake_engaged=False):
+    # Returns the simulation, the keypad and how long boot() took
+    sim = Simulation(nvm_path=nvm_path, parking_brake_engaged=parking_brake_engaged)
+    keypad = sim.add(running_keypad())
+    sim.add(TeslaBattery())
+    sim.boot()
+    boot_ns = sim.now_ns()
+    sim.run(seconds=1.0)
+    return sim, keypad, boot_ns
+
+
+def first_frame_ms(keypad):
+    return keypad.led_frames[0][0] / 1e6 if keypad.led_frames else float("nan")
+
+
+@benchmark("warmboot")
+def warmboot_benchmark():
+    nvm_file = tempfile.NamedTemporaryFile(suffix=".nvm", delete=False)
+    nvm_file.close()
+    os.unlink(nvm_file.name)
+    try:
+        sim, keypad = drive(nvm_file.name, SESSION_PRESSES)
+        ecu = sim.app.ecu
+        before = (ecu.drive_state, ecu.f1, ecu.f2, ecu.regen_state, ecu.exhaust_sound)
+        colors = keypad.led_frames[-1][1]
+        session_writes = sim.nvm.writes
+        store = sim.firmware.NvmStateStore
+        write_ms = sim.app.state_store.write_max_ns / 1e6
+        if session_writes > len(SESSION_PRESSES):
+            raise AssertionError(f"{session_writes} NVM writes for {len(SESSION_PRESSES)} presses")
+
+        warm, warm_keypad, warm_boot_ns = reset(nvm_file.name)
+        ecu = warm.app.ecu
+        after = (ecu.drive_state, ecu.f1, ecu.f2, ecu.regen_state, ecu.exhaust_sound)
+        if not warm.app.restored or after != before:
+            raise AssertionError(f"state after reset {after}, before {before}")
+        if len(warm_keypad.led_frames) != 1 or warm_keypad.led_frames[0][1] != colors:
+            raise AssertionError(f"warm boot sent {warm_keypad.led_frames}, expected one frame of {colors.hex()}")
+        if warm.nvm.writes:
+            raise AssertionError(f"restoring wrote NVM {warm.nvm.writes} times")
+
+        cold, cold_keypad, cold_boot_ns = reset(None)
+        cold_matches = bool(cold_keypad.led_frames) and cold_keypad.led_frames[-1][1] == colors
+
+        # Torn write: the newest record fails its CRC, the one before it is restored
+        newest = warm.app.state_store
+        with open(nvm_file.name, "r+b") as torn:
+            torn.seek(newest.slot * store.RECORD_SIZE + 5)
+            torn.write(b"\x00\x00")
+        torn_sim, _, _ = reset(nvm_file.name)
+        torn_store = torn_sim.app.state_store
+        if not torn_sim.app.restored or torn_store.sequence != (newest.sequence - 1) % store.SEQUENCE_MODULO:
+            raise AssertionError(f"torn record not skipped: restored sequence {torn_store.sequence} of {newest.sequence}")
+
+        # The brake was set while the Feather was off: a saved DRIVE must not come back
+        braked, _, _ = reset(nvm_file.name, parking_brake_engaged=True)
+        if braked.app.restored or braked.app.ecu.drive_state != braked.firmware.ECUState.PARK:
+            raise AssertionError("saved DRIVE restored with the parking brake engaged")
+
+        # Hazard blinking changes no stored color, so it is never written
+        blink, _ = drive(nvm_file.name, (HAZARD,), parking_brake_engaged=False, seconds=5.0)
+        if blink.nvm.writes:
+            raise AssertionError(f"hazard blinking wrote NVM {blink.nvm.writes} times")
+
+        # Many saved changes spread evenly over the slots
+        wear, _ = drive(nvm_file.name, (EXHAUST,) * TOGGLES, parking_brake_engaged=False, interval_ms=TOGGLE_INTERVAL_MS)
+        slot_writes = [wear.nvm.wear[slot * store.RECORD_SIZE] for slot in range(store.SLOTS)]
+        if max(slot_writes) - min(slot_writes) > 1:
+            raise AssertionError(f"uneven slot wear {slot_writes}")
+    finally:
+        if os.path.exists(nvm_file.name):
+            os.unlink(nvm_file.name)
+
+    return [
+        ("NVM writes for the session", session_writes, f"for {len(SESSION_PRESSES)} presses"),
+        ("NVM write, longest", write_ms, "ms"),
+        ("warm: boot() (device est.)", warm_boot_ns / 1e6, "ms"),
+        ("cold: boot() (device est.)", cold_boot_ns / 1e6, "ms"),
+        ("warm: boot to first LED frame", first_frame_ms(warm_keypad), "ms"),
+        ("cold: boot to first LED frame", first_frame_ms(cold_keypad), "ms"),
+        ("warm: LED frames in first second", len(warm_keypad.led_frames), "frames"),
+        ("cold: LED frames in first second", len(cold_keypad.led_frames), "frames"),
+        ("cold: LEDs show pre-reset state", "yes" if cold_matches else "no", ""),
+        ("writes for exhaust toggles", wear.nvm.writes, f"for {TOGGLES} presses"),
+        ("slot writes min/max", f"{min(slot_writes)}/{max(slot_writes)}", f"over {store.SLOTS} slots"),
+    ]
@@ -0,0 +1,48 @@
+# Keypad power blips: time from the keypad coming back to its LEDs showing the
+# pre-blip state again, and NMT start traffic while it is gone.
+from sim import Simulation
+from sim.bench import benchmark
+from sim.devices import MS, Keypad, TeslaBattery
+
+DRIVE = 5
+SETTLE_S = 3.0
+# (label, off_ms, boot-up heartbeat seen)
+BLIPS = (
+    ("200 ms blip", 200, True),
+    ("200 ms blip, boot-up lost", 200, False),
+    ("5 s outage, boot-up lost", 5000, False),
+)
+
+
+def nmt_starts(sim, since_ns, until_ns):
+    return sum(1 for frame in sim.bus.frames(0x000, "ecu") if since_ns <= frame.ts_ns < until_ns)
+
+
+@benchmark("watchdog")
+def watchdog_benchmark():
+    sim = Simulation()
+    keypad = sim.add(Keypad(heartbeat_ms=100))
+    sim.add(TeslaBattery(period_ms=10))
+    sim.boot()
+    sim.run(seconds=1.0)
+    keypad.press(DRIVE, sim.now_ns())
+    sim.run(seconds=1.0)
+    expected = bytes(keypad.led_frames[-1][1])
+
+    rows = []
+    for label, off_ms, announce in BLIPS:
+        off_at = sim.now_ns()
+        keypad.power_cycle(off_at, off_ms, announce)
+        sim.run(seconds=off_ms / 1000 + SETTLE_S)
+        on_at = keypad.boots[-1]
+        restored = [(ts_ns, bytes(data)) for ts_ns, data in keypad.led_frames if ts_ns >= on_at]
+        if not restored or restored[0][1] != expected:
+            raise AssertionError(f"{label}: LEDs not restored, got {restored[:1]} expected {expected.hex()}")
+        if len(restored) != 1:
+            raise AssertionError(f"{label}: {len(restored)} LED frames after recovery, expected one")
+        rows.append((f"{label}: recovery", (restored[0][0] - on_at) / MS, "ms"))
+        rows.append((f"{label}: NMT starts while off", nmt_starts(sim, off_at, on_at), "frames"))
+
+    watchdog = sim.app.pad_watchdog
+    rows.append(("heartbeat losses detected", watchdog.losses, ""))
+    return rows
@@ -0,0 +1,35 @@
+import time
+
+
+class SimClock:
+    # Hybrid clock: host time spent computing, multiplied by cpu_scale, plus any
+    # time the firmware would have spent waiting (time.sleep, receive timeouts).
+    # Waits are skipped instantly so a long simulated run finishes in a fraction
+    # of wall time.
+
+    def __init__(self, cpu_scale=1.0):
+        self.cpu_scale = cpu_scale
+        self.reset()
+
+    def reset(self):
+        self.origin_ns = time.perf_counter_ns()
+        self.skipped_ns = 0
+
+    def monotonic_ns(self):
+        return int((time.perf_counter_ns() - self.origin_ns) * self.cpu_scale) + self.skipped_ns
+
+    def monotonic(self):
+        return self.monotonic_ns() / 1_000_000_000
+
+    def sleep(self, seconds):
+        self.skipped_ns += int(seconds * 1_000_000_000)
+
+    def advance_to(self, deadline_ns):
+        now = self.monotonic_ns()
+        if deadline_ns > now:
+            self.skipped_ns += deadline_ns - now
+
+    def exclude(self, host_ns):
+        # Host time the simulator spent on its own bookkeeping (file I/O and
+        # such) inside a firmware call; the device would not have spent it
+        self.skipped_ns -= int(host_ns * self.cpu_scale)
@@ -0,0 +1,189 @@
+# Scripted bus participants: a Blink Marine PKP-2600 keypad and the Tesla drive
+# inverter's DI_hvBusStatus publisher.
+
+MS = 1_000_000
+
+
+class Device:
+    name = "device"
+    bus = None
+
+    def poll(self, now_ns):
+        pass
+
+    def next_event_ns(self):
+        return None
+
+    def on_frame(self, frame):
+        pass
+
+
+class Keypad(Device):
+    # CANopen node 0x15: heartbeat 0x715, TPDO1 (buttons) 0x195, RPDO1 (LEDs) 0x215
+    name = "keypad"
+    NODE_ID = 0x15
+    HEARTBEAT_ID = 0x700 + NODE_ID
+    BUTTON_EVENT_ID = 0x180 + NODE_ID
+    LED_ID = 0x200 + NODE_ID
+
+    BOOT_UP = 0x00
+    PRE_OPERATIONAL = 0x7F
+    OPERATIONAL = 0x05
+
+    NMT_START = 0x01
+    NMT_RESET = 0x81
+
+    def __init__(self, heartbeat_ms=500, boot_at_ns=0, repeat_ms=0):
+        self.heartbeat_ns = heartbeat_ms * MS
+        # TPDO event timer: resend the current button state every repeat_ms
+        self.repeat_ns = repeat_ms * MS
+        self.next_repeat_ns = None
+        self.state = None
+        self.boot_at_ns = boot_at_ns
+        self.next_heartbeat_ns = None
+        self.mask = 0
+        # (ts_ns, mask) button state changes, kept sorted by time
+        self.script = []
+        # (ts_ns, powered, announce) supply changes, kept sorted by time
+        self.power_script = []
+        self.presses = []
+        self.boots = []
+        self.led_frames = []
+
+    def button_bit(self, button):
+        # Physical buttons are numbered 1-12; button n is bit n-1 of the payload
+        return 1 << (button - 1)
+
+    def set_mask(self, at_ns, mask):
+        self.script.append((at_ns, mask))
+        self.script.sort(key=lambda event: event[0])
+
+    def press(self, button, at_ns, hold_ms=50):
+        bit = self.button_bit(button)
+        self.set_mask(at_ns, bit)
+        self.set_mask(at_ns + hold_ms * MS, 0)
+
+    def power_cycle(self, at_ns, off_ms, announce=True):
+        # Supply blip: silent for off_ms, then boots again with its LEDs dark.
+        # announce=False models a boot-up heartbeat that never reached the ECU.
+        self.power_script.append((at_ns, False, announce))
+        self.power_script.append((at_ns + off_ms * MS, True, announce))
+        self.power_script.sort(key=lambda event: event[0])
+
+    def next_event_ns(self):
+        events = [event for event in (self.boot_at_ns, self.next_heartbeat_ns, self.next_repeat_ns) if event is not None]
+        if self.script:
+            events.append(self.script[0][0])
+        if self.power_script:
+            events.append(self.power_script[0][0])
+        return min(events) if events else None
+
+    def poll(self, now_ns):
+        while True:
+            event = self.next_event_ns()
+            if event is None or event > now_ns:
+                return
+            if self.boot_at_ns is not None and event == self.boot_at_ns:
+                self.boot(event)
+            elif self.next_heartbeat_ns is not None and event == self.next_heartbeat_ns:
+                self.bus.publish(self, self.HEARTBEAT_ID, [self.state], event)
+                self.next_heartbeat_ns += self.heartbeat_ns
+            elif self.next_repeat_ns is not None and event == self.next_repeat_ns:
+                self.next_repeat_ns += self.repeat_ns
+                self.send_buttons(event, self.mask)
+            elif self.power_script and event == self.power_script[0][0]:
+                at_ns, powered, announce = self.power_script.pop(0)
+                if powered:
+                    self.boot(at_ns, announce)
+                else:
+                    self.state = None
+                    self.next_heartbeat_ns = None
+                    self.next_repeat_ns = None
+            else:
+                at_ns, mask = self.script.pop(0)
+                self.send_buttons(at_ns, mask)
+
+    def boot(self, at_ns, announce=True):
+        self.boot_at_ns = None
+        self.state = self.PRE_OPERATIONAL
+        self.boots.append(at_ns)
+        if announce:
+            self.bus.publish(self, self.HEARTBEAT_ID, [self.BOOT_UP], at_ns)
+        self.next_heartbeat_ns = at_ns + self.heartbeat_ns
+
+    def send_buttons(self, at_ns, mask):
+        if self.state != self.OPERATIONAL:
+            self.mask = mask
+            return
+        if mask & ~self.mask:
+            self.presses.append(at_ns)
+        self.mask = mask
+        self.bus.publish(self, self.BUTTON_EVENT_ID, [mask & 0xFF, mask >> 8, 0, 0, 0, 0, 0, 0], at_ns)
+
+    def on_frame(self, frame):
+        if self.state is None:
+            return
+        if frame.id == 0x000 and frame.data:
+            target = frame.data[1] if len(frame.data) > 1 else 0
+            if target not in (0, self.NODE_ID):
+                return
+            if frame.data[0] == self.NMT_START:
+                self.state = self.OPERATIONAL
+                if self.repeat_ns and self.next_repeat_ns is None:
+                    self.next_repeat_ns = frame.ts_ns + self.repeat_ns
+            elif frame.data[0] == self.NMT_RESET:
+                self.boot(frame.ts_ns)
+        elif frame.id == self.LED_ID and self.state == self.OPERATIONAL:
+            # RPDOs only take effect once the node has been started
+            self.led_frames.append((frame.ts_ns, frame.data))
+
+    def led_colors(self, data=None):
+        # Decode a 0x215 payload into (red, green, blue) per physical button 1-12
+        if data is None:
+            data = self.led_frames[-1][1] if self.led_frames else bytes(5)
+        bits = int.from_bytes(data[:5], "little")
+        return [((bits >> n) & 1, (bits >> (12 + n)) & 1, (bits >> (24 + n)) & 1) for n in range(12)]
+
+    def press_latencies_ns(self):
+        # Time from each press to the first LED frame sent before the next press.
+        # Colors are flushed once per tick, so later frames are timed blinks.
+        latencies = []
+        for index, pressed_at in enumerate(self.presses):
+            until = self.presses[index + 1] if index + 1 < len(self.presses) else None
+            for ts_ns, _ in self.led_frames:
+                if ts_ns < pressed_at:
+                    continue
+                if until is None or ts_ns < until:
+                    latencies.append(ts_ns - pressed_at)
+                break
+        return latencies
+
+
+class TeslaBattery(Device):
+    # BO_ 294 DI_hvBusStatus: 3 VEH
+    #       SG_ DI_voltage : 0|10@1+ (0.5,0) [0|500] "V" X
+    #       SG_ DI_current : 10|11@1+ (1,0) [0|2047] "A" X
+    name = "tesla"
+    BATTERY_ID = 0x126
+
+    def __init__(self, period_ms=10, voltage=360.0, current=0, start_ns=0):
+        self.period_ns = int(period_ms * MS)
+        # voltage may be a constant or a callable of the frame timestamp in ns
+        self.voltage = voltage
+        self.current = current
+        self.next_frame_ns = start_ns
+        self.sent = 0
+
+    def next_event_ns(self):
+        return self.next_frame_ns
+
+    def payload(self, at_ns):
+        voltage = self.voltage(at_ns) if callable(self.voltage) else self.voltage
+        raw = (int(voltage / 0.5) & 0x3FF) | ((int(self.current) & 0x7FF) << 10)
+        return raw.to_bytes(3, "little")
+
+    def poll(self, now_ns):
+        while self.next_frame_ns <= now_ns:
+            self.bus.publish(self, self.BATTERY_ID, self.payload(self.next_frame_ns), self.next_frame_ns)
+            self.sent += 1
+            self.next_frame_ns += self.period_ns
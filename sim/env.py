@@ -0,0 +1,5 @@
+# The simulation the stubs are currently wired to. Set by Simulation.
+clock = None
+bus = None
+# Every adafruit_motor.servo.Servo the firmware created, for output traces
+servos = []
@@ -0,0 +1,161 @@
+import importlib
+import importlib.util
+import os
+import pkgutil
+import sys
+import time
+import types
+
+import board
+import microcontroller
+import usb_cdc
+
+from sim import env
+from sim.clock import SimClock
+from sim.heap import DeviceHeap
+from sim.vbus import VirtualBus
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+# The firmware package; code.py is only the entry point that imports it
+FIRMWARE_PACKAGE = "canpad"
+FIRMWARE_PATH = os.path.join(REPO_ROOT, "lib", FIRMWARE_PACKAGE)
+ENTRY_PATH = os.path.join(REPO_ROOT, "code.py")
+# Rough slowdown of CircuitPython on the 120 MHz SAMD51 versus CPython on a
+# desktop. Only scales simulated time; "host time" figures are unaffected.
+DEVICE_CPU_SCALE = 40
+
+
+def load_firmware(path=FIRMWARE_PATH, clock=None):
+    # A fresh copy of the package at path for every Simulation, so singletons and
+    # patched class attributes start over. Every module is imported up front,
+    # the ones the firmware imports lazily too, so `time` and `gc` can be pointed
+    # at the simulation clock in each. Returns one namespace with the public
+    # names of all of them (firmware.Pad, firmware.Logger, ...), the modules
+    # themselves (firmware.app) and firmware.modules for install_firmware.
+    for name in [name for name in sys.modules if name == FIRMWARE_PACKAGE or name.startswith(FIRMWARE_PACKAGE + ".")]:
+        del sys.modules[name]
+    spec = importlib.util.spec_from_file_location(
+        FIRMWARE_PACKAGE, os.path.join(path, "__init__.py"), submodule_search_locations=[path])
+    package = importlib.util.module_from_spec(spec)
+    sys.modules[FIRMWARE_PACKAGE] = package
+    spec.loader.exec_module(package)
+    modules = {FIRMWARE_PACKAGE: package}
+    for info in sorted(pkgutil.iter_modules([path]), key=lambda info: info.name):
+        name = f"{FIRMWARE_PACKAGE}.{info.name}"
+        modules[name] = importlib.import_module(name)
+
+    firmware = types.ModuleType("firmware")
+    for module in modules.values():
+        for name, value in vars(module).items():
+            if not name.startswith("_"):
+                setattr(firmware, name, value)
+    firmware.modules = modules
+    if clock is not None:
+        heap = DeviceHeap(clock)
+        for module in modules.values():
+            if hasattr(module, "time"):
+                module.time = clock
+            if hasattr(module, "gc"):
+                module.gc = heap
+        firmware.time = clock
+        firmware.gc = heap
+    return firmware
+
+
+def install_firmware(firmware):
+    # Lazy imports inside the firmware go through sys.modules; point them at
+    # this copy in case another Simulation loaded its own since
+    sys.modules.update(firmware.modules)
+
+
+def reset_board():
+    for pin in vars(board).values():
+        if isinstance(pin, board.Pin):
+            pin.value = False
+            pin.history = []
+
+
+class RunStats:
+    def __init__(self, ticks, sim_ns, host_ns, frames, max_tick_ns):
+        self.ticks = ticks
+        self.sim_ns = sim_ns
+        self.host_ns = host_ns
+        self.frames = frames
+        self.max_tick_ns = max_tick_ns
+
+    @property
+    def ticks_per_sec(self):
+        return self.ticks * 1e9 / self.sim_ns if self.sim_ns else 0.0
+
+    @property
+    def frames_per_sec(self):
+        return self.frames * 1e9 / self.sim_ns if self.sim_ns else 0.0
+
+    @property
+    def host_us_per_tick(self):
+        return self.host_ns / self.ticks / 1000 if self.ticks else 0.0
+
+
+class Simulation:
+    def __init__(self, firmware_path=FIRMWARE_PATH, baudrate=500_000, parking_brake_engaged=True, cpu_scale=DEVICE_CPU_SCALE, nvm_path=None):
+        self.clock = SimClock(cpu_scale)
+        self.bus = VirtualBus(self.clock, baudrate)
+        env.clock = self.clock
+        env.bus = self.bus
+        env.servos = []
+        # The USB serial console; type into it with self.serial.type("stats\r")
+        self.serial = usb_cdc.console = usb_cdc.Serial()
+        # Blank flash unless nvm_path names a file an earlier Simulation wrote;
+        # that is how a bench models a reset
+        self.nvm = microcontroller.nvm = microcontroller.Nvm(nvm_path)
+        reset_board()
+        # Parking brake position sensors (engaged on D10, disengaged on D9)
+        board.D10.value = parking_brake_engaged
+        board.D9.value = not parking_brake_engaged
+        self.firmware = load_firmware(firmware_path, self.clock)
+        # Production log level, as boot() sets it, for code exercised before boot
+        self.firmware.Logger.current_level = self.firmware.Logger.WARNING
+        # Host import time says nothing about the device; start the clock at zero
+        self.clock.reset()
+        self.app = None
+
+    def add(self, device):
+        return self.bus.add(device)
+
+    def now_ns(self):
+        return self.clock.monotonic_ns()
+
+    def boot(self, log_level=None):
+        install_firmware(self.firmware)
+        self.app = self.firmware.boot()
+        if log_level is not None:
+            self.firmware.Logger.current_level = log_level
+        return self.app
+
+    def frames_received(self):
+        return sum(listener.received for can in self.bus.controllers for listener in can.listeners)
+
+    def run(self, seconds=None, ticks=None, tick_ns=None):
+        # Drive Application.tick() until the simulated time or tick budget is spent.
+        # With tick_ns every tick also advances the clock by that much; on a
+        # Simulation(cpu_scale=0) that makes runs independent of the host.
+        app = self.app
+        frames_before = self.frames_received()
+        sim_start = self.now_ns()
+        # From sim_start, so a short run still gets its ticks however long the above took
+        deadline = None if seconds is None else sim_start + int(seconds * 1e9)
+        host_start = time.perf_counter_ns()
+        count = 0
+        max_tick_ns = 0
+        now = sim_start
+        while (ticks is None or count < ticks) and (deadline is None or now < deadline):
+            app.tick()
+            count += 1
+            if tick_ns:
+                self.clock.advance_to(now + tick_ns)
+            tick_end = self.now_ns()
+            if tick_end - now > max_tick_ns:
+                max_tick_ns = tick_end - now
+            now = tick_end
+        host_ns = time.perf_counter_ns() - host_start
+        return RunStats(count, now - sim_start, host_ns, self.frames_received() - frames_before, max_tick_ns)
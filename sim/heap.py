@@ -0,0 +1,28 @@
+# Stand-in for CircuitPython's gc module inside the simulated firmware. A host
+# collection says nothing about the device, so collect() only charges a rough
+# device pause to the simulated clock. There is no mem_free(): as on CPython,
+# the firmware's heap instrumentation reports None, and sim/bench/heap.py
+# measures allocations with tracemalloc instead.
+
+
+class DeviceHeap:
+    # Rough full collection of the SAMD51's heap with the firmware loaded
+    COLLECT_NS = 2_000_000
+
+    def __init__(self, clock):
+        self.clock = clock
+        self.collections = 0
+        self.enabled = True
+
+    def collect(self):
+        self.collections += 1
+        self.clock.sleep(self.COLLECT_NS / 1_000_000_000)
+
+    def enable(self):
+        self.enabled = True
+
+    def disable(self):
+        self.enabled = False
+
+    def isenabled(self):
+        return self.enabled
@@ -0,0 +1,359 @@
+# Replays captured CAN traffic (candump or Vector ASC logs) through the firmware
+# and traces what it did: every frame it sent, every pin change and servo angle.
+#
+#   python -m sim.replay capture.log                  at the captured rate
+#   python -m sim.replay capture.asc --speed 10       ten times the captured rate
+#   python -m sim.replay capture.log --fast -o a.trace
+#
+# Trace lines are keyed on how many log frames had been replayed when the output
+# happened, not on time, and by default every tick advances the clock by a fixed
+# step instead of host time; two revisions replaying the same capture can be
+# diffed line by line.
+import argparse
+import re
+import sys
+import time
+
+import board
+import canio
+
+from sim import env
+from sim.devices import Device
+from sim.harness import DEVICE_CPU_SCALE, FIRMWARE_PATH, Simulation
+from sim.vbus import Frame
+
+# Roughly what a quiet tick costs on the Feather (see the loop benchmark)
+DEFAULT_TICK_NS = 300_000
+# Keep ticking this long after the last frame so its effects make the trace
+SETTLE_NS = 100_000_000
+# Bus log entries gathered before they are turned into trace lines
+HARVEST_FRAMES = 1024
+
+# (1436509052.249713) can0 126#2A366C   candump -l/-L, and CanFlightRecorder.dump
+# with its trailing T/R direction
+CANDUMP_LOG = re.compile(r"^\((\d+\.\d+)\)\s+\S+\s+([0-9A-Fa-f]{3}|[0-9A-Fa-f]{8})#(R?)([0-9A-Fa-f]*)(?:\s+[TR])?$")
+# (1436509052.249713)  can0  126   [3]  2A 36 6C   candump -ta / -tz; the timestamp is optional
+CANDUMP_TEXT = re.compile(r"^(?:\((\d+\.\d+)\)\s+)?\S+\s+([0-9A-Fa-f]{3}|[0-9A-Fa-f]{8})\s+\[(\d)\]\s+(.*)$")
+#    12.015991 1  126             Rx   d 3 2A 36 6C
+ASC_FRAME = re.compile(r"^(\d+\.\d+)\s+\d+\s+([0-9A-Fa-f]+)(x?)\s+(?:Rx|Tx)\s+d\s+(\d+)\s*(.*)$")
+ASC_BASE = re.compile(r"^base\s+(hex|dec)\s+timestamps\s+(absolute|relative)")
+
+
+class LogFrame:
+    __slots__ = ("ts_ns", "id", "data", "extended")
+
+    def __init__(self, ts_ns, id, data, extended=False):
+        self.ts_ns = ts_ns
+        self.id = id
+        self.data = data
+        self.extended = extended
+
+    def __repr__(self):
+        return f"LogFrame({self.ts_ns}, 0x{self.id:03x}, {self.data.hex()})"
+
+
+def seconds_to_ns(text):
+    whole, _, fraction = text.partition(".")
+    return int(whole) * 1_000_000_000 + int((fraction + "000000000")[:9])
+
+
+def read_candump(lines):
+    # Remote requests and CAN FD frames are skipped. Lines without a timestamp
+    # (plain `candump can0`) reuse the previous one, so they replay as a burst.
+    ts_ns = 0
+    for line in lines:
+        line = line.strip()
+        match = CANDUMP_LOG.match(line)
+        if match:
+            stamp, id, remote, payload = match.groups()
+            if remote:
+                continue
+            data = bytes.fromhex(payload)
+        else:
+            match = CANDUMP_TEXT.match(line)
+            if match is None:
+                continue
+            stamp, id, dlc, payload = match.groups()
+            if payload.startswith("remote"):
+                continue
+            data = bytes.fromhex("".join(payload.split()[:int(dlc)]))
+        if stamp is not None:
+            ts_ns = seconds_to_ns(stamp)
+        yield LogFrame(ts_ns, int(id, 16), data, len(id) == 8)
+
+
+def read_asc(lines):
+    # Vector ASC: classic CAN data frames only; error frames, status lines,
+    # remote frames and CAN FD records are skipped
+    base = 16
+    relative = False
+    ts_ns = 0
+    for line in lines:
+        line = line.strip()
+        match = ASC_BASE.match(line)
+        if match:
+            base = 16 if match.group(1) == "hex" else 10
+            relative = match.group(2) == "relative"
+            continue
+        match = ASC_FRAME.match(line)
+        if match is None:
+            continue
+        stamp, id, extended, dlc, payload = match.groups()
+        stamp_ns = seconds_to_ns(stamp)
+        ts_ns = ts_ns + stamp_ns if relative else stamp_ns
+        data = bytes(int(value, base) for value in payload.split()[:int(dlc)])
+        yield LogFrame(ts_ns, int(id, base), data, bool(extended))
+
+
+def read_log(path):
+    # Generator over the file, so multi-hour captures are never held in memory
+    reader = read_asc if path.lower().endswith(".asc") else read_candump
+    with open(path) as log_file:
+        yield from reader(log_file)
+
+
+class LogPlayer(Device):
+    # Puts the captured frames on the virtual bus at their logged times, scaled
+    # by speed. speed=None feeds them as fast as the firmware drains its RX FIFO.
+    # With dispatch set the bus is bypassed and frames go straight to
+    # Application._process_message_based_on_id, as decoder throughput runs want.
+    name = "replay"
+
+    def __init__(self, frames, speed=1.0, start_ns=0, dispatch=None, batch=1):
+        self.frames = iter(frames)
+        self.speed = speed
+        self.start_ns = start_ns
+        self.dispatch = dispatch
+        self.batch = batch
+        self.log_start_ns = None
+        self.next_frame = None
+        self.next_frame_ns = None
+        self.log_end_ns = 0
+        self.sent = 0
+        self.extended = 0
+        self.advance()
+
+    @property
+    def done(self):
+        return self.next_frame is None
+
+    def advance(self):
+        for frame in self.frames:
+            if frame.extended:
+                # The firmware only listens for standard ids; its filters would drop these
+                self.extended += 1
+                continue
+            if self.log_start_ns is None:
+                self.log_start_ns = frame.ts_ns
+            self.log_end_ns = frame.ts_ns
+            self.next_frame = frame
+            if self.speed is not None:
+                self.next_frame_ns = self.start_ns + int((frame.ts_ns - self.log_start_ns) / self.speed)
+            return
+        self.next_frame = None
+        self.next_frame_ns = None
+
+    def next_event_ns(self):
+        return self.next_frame_ns
+
+    def has_room(self):
+        for can in self.bus.controllers:
+            for listener in can.listeners:
+                if len(listener.fifo) >= listener.fifo_depth:
+                    return False
+        return True
+
+    def poll(self, now_ns):
+        sent = 0
+        while self.next_frame is not None:
+            if self.speed is None:
+                if (self.dispatch is None and not self.has_room()) or (self.dispatch is not None and sent >= self.batch):
+                    return
+                ts_ns = now_ns
+            else:
+                if self.next_frame_ns > now_ns:
+                    return
+                ts_ns = self.next_frame_ns
+            self.send(self.next_frame, ts_ns)
+            sent += 1
+            self.advance()
+
+    def send(self, frame, ts_ns):
+        self.sent += 1
+        if self.dispatch is None:
+            self.bus.publish(self, frame.id, frame.data, ts_ns)
+        else:
+            self.bus.log.append(Frame(ts_ns, self.name, frame.id, frame.data))
+            # As process_can_message does it: data read once, beside the message
+            message = canio.Message(id=frame.id, data=frame.data)
+            self.dispatch(message, message.data)
+
+
+class TraceRecorder:
+    # Turns what the firmware did into trace lines:
+    #      1042 tx 215#0900000000000000
+    #      1042 pin D12 1
+    #      1077 servo A1 87.5
+    # The number is how many frames had been replayed. Gathered entries are
+    # cleared from the bus log, pin histories and servo writes as it goes.
+
+    def __init__(self, bus, write, timestamps=False):
+        self.bus = bus
+        self.write = write
+        self.timestamps = timestamps
+        pins = []
+        for pin in vars(board).values():
+            if isinstance(pin, board.Pin) and pin not in pins:
+                pins.append(pin)
+        self.pins = pins
+        self.replayed = 0
+        self.tx_frames = 0
+        self.lines = 0
+
+    def harvest(self):
+        # Log order first: a frame and an output at the same instant keep that order
+        events = []
+        for frame in self.bus.log:
+            if frame.sender == "ecu":
+                events.append((frame.ts_ns, "tx", f"{frame.id:03X}#{frame.data.hex().upper()}"))
+            elif frame.sender == LogPlayer.name:
+                events.append((frame.ts_ns, None, None))
+        self.bus.log.clear()
+        for pin in self.pins:
+            for ts_ns, value in pin.history:
+                events.append((ts_ns, "pin", f"{pin.name} {int(value)}"))
+            pin.history.clear()
+        for servo in env.servos:
+            name = servo.pwm_out.pin.name
+            for ts_ns, angle in servo.writes:
+                events.append((ts_ns, "servo", f"{name} {'off' if angle is None else format(angle, 'g')}"))
+            servo.writes.clear()
+        events.sort(key=lambda event: event[0])
+
+        for ts_ns, kind, detail in events:
+            if kind is None:
+                self.replayed += 1
+                continue
+            if kind == "tx":
+                self.tx_frames += 1
+            if self.timestamps:
+                self.write(f"{ts_ns / 1_000_000:12.3f} {self.replayed:>9} {kind} {detail}")
+            else:
+                self.write(f"{self.replayed:>9} {kind} {detail}")
+            self.lines += 1
+
+
+class ReplayStats:
+    def __init__(self, frames, extended, tx_frames, lost, ticks, log_ns, sim_ns, host_ns):
+        self.frames = frames
+        self.extended = extended
+        self.tx_frames = tx_frames
+        self.lost = lost
+        self.ticks = ticks
+        self.log_ns = log_ns
+        self.sim_ns = sim_ns
+        self.host_ns = host_ns
+
+    @property
+    def frames_per_host_sec(self):
+        return self.frames * 1e9 / self.host_ns if self.host_ns else 0.0
+
+    @property
+    def frames_per_sim_sec(self):
+        return self.frames * 1e9 / self.sim_ns if self.sim_ns else 0.0
+
+    @property
+    def host_us_per_frame(self):
+        return self.host_ns / self.frames / 1000 if self.frames else 0.0
+
+    def rows(self):
+        return [
+            ("frames replayed", self.frames, "frames"),
+            ("extended frames skipped", self.extended, "frames"),
+            ("RX frames lost to FIFO overflow", self.lost, "frames"),
+            ("frames sent by the firmware", self.tx_frames, "frames"),
+            ("ticks", self.ticks, "ticks"),
+            ("capture span", self.log_ns / 1e9, "s"),
+            ("simulated time", self.sim_ns / 1e9, "s"),
+            ("frames/sec (host)", self.frames_per_host_sec, "frames/s"),
+            ("frames/sec (simulated)", self.frames_per_sim_sec, "frames/s"),
+            ("host time per frame", self.host_us_per_frame, "us"),
+        ]
+
+
+def replay(frames, speed=1.0, dispatch=False, tick_ns=DEFAULT_TICK_NS, write=None, timestamps=False, firmware_path=FIRMWARE_PATH):
+    # tick_ns=None runs on the usual hybrid clock (host time x DEVICE_CPU_SCALE):
+    # realistic tick costs, but the trace is no longer reproducible.
+    sim = Simulation(firmware_path, cpu_scale=0 if tick_ns else DEVICE_CPU_SCALE)
+    app = sim.boot()
+    clock = sim.clock
+    player = LogPlayer(frames, speed, sim.now_ns(), app._process_message_based_on_id if dispatch else None, app.rx_budget)
+    if dispatch:
+        # Polled here before each tick rather than from the listener
+        player.bus = sim.bus
+    else:
+        sim.add(player)
+    recorder = TraceRecorder(sim.bus, write or (lambda line: None), timestamps)
+
+    ticks = 0
+    settle_until = None
+    sim_start = sim.now_ns()
+    host_start = time.perf_counter_ns()
+    while True:
+        now = sim.now_ns()
+        if player.done:
+            if settle_until is None:
+                settle_until = now + SETTLE_NS
+            elif now >= settle_until:
+                break
+        if dispatch:
+            player.poll(now)
+        app.tick()
+        ticks += 1
+        if tick_ns:
+            clock.advance_to(now + tick_ns)
+        if len(sim.bus.log) >= HARVEST_FRAMES:
+            recorder.harvest()
+    host_ns = time.perf_counter_ns() - host_start
+    recorder.harvest()
+
+    lost = sum(listener.lost for can in sim.bus.controllers for listener in can.listeners)
+    log_ns = player.log_end_ns - player.log_start_ns if player.log_start_ns is not None else 0
+    return ReplayStats(player.sent, player.extended, recorder.tx_frames, lost, ticks, log_ns, sim.now_ns() - sim_start, host_ns)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog="sim.replay")
+    parser.add_argument("log", help="candump log (-l or -ta output) or Vector .asc file")
+    pace = parser.add_mutually_exclusive_group()
+    pace.add_argument("--speed", type=float, default=1.0, help="replay rate relative to the capture (default 1)")
+    pace.add_argument("--fast", action="store_true", help="as fast as the firmware drains its RX FIFO")
+    parser.add_argument("--dispatch", action="store_true", help="skip the bus and listener, call _process_message_based_on_id")
+    parser.add_argument("--host-clock", action="store_true", help="time ticks by host time instead of a fixed step (not reproducible)")
+    parser.add_argument("--tick-us", type=int, default=DEFAULT_TICK_NS // 1000, help="fixed tick step (default %(default)s)")
+    parser.add_argument("-o", "--output", help="write the output trace here")
+    parser.add_argument("--timestamps", action="store_true", help="prefix trace lines with simulated ms")
+    args = parser.parse_args(argv)
+
+    trace_file = open(args.output, "w") if args.output else None
+    try:
+        write = (lambda line: trace_file.write(line + "\n")) if trace_file else None
+        stats = replay(
+            read_log(args.log),
+            speed=None if args.fast else args.speed,
+            dispatch=args.dispatch,
+            tick_ns=None if args.host_clock else args.tick_us * 1000,
+            write=write,
+            timestamps=args.timestamps,
+        )
+    finally:
+        if trace_file:
+            trace_file.close()
+    for metric, value, unit in stats.rows():
+        if isinstance(value, float):
+            value = f"{value:.2f}"
+        print(f"   {metric:<32} {value:>12} {unit}", file=sys.stderr)
+
+
+if __name__ == "__main__":
+    main()
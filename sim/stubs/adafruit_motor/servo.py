@@ -0,0 +1,25 @@
+# Stand-in for adafruit_motor.servo. Records every angle write so benchmarks
+# can count PWM updates.
+from sim import env
+
+
+class Servo:
+    def __init__(self, pwm_out, *, actuation_range=180, min_pulse=750, max_pulse=2250):
+        self.pwm_out = pwm_out
+        self.actuation_range = actuation_range
+        self.min_pulse = min_pulse
+        self.max_pulse = max_pulse
+        self.writes = []
+        self._angle = None
+        env.servos.append(self)
+
+    @property
+    def angle(self):
+        return self._angle
+
+    @angle.setter
+    def angle(self, new_angle):
+        if new_angle is not None and not 0 <= new_angle <= self.actuation_range:
+            raise ValueError("Angle out of range")
+        self.writes.append((env.clock.monotonic_ns(), new_angle))
+        self._angle = new_angle
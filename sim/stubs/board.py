@@ -0,0 +1,32 @@
+# Stand-in for the CircuitPython `board` module of the Feather M4 CAN.
+
+
+class Pin:
+    def __init__(self, name):
+        self.name = name
+        self.value = False
+        self.history = []
+
+    def __repr__(self):
+        return f"board.{self.name}"
+
+
+A0 = Pin("A0")
+A1 = Pin("A1")
+A2 = Pin("A2")
+A3 = Pin("A3")
+A4 = Pin("A4")
+A5 = Pin("A5")
+D4 = Pin("D4")
+D5 = Pin("D5")
+D6 = Pin("D6")
+D9 = Pin("D9")
+D10 = Pin("D10")
+D11 = Pin("D11")
+D12 = Pin("D12")
+D13 = Pin("D13")
+LED = D13
+CAN_RX = Pin("CAN_RX")
+CAN_TX = Pin("CAN_TX")
+CAN_STANDBY = Pin("CAN_STANDBY")
+BOOST_ENABLE = Pin("BOOST_ENABLE")
@@ -0,0 +1,245 @@
+# Stand-in for the CircuitPython `canio` module backed by sim.vbus.VirtualBus.
+from sim import env
+
+
+class BusState:
+    ERROR_ACTIVE = "canio.BusState.ERROR_ACTIVE"
+    ERROR_WARNING = "canio.BusState.ERROR_WARNING"
+    ERROR_PASSIVE = "canio.BusState.ERROR_PASSIVE"
+    BUS_OFF = "canio.BusState.BUS_OFF"
+
+
+class Message:
+    def __init__(self, id, data=b"", *, extended=False):
+        self.id = id
+        self.data = data
+        self.extended = extended
+
+    @property
+    def data(self):
+        return self._data
+
+    @data.setter
+    def data(self, data):
+        if len(data) > 8:
+            raise ValueError("Messages limited to 8 bytes")
+        self._data = bytes(data)
+
+    def __repr__(self):
+        return f"Message(id=0x{self.id:03x}, data={self._data.hex()})"
+
+
+class RemoteTransmissionRequest:
+    def __init__(self, id, length, *, extended=False):
+        self.id = id
+        self.length = length
+        self.extended = extended
+
+
+class Match:
+    def __init__(self, id, mask=None, *, extended=False):
+        self.id = id
+        self.mask = mask
+        self.extended = extended
+
+    def matches(self, message):
+        if message.extended != self.extended:
+            return False
+        mask = self.mask
+        if mask is None:
+            mask = 0x1FFFFFFF if self.extended else 0x7FF
+        return (message.id & mask) == (self.id & mask)
+
+
+class Listener:
+    # Depth of the SAM E5x RX FIFO as configured by CircuitPython
+    FIFO_DEPTH = 3
+
+    def __init__(self, can, matches, timeout):
+        self.can = can
+        self.matches = matches
+        self.timeout = timeout
+        self.fifo_depth = Listener.FIFO_DEPTH
+        self.fifo = []
+        self.received = 0
+        self.lost = 0
+        self.filter_elements = self.elements(matches)
+
+    @staticmethod
+    def elements(matches):
+        # A filter element takes two exact standard ids or one id/mask; no matches
+        # at all takes one that accepts everything
+        if not matches:
+            return 1
+        exact = 0
+        masked = 0
+        for match in matches:
+            if match.extended:
+                continue
+            if match.mask is None or match.mask & 0x7FF == 0x7FF:
+                exact += 1
+            else:
+                masked += 1
+        return masked + (exact + 1) // 2
+
+    def accepts(self, message):
+        if not self.matches:
+            return True
+        for match in self.matches:
+            if match.matches(message):
+                return True
+        return False
+
+    def deliver(self, message):
+        if len(self.fifo) >= self.fifo_depth:
+            self.lost += 1
+        else:
+            self.fifo.append(message)
+
+    def in_waiting(self):
+        self.can.bus.pump()
+        return len(self.fifo)
+
+    def receive(self):
+        bus = self.can.bus
+        bus.pump()
+        if not self.fifo and self.timeout:
+            deadline = env.clock.monotonic_ns() + int(self.timeout * 1_000_000_000)
+            while not self.fifo:
+                next_event = bus.next_event_ns()
+                if next_event is None or next_event >= deadline:
+                    env.clock.advance_to(deadline)
+                    bus.pump()
+                    break
+                env.clock.advance_to(next_event)
+                bus.pump()
+        if self.fifo:
+            self.received += 1
+            return self.fifo.pop(0)
+        return None
+
+    def __iter__(self):
+        return self
+
+    def __next__(self):
+        message = self.receive()
+        if message is None:
+            raise StopIteration
+        return message
+
+    def deinit(self):
+        if self in self.can.listeners:
+            self.can.listeners.remove(self)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.deinit()
+
+
+class CAN:
+    def __init__(self, rx=None, tx=None, *, baudrate=250000, loopback=False, silent=False, auto_restart=False):
+        self.rx = rx
+        self.tx = tx
+        self.baudrate = baudrate
+        self.loopback = loopback
+        self.silent = silent
+        self.auto_restart = auto_restart
+        self.listeners = []
+        self._state = BusState.ERROR_ACTIVE
+        self.transmit_error_count = 0
+        self.receive_error_count = 0
+        self.bus_off_at_ns = None
+        self.bus = env.bus
+        self.bus.attach_controller(self)
+
+    # As CircuitPython sets up the SAM E5x: one listener per RX FIFO, and the
+    # listeners share the standard filter elements
+    MAX_LISTENERS = 2
+    FILTER_ELEMENTS = 4
+
+    def listen(self, matches=None, *, timeout=10):
+        if len(self.listeners) >= self.MAX_LISTENERS:
+            raise RuntimeError("All RX FIFOs in use")
+        listener = Listener(self, matches, timeout)
+        if listener.filter_elements + sum(other.filter_elements for other in self.listeners) > self.FILTER_ELEMENTS:
+            raise RuntimeError("Filters too complex")
+        self.listeners.append(listener)
+        return listener
+
+    # Bus-off recovery: 128 occurrences of 11 recessive bits
+    RECOVERY_BITS = 128 * 11
+    # Error counter thresholds from ISO 11898-1
+    WARNING_LIMIT = 96
+    PASSIVE_LIMIT = 128
+    BUS_OFF_LIMIT = 256
+
+    @property
+    def state(self):
+        if self._state == BusState.BUS_OFF and self.auto_restart:
+            now = env.clock.monotonic_ns()
+            if self.bus.fault_at(now)[0] != self.bus.SHORT and now >= self.bus_off_at_ns + self.RECOVERY_BITS * 1_000_000_000 // self.baudrate:
+                self.restart()
+        return self._state
+
+    def _update_state(self):
+        if self._state == BusState.BUS_OFF:
+            return
+        if self.transmit_error_count >= self.BUS_OFF_LIMIT:
+            self._state = BusState.BUS_OFF
+            self.bus_off_at_ns = env.clock.monotonic_ns()
+        elif max(self.transmit_error_count, self.receive_error_count) >= self.PASSIVE_LIMIT:
+            self._state = BusState.ERROR_PASSIVE
+        elif max(self.transmit_error_count, self.receive_error_count) >= self.WARNING_LIMIT:
+            self._state = BusState.ERROR_WARNING
+        else:
+            self._state = BusState.ERROR_ACTIVE
+
+    def bit_errors(self):
+        # Every retransmission fails with a bit error, +8 each, until bus-off
+        self.transmit_error_count = self.BUS_OFF_LIMIT
+        self._update_state()
+
+    def ack_errors(self):
+        # An error passive node's ACK errors do not count, so TEC stops at 128
+        self.transmit_error_count = max(self.transmit_error_count, self.PASSIVE_LIMIT)
+        self._update_state()
+
+    def receive_errors(self):
+        self.receive_error_count = min(self.receive_error_count + 1, self.BUS_OFF_LIMIT - 1)
+        self._update_state()
+
+    def transmitted(self):
+        if self.transmit_error_count:
+            self.transmit_error_count -= 1
+            self._update_state()
+
+    def received(self):
+        if self.receive_error_count:
+            self.receive_error_count -= 1
+            self._update_state()
+
+    def send(self, message):
+        if self.state == BusState.BUS_OFF:
+            if not self.auto_restart:
+                raise RuntimeError("Bus off")
+            self.restart()
+        if self.bus.pending is not None:
+            raise RuntimeError("CAN transmit buffer full")
+        self.bus.transmit(self, message)
+
+    def restart(self):
+        self._state = BusState.ERROR_ACTIVE
+        self.transmit_error_count = 0
+        self.receive_error_count = 0
+        self.bus_off_at_ns = None
+
+    def deinit(self):
+        self.bus.detach_controller(self)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.deinit()
@@ -0,0 +1,57 @@
+# Stand-in for the CircuitPython `microcontroller` module: just `nvm`, backed by
+# a file so it survives from one Simulation to the next like flash survives a reset.
+import os
+import time
+
+from sim import env
+
+# The SAMD51 CIRCUITPY build reserves 8 KB of flash for nvm
+NVM_SIZE = 8192
+# A write erases and reprograms a flash row, blocking the CPU; charged to the clock
+WRITE_NS = 6_000_000
+
+
+class Nvm:
+    def __init__(self, path=None, size=NVM_SIZE):
+        self.path = path
+        # Erased flash reads 0xFF
+        self.data = bytearray(b"\xff" * size)
+        if path is not None and os.path.exists(path):
+            with open(path, "rb") as nvm_file:
+                stored = nvm_file.read(size)
+            self.data[:len(stored)] = stored
+        self.writes = 0
+        # Bytes written per offset, to see how the writes spread
+        self.wear = [0] * size
+
+    def __len__(self):
+        return len(self.data)
+
+    def __getitem__(self, index):
+        return self.data[index]
+
+    def __setitem__(self, index, value):
+        if isinstance(index, slice):
+            start, stop, step = index.indices(len(self.data))
+            if step != 1 or stop - start != len(value):
+                raise ValueError("Slice and value different lengths")
+            offsets = range(start, stop)
+        else:
+            offsets = (index,)
+        self.data[index] = value
+        for offset in offsets:
+            self.wear[offset] += 1
+        self.writes += 1
+        started = time.perf_counter_ns()
+        self.save()
+        if env.clock is not None:
+            env.clock.exclude(time.perf_counter_ns() - started)
+            env.clock.sleep(WRITE_NS / 1_000_000_000)
+
+    def save(self):
+        if self.path is not None:
+            with open(self.path, "wb") as nvm_file:
+                nvm_file.write(self.data)
+
+
+nvm = Nvm()
@@ -0,0 +1,8 @@
+# Stand-in for the CircuitPython `supervisor` module.
+from sim import env
+
+TICKS_PERIOD = 1 << 29
+
+
+def ticks_ms():
+    return (env.clock.monotonic_ns() // 1_000_000) % TICKS_PERIOD
@@ -0,0 +1,55 @@
+# Stand-in for the CircuitPython `usb_cdc` module. A Serial is a byte pipe: the
+# simulation types into it with type() and takes the replies with replies().
+
+
+class Serial:
+    def __init__(self):
+        self.timeout = 1.0
+        self.write_timeout = None
+        self.connected = True
+        self.input = bytearray()
+        self.output = bytearray()
+
+    @property
+    def in_waiting(self):
+        return len(self.input)
+
+    @property
+    def out_waiting(self):
+        return 0
+
+    def read(self, size=1):
+        data = bytes(self.input[:size])
+        del self.input[:size]
+        return data
+
+    def readline(self, size=-1):
+        end = self.input.find(b"\n") + 1 or len(self.input)
+        if size >= 0:
+            end = min(end, size)
+        return self.read(end)
+
+    def write(self, data):
+        self.output.extend(data)
+        return len(data)
+
+    def reset_input_buffer(self):
+        self.input.clear()
+
+    def reset_output_buffer(self):
+        pass
+
+    def type(self, text):
+        # bytes for input no keyboard layout would produce
+        self.input.extend(text if isinstance(text, bytes) else text.encode())
+
+    def replies(self):
+        # The echo gives back whatever was typed, valid UTF-8 or not
+        text = self.output.decode(errors="replace")
+        self.output.clear()
+        return text
+
+
+# boot.py has not enabled the data channel; the console is the REPL's port
+console = Serial()
+data = None
@@ -0,0 +1,148 @@
+import canio
+
+
+class Frame:
+    __slots__ = ("ts_ns", "sender", "id", "data")
+
+    def __init__(self, ts_ns, sender, id, data):
+        self.ts_ns = ts_ns
+        self.sender = sender
+        self.id = id
+        self.data = data
+
+    def __repr__(self):
+        return f"Frame({self.ts_ns}, {self.sender}, 0x{self.id:03x}, {self.data.hex()})"
+
+
+class VirtualBus:
+    # A single CAN segment shared by the firmware's canio.CAN controller and the
+    # scripted devices in sim.devices. Every frame is appended to `log`.
+
+    # Fault kinds: nobody acknowledges the controller's frames (it retransmits
+    # and settles in error passive), or the bus is shorted and nothing gets
+    # through (the controller goes bus-off).
+    NO_ACK = "no-ack"
+    SHORT = "short"
+
+    def __init__(self, clock, baudrate=500_000):
+        self.clock = clock
+        self.baudrate = baudrate
+        self.devices = []
+        self.controllers = []
+        self.log = []
+        self.tx_busy_until_ns = 0
+        # (start_ns, end_ns, kind), kept sorted by start
+        self.faults = []
+        # Frame the controller keeps retransmitting while nobody acknowledges it
+        self.pending = None
+
+    def add(self, device):
+        device.bus = self
+        self.devices.append(device)
+        return device
+
+    def attach_controller(self, can):
+        self.controllers.append(can)
+
+    def detach_controller(self, can):
+        if can in self.controllers:
+            self.controllers.remove(can)
+
+    def frame_time_ns(self, dlc):
+        # Standard frame: 47 overhead bits + payload, plus ~20% bit stuffing
+        return (47 + 8 * dlc) * 6 * 1_000_000_000 // (5 * self.baudrate)
+
+    def fault(self, at_ns, duration_ms, kind=NO_ACK):
+        self.faults.append((at_ns, at_ns + int(duration_ms * 1_000_000), kind))
+        self.faults.sort(key=lambda fault: fault[0])
+
+    def fault_at(self, now_ns):
+        for start_ns, end_ns, kind in self.faults:
+            if start_ns <= now_ns < end_ns:
+                return kind, end_ns
+        return None, None
+
+    def transmit(self, can, message):
+        # The controller has a single TX buffer; a send waits for the previous
+        # frame to leave the wire. Returns False when the frame did not get out.
+        self.clock.advance_to(self.tx_busy_until_ns)
+        now = self.clock.monotonic_ns()
+        kind, end_ns = self.fault_at(now)
+        if kind == self.SHORT:
+            can.bit_errors()
+            return False
+        if kind == self.NO_ACK:
+            can.ack_errors()
+            self.pending = (can, message)
+            self.tx_busy_until_ns = end_ns
+            return False
+        self.tx_busy_until_ns = now + self.frame_time_ns(len(message.data))
+        self._send(can, message, now)
+        return True
+
+    def _send(self, can, message, ts_ns):
+        frame = Frame(ts_ns, "ecu", message.id, bytes(message.data))
+        self.log.append(frame)
+        can.transmitted()
+        for device in self.devices:
+            device.on_frame(frame)
+
+    def publish(self, device, id, data, ts_ns):
+        if self.fault_at(ts_ns)[0] == self.SHORT:
+            for can in self.controllers:
+                can.receive_errors()
+            return None
+        frame = Frame(ts_ns, device.name, id, bytes(data))
+        self.log.append(frame)
+        for other in self.devices:
+            if other is not device:
+                other.on_frame(frame)
+        for can in self.controllers:
+            self._deliver(can, frame)
+        return frame
+
+    def _deliver(self, can, frame):
+        message = canio.Message(id=frame.id, data=frame.data)
+        can.received()
+        for listener in can.listeners:
+            if listener.accepts(message):
+                listener.deliver(message)
+                return
+
+    def pump(self):
+        now = self.clock.monotonic_ns()
+        if self.pending is not None and now >= self.tx_busy_until_ns:
+            # The fault cleared and the retransmission was finally acknowledged
+            can, message = self.pending
+            self.pending = None
+            self.tx_busy_until_ns += self.frame_time_ns(len(message.data))
+            self._send(can, message, self.tx_busy_until_ns)
+        # Devices take turns in timestamp order, so frames due in the same pump
+        # reach the controllers in the order they were on the wire
+        while True:
+            earliest = None
+            earliest_ns = now + 1
+            for device in self.devices:
+                event = device.next_event_ns()
+                if event is not None and event < earliest_ns:
+                    earliest = device
+                    earliest_ns = event
+            if earliest is None:
+                break
+            earliest.poll(earliest_ns)
+        for device in self.devices:
+            device.poll(now)
+
+    def next_event_ns(self):
+        next_event = None
+        for device in self.devices:
+            event = device.next_event_ns()
+            if event is not None and (next_event is None or event < next_event):
+                next_event = event
+        return next_event
+
+    def frames(self, id=None, sender=None):
+        return [
+            frame for frame in self.log
+            if (id is None or frame.id == id) and (sender is None or frame.sender == sender)
+        ]
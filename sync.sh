@@ -1,6 +1,17 @@
 #!/usr/bin/env bash
 #
+# Builds code.py and lib/ to build/ (tools/build_mpy.py) and copies them to the board.
+#
+# STRIP_LOGGING=1 ./sync.sh      deploys with the Logger.trace/debug calls removed
+# SOURCE=1 ./sync.sh             deploys the .py sources, no mpy-cross needed
+# MPY_CROSS=path ./sync.sh       mpy-cross matching the board's CircuitPython
+
+CIRCUITPY=/Volumes/CIRCUITPY
 
-fswatch -o code.py | while read num; do
-    cp code.py /Volumes/CIRCUITPY
+fswatch -o code.py lib | while read num; do
+    python3 tools/build_mpy.py -o build ${STRIP_LOGGING:+--strip-logging} ${SOURCE:+--source} || continue
+    # A stale .py on the board would be imported instead of the new .mpy, or the other way round
+    rm -rf "$CIRCUITPY/lib/canpad" "$CIRCUITPY/lib/dbc_signals.py" "$CIRCUITPY/lib/dbc_signals.mpy"
+    cp -R build/lib/ "$CIRCUITPY/lib/"
+    cp build/code.py "$CIRCUITPY"
 done
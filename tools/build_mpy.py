@@ -0,0 +1,94 @@
+# Builds what goes on CIRCUITPY: code.py as is and every module under lib/
+# (the canpad package, dbc_signals) compiled to .mpy with mpy-cross, so the
+# board loads bytecode instead of compiling source on every boot.
+#
+#   python tools/build_mpy.py                          -> build/code.py, build/lib/...
+#   python tools/build_mpy.py --strip-logging          trace/debug calls removed first
+#   python tools/build_mpy.py --mpy-cross ~/bin/mpy-cross-7.0.0
+#   python tools/build_mpy.py --source                 copy .py instead, no mpy-cross needed
+#
+# The .mpy format changes between CircuitPython versions: use the mpy-cross
+# released with the version on the board (see boot_out.txt). Already compiled
+# libraries (lib/adafruit_motor) are left alone; copy them from the bundle.
+import argparse
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+
+from strip_logging import strip_file, strip_tree
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+LIB = os.path.join(REPO_ROOT, "lib")
+ENTRY = os.path.join(REPO_ROOT, "code.py")
+PACKAGE = "canpad"
+MODULES = ("dbc_signals.py",)
+
+
+def compile_mpy(mpy_cross, source, output, name):
+    # name is what tracebacks on the board show, e.g. canpad/app.py
+    os.makedirs(os.path.dirname(output), exist_ok=True)
+    subprocess.run([mpy_cross, "-o", output, "-s", name, source], check=True)
+
+
+def build(output, mpy_cross=None, strip_logging=False):
+    # Returns the files written, relative to output
+    staging = tempfile.mkdtemp()
+    try:
+        package = os.path.join(LIB, PACKAGE)
+        entry = ENTRY
+        if strip_logging:
+            package = os.path.join(staging, PACKAGE)
+            strip_tree(os.path.join(LIB, PACKAGE), package)
+            entry = os.path.join(staging, "code.py")
+            strip_file(ENTRY, entry)
+
+        sources = [(os.path.join(package, name), os.path.join("lib", PACKAGE, name)) for name in sorted(os.listdir(package)) if name.endswith(".py")]
+        sources += [(os.path.join(LIB, name), os.path.join("lib", name)) for name in MODULES]
+
+        built = []
+        # A .py left next to its .mpy would be imported instead of it
+        shutil.rmtree(os.path.join(output, "lib", PACKAGE), ignore_errors=True)
+        for name in MODULES:
+            for stale in (name, name[:-len(".py")] + ".mpy"):
+                if os.path.exists(os.path.join(output, "lib", stale)):
+                    os.unlink(os.path.join(output, "lib", stale))
+        for source, target in sources:
+            if mpy_cross is None:
+                os.makedirs(os.path.dirname(os.path.join(output, target)), exist_ok=True)
+                shutil.copyfile(source, os.path.join(output, target))
+                built.append(target)
+            else:
+                name = os.path.relpath(target, "lib")
+                target = target[:-len(".py")] + ".mpy"
+                compile_mpy(mpy_cross, source, os.path.join(output, target), name)
+                built.append(target)
+        # CircuitPython only runs code.py from source; it is a few lines
+        shutil.copyfile(entry, os.path.join(output, "code.py"))
+        built.append("code.py")
+        return built
+    finally:
+        shutil.rmtree(staging)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog="build_mpy")
+    parser.add_argument("-o", "--output", default=os.path.join(REPO_ROOT, "build"), help="build directory (default build/)")
+    parser.add_argument("--mpy-cross", default=os.environ.get("MPY_CROSS", "mpy-cross"), help="mpy-cross executable (default $MPY_CROSS or mpy-cross)")
+    parser.add_argument("--source", action="store_true", help="copy the .py sources instead of compiling them")
+    parser.add_argument("--strip-logging", action="store_true", help="remove Logger.trace/debug calls first")
+    args = parser.parse_args(argv)
+
+    mpy_cross = None
+    if not args.source:
+        mpy_cross = shutil.which(args.mpy_cross)
+        if mpy_cross is None:
+            parser.error(f"{args.mpy_cross} not found; get the CircuitPython 7 mpy-cross, pass --mpy-cross, or use --source")
+
+    built = build(args.output, mpy_cross, args.strip_logging)
+    print(f"built {len(built)} file(s) in {args.output}", file=sys.stderr)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,199 @@
+# Generates a firmware module of precompiled CAN signal decoders from a DBC
+# file, so nothing is parsed on the device. Only BO_ and SG_ lines are read
+# (id, dlc, start bit, length, byte order, sign, scale, offset); multiplexed
+# signals are not supported.
+#
+#   python tools/dbc_codegen.py dbc/tesla_subset.dbc -o lib/dbc_signals.py
+#   python tools/dbc_codegen.py dbc/tesla_subset.dbc -m DI_hvBusStatus -s DI_voltage
+#
+# Every generated decode_<signal>(data) reads only the bytes the signal covers,
+# each shifted and masked into place, then applies scale and offset. Nothing
+# wider than the signal is built, so up to 30 bits it stays a small int on
+# the device (int.from_bytes over the frame would allocate a long int).
+import argparse
+import os
+import re
+import sys
+
+MESSAGE_PATTERN = re.compile(r"^BO_\s+(\d+)\s+(\w+)\s*:\s*(\d+)\s+(\w+)")
+SIGNAL_PATTERN = re.compile(
+    r"^SG_\s+(\w+)\s*:\s*(\d+)\|(\d+)@([01])([+-])\s*\(([^,]+),([^)]+)\)\s*\[([^|]*)\|([^\]]*)\]\s*\"([^\"]*)\""
+)
+
+
+class Signal:
+    def __init__(self, message, name, start, length, little_endian, signed, scale, offset, unit):
+        self.message = message
+        self.name = name
+        self.start = start
+        self.length = length
+        self.little_endian = little_endian
+        self.signed = signed
+        self.scale = scale
+        self.offset = offset
+        self.unit = unit
+
+
+class Message:
+    def __init__(self, id, name, dlc):
+        self.id = id
+        self.name = name
+        self.dlc = dlc
+        self.signals = []
+
+
+def parse_number(text):
+    value = float(text)
+    return int(value) if value.is_integer() else value
+
+
+def parse_dbc(text):
+    messages = []
+    message = None
+    for line in text.splitlines():
+        line = line.strip()
+        match = MESSAGE_PATTERN.match(line)
+        if match:
+            id, name, dlc, _ = match.groups()
+            # Bit 31 flags an extended id in DBC files
+            message = Message(int(id) & 0x1FFFFFFF, name, int(dlc))
+            messages.append(message)
+            continue
+        match = SIGNAL_PATTERN.match(line)
+        if match and message is not None:
+            name, start, length, order, sign, scale, offset, _, _, unit = match.groups()
+            message.signals.append(Signal(
+                message, name, int(start), int(length), order == "1", sign == "-",
+                parse_number(scale), parse_number(offset), unit,
+            ))
+    return messages
+
+
+def byte_term(index, low_bit, count, place):
+    # count bits of data[index] from low_bit up, moved to bit place of the value
+    term = f"data[{index}]"
+    if low_bit:
+        term = f"({term} >> {low_bit})"
+    if low_bit + count < 8:
+        term = f"({term} & 0x{(1 << count) - 1:X})"
+    if place:
+        term = f"({term} << {place})"
+    return term
+
+
+def extract_expression(signal):
+    terms = []
+    if signal.little_endian:
+        # Intel: start bit is the LSB, bits counted up through the bytes
+        end = signal.start + signal.length
+        for index in range(signal.start // 8, (end - 1) // 8 + 1):
+            low = max(signal.start, index * 8)
+            high = min(end, index * 8 + 8)
+            place = low - signal.start
+            terms.append((place, byte_term(index, low - index * 8, high - low, place)))
+    else:
+        # Motorola: start bit is the MSB in the DBC sawtooth numbering. Count
+        # in wire order, the first bit sent being 0, so the MSB byte comes first.
+        msb = (signal.start // 8) * 8 + (7 - signal.start % 8)
+        lsb_end = msb + signal.length
+        for index in range(msb // 8, (lsb_end - 1) // 8 + 1):
+            low = max(msb, index * 8)
+            high = min(lsb_end, index * 8 + 8)
+            place = lsb_end - high
+            terms.append((place, byte_term(index, index * 8 + 8 - high, high - low, place)))
+    # Most significant bits first, as the value reads
+    return " | ".join(term for _, term in sorted(terms, reverse=True))
+
+
+def decoder_source(signal):
+    function = f"decode_{signal.name.lower()}"
+    lines = [
+        f"def {function}(data):",
+        f"    # {signal.message.name} {signal.name}: {signal.start}|{signal.length}@{1 if signal.little_endian else 0}"
+        f"{'-' if signal.signed else '+'} ({signal.scale},{signal.offset}) \"{signal.unit}\"",
+    ]
+    if signal.signed:
+        lines.append(f"    raw = {extract_expression(signal)}")
+        lines.append(f"    if raw & 0x{1 << (signal.length - 1):X}:")
+        lines.append(f"        raw -= 0x{1 << signal.length:X}")
+        value = "raw"
+    else:
+        value = extract_expression(signal)
+        if " | " in value and (signal.scale != 1 or signal.offset != 0):
+            value = f"({value})"
+    if signal.scale != 1:
+        value = f"{value} * {signal.scale!r}"
+    if signal.offset != 0:
+        value = f"{value} + {signal.offset!r}"
+    lines.append(f"    return {value}")
+    return function, "\n".join(lines)
+
+
+def generate(messages, source_name):
+    out = [
+        f"# Generated by tools/dbc_codegen.py from {source_name}. Do not edit; regenerate instead.",
+        "",
+    ]
+    table = []
+    # Generated names are module globals: a second message or signal of the
+    # same name would silently replace the first
+    owners = {}
+    for message in messages:
+        for name in [f"{message.name.upper()}_ID"] + [f"decode_{signal.name.lower()}" for signal in message.signals]:
+            if name in owners:
+                raise SystemExit(f"{name} generated for both {owners[name]} and {message.name}; pick one with -m/-s")
+            owners[name] = message.name
+    for message in messages:
+        out.append(f"{message.name.upper()}_ID = 0x{message.id:03X}")
+    out.append("")
+    for message in messages:
+        for signal in message.signals:
+            function, source = decoder_source(signal)
+            out.append("")
+            out.append(source)
+            out.append("")
+            table.append(f"    \"{signal.name}\": (0x{message.id:03X}, {function}),")
+    out.append("")
+    out.append("# signal name -> (message id, decoder)")
+    out.append("SIGNALS = {")
+    out.extend(table)
+    out.append("}")
+    return "\n".join(out) + "\n"
+
+
+def select(messages, message_names, signal_names):
+    selected = []
+    for message in messages:
+        if message_names and message.name not in message_names:
+            continue
+        if signal_names:
+            message.signals = [signal for signal in message.signals if signal.name in signal_names]
+        if message.signals:
+            selected.append(message)
+    return selected
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog="dbc_codegen")
+    parser.add_argument("dbc")
+    parser.add_argument("-m", "--message", action="append", default=[], help="message name to include (repeatable)")
+    parser.add_argument("-s", "--signal", action="append", default=[], help="signal name to include (repeatable)")
+    parser.add_argument("-o", "--output", help="write here instead of stdout")
+    args = parser.parse_args(argv)
+
+    with open(args.dbc) as dbc_file:
+        messages = select(parse_dbc(dbc_file.read()), set(args.message), set(args.signal))
+    if not messages:
+        raise SystemExit("no matching signals")
+    source = generate(messages, os.path.basename(args.dbc))
+    compile(source, "<generated>", "exec")
+
+    if args.output:
+        with open(args.output, "w") as output_file:
+            output_file.write(source)
+    else:
+        sys.stdout.write(source)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,110 @@
+# Removes Logger.trace/Logger.debug call statements from firmware source so the
+# deployed file pays nothing for them, not even the call.
+#
+#   python tools/strip_logging.py lib/canpad -o build/canpad
+#   python tools/strip_logging.py lib/canpad/app.py -o build/app.py
+#   python tools/strip_logging.py lib/canpad --levels trace,debug,info -o build/canpad
+import argparse
+import ast
+import os
+import sys
+
+DEFAULT_LEVELS = ("trace", "debug")
+BLOCK_FIELDS = ("body", "orelse", "finalbody")
+
+
+def is_log_call(statement, levels):
+    if not isinstance(statement, ast.Expr) or not isinstance(statement.value, ast.Call):
+        return False
+    function = statement.value.func
+    return (
+        isinstance(function, ast.Attribute)
+        and isinstance(function.value, ast.Name)
+        and function.value.id == "Logger"
+        and function.attr in levels
+    )
+
+
+def statement_blocks(tree):
+    for node in ast.walk(tree):
+        for field in BLOCK_FIELDS:
+            block = getattr(node, field, None)
+            if isinstance(block, list) and block and isinstance(block[0], ast.stmt):
+                yield block
+        if isinstance(node, ast.Try):
+            for handler in node.handlers:
+                yield handler.body
+
+
+def strip_logging(source, levels=DEFAULT_LEVELS):
+    tree = ast.parse(source)
+    lines = source.splitlines(keepends=True)
+    # line index -> replacement text (None drops the line)
+    edits = {}
+    removed = 0
+
+    for block in statement_blocks(tree):
+        calls = [statement for statement in block if is_log_call(statement, levels)]
+        if not calls:
+            continue
+        for statement in calls:
+            for index in range(statement.lineno - 1, statement.end_lineno):
+                edits[index] = None
+            removed += 1
+        if len(calls) == len(block):
+            # Keep the block syntactically valid
+            first = calls[0]
+            edits[first.lineno - 1] = " " * first.col_offset + "pass\n"
+
+    output = []
+    for index, line in enumerate(lines):
+        if index not in edits:
+            output.append(line)
+        elif edits[index] is not None:
+            output.append(edits[index])
+    output = "".join(output)
+    compile(output, "<stripped>", "exec")
+    return output, removed
+
+
+def strip_file(source, output, levels=DEFAULT_LEVELS):
+    with open(source) as source_file:
+        stripped, removed = strip_logging(source_file.read(), levels)
+    os.makedirs(os.path.dirname(output) or ".", exist_ok=True)
+    with open(output, "w") as output_file:
+        output_file.write(stripped)
+    return removed
+
+
+def strip_tree(source, output, levels=DEFAULT_LEVELS):
+    # Every .py directly in the source directory, e.g. the canpad package
+    removed = 0
+    for name in sorted(os.listdir(source)):
+        if name.endswith(".py"):
+            removed += strip_file(os.path.join(source, name), os.path.join(output, name), levels)
+    return removed
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog="strip_logging")
+    parser.add_argument("source", help="a .py file or a directory of them")
+    parser.add_argument("-o", "--output", help="write here instead of stdout")
+    parser.add_argument("--levels", default=",".join(DEFAULT_LEVELS), help="comma separated Logger methods to strip")
+    args = parser.parse_args(argv)
+
+    levels = tuple(level.strip() for level in args.levels.split(","))
+    if os.path.isdir(args.source):
+        if not args.output:
+            parser.error("a directory needs -o/--output")
+        removed = strip_tree(args.source, args.output, levels)
+    elif args.output:
+        removed = strip_file(args.source, args.output, levels)
+    else:
+        with open(args.source) as source_file:
+            output, removed = strip_logging(source_file.read(), levels)
+        sys.stdout.write(output)
+    print(f"stripped {removed} logging call(s) from {args.source}", file=sys.stderr)
+
+
+if __name__ == "__main__":
+    main()